@@ -0,0 +1,195 @@
+"""Benchmark the cell set helpers on synthetic experiments of realistic sizes.
+
+The cell sets are generated by benchmarks.synthetic for each size. Results
+are written as JSON, so a baseline written on one branch can be compared
+with a run on another one on the same machine. Run from python/src with:
+
+    python -m benchmarks.cell_sets --output baseline.json
+    python -m benchmarks.cell_sets --compare baseline.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import timeit
+
+import numpy as np
+
+from benchmarks.synthetic import SIZES, generate_cell_sets
+from worker.helpers import serializer
+from worker.helpers.cell_set_index import CellSetIndex, intersection
+from worker.helpers.find_cell_ids_in_same_hierarchy import (
+    find_all_cell_ids_in_cell_sets,
+    find_cell_ids_in_same_hierarchy,
+)
+from worker.helpers.get_diff_expr_cellsets import get_diff_expr_cellsets
+from worker.helpers.get_heatmap_cell_order import get_heatmap_cell_order
+from worker.response import Response
+from worker.result import Result
+
+# Functions that take the experiment and return the call to time
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+class Experiment:
+    """The inputs of the benchmarks for an experiment of a given size."""
+
+    def __init__(self, num_cells):
+        self.num_cells = num_cells
+        self.cell_sets = generate_cell_sets(num_cells)["cellSets"]
+        self.encoded = serializer.dumps({"cellSets": self.cell_sets})
+        self.cell_set_index = CellSetIndex(self.cell_sets)
+
+
+@benchmark
+def json_parse(experiment):
+    return lambda: serializer.loads(experiment.encoded)
+
+
+@benchmark
+def cell_set_index(experiment):
+    return lambda: CellSetIndex(experiment.cell_sets)
+
+
+@benchmark
+def diff_expr_cellsets_rest(experiment):
+    return lambda: get_diff_expr_cellsets(
+        "all", "louvain-0", "rest", experiment.cell_set_index
+    )
+
+
+@benchmark
+def diff_expr_cellsets_background(experiment):
+    return lambda: get_diff_expr_cellsets(
+        "all", "louvain-0", "background", experiment.cell_set_index
+    )
+
+
+@benchmark
+def heatmap_cell_order(experiment):
+    return lambda: get_heatmap_cell_order(
+        "louvain",
+        ["louvain", "sample"],
+        "All",
+        [],
+        1000,
+        experiment.cell_set_index,
+    )
+
+
+@benchmark
+def cell_set_union(experiment):
+    keys = experiment.cell_set_index.children_keys("louvain")
+    return lambda: experiment.cell_set_index.union(keys)
+
+
+@benchmark
+def cell_set_intersection(experiment):
+    sample_key = experiment.cell_set_index.children_keys("sample")[0]
+    louvain = experiment.cell_set_index.get("louvain-0")
+    sample = experiment.cell_set_index.get(sample_key)
+
+    return lambda: intersection(louvain, sample)
+
+
+@benchmark
+def all_cell_ids_in_cell_sets(experiment):
+    return lambda: find_all_cell_ids_in_cell_sets(experiment.cell_sets)
+
+
+@benchmark
+def cell_ids_in_same_hierarchy(experiment):
+    return lambda: find_cell_ids_in_same_hierarchy("louvain-0", experiment.cell_sets)
+
+
+@benchmark
+def construct_data_for_upload(experiment):
+    # an embedding is the largest result sent for every cell
+    embedding = np.random.default_rng(0).random((experiment.num_cells, 2)).tolist()
+    request = {"ETag": "benchmark", "experimentId": "benchmark"}
+    response = Response(request, Result(embedding))
+
+    return lambda: response._construct_data_for_upload().read()
+
+
+def run(sizes, names, repeat):
+    results = {name: {} for name in names}
+
+    for num_cells in sizes:
+        print(f"\n{num_cells} cells")
+        experiment = Experiment(num_cells)
+
+        for name in names:
+            run_benchmark = BENCHMARKS[name](experiment)
+            seconds = timeit.repeat(run_benchmark, number=1, repeat=repeat)
+            results[name][str(num_cells)] = {
+                "min": min(seconds),
+                "median": statistics.median(seconds),
+                "repeat": repeat,
+            }
+
+            print(f"  {name:<32}{min(seconds) * 1000:>12.2f} ms")
+
+    return results
+
+
+def compare(results, baseline):
+    print("\nCompared to the baseline (min times, > 1x is faster):")
+
+    for name, sizes in results.items():
+        for num_cells, result in sizes.items():
+            previous = baseline["results"].get(name, {}).get(num_cells)
+
+            if not previous:
+                continue
+
+            speedup = previous["min"] / result["min"]
+            print(
+                f"  {name:<32}{num_cells:>9} cells"
+                f"{previous['min'] * 1000:>12.2f} ms{result['min'] * 1000:>12.2f} ms"
+                f"{speedup:>8.2f}x"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare to")
+    args = parser.parse_args()
+
+    results = run(args.cells, args.only, args.repeat)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.datetime.utcnow().isoformat(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "serializer": "orjson" if serializer.orjson else "json",
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Compare the size and time of encodings of results, and what the policy picks.
+
+Payloads are synthetic results of the tasks with the shape of the real ones,
+from a 200 byte ListGenes page to a normalized expression CSV export. The
+time to upload a result is estimated as the time to serialize and compress
+it plus the time to send the compressed bytes at the given bandwidth. Run
+from python/src with:
+
+    python -m benchmarks.compression --cells 100000 --bandwidth 50
+"""
+import argparse
+import datetime
+import json
+import timeit
+
+import numpy as np
+
+from worker.helpers import compression, sparse_expression
+from worker.helpers.compression import (
+    GZIP,
+    IDENTITY,
+    ZSTD,
+    CompressedStream,
+    compress,
+)
+
+ENCODINGS = [(IDENTITY, None), (GZIP, 1), (GZIP, 6), (GZIP, 9)]
+
+if compression.zstandard:
+    ENCODINGS += [(ZSTD, 1), (ZSTD, 3)]
+
+
+def get_payloads(num_cells, num_genes=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    gene_names = [f"GENE{i}" for i in range(num_genes)]
+
+    def sparse(num_columns, density=0.1):
+        nnz = int(num_cells * density) * num_columns
+        return {
+            "values": rng.random(nnz).round(3).tolist(),
+            "index": np.sort(rng.integers(num_cells, size=nnz)).tolist(),
+            "ptr": [i * nnz // num_columns for i in range(num_columns + 1)],
+            "size": [num_cells, num_columns],
+        }
+
+    de_rows = 50
+    csv_cells = min(num_cells, 2000)
+    csv = "\n".join(
+        [",".join(["gene"] + [f"cell{i}" for i in range(csv_cells)])]
+        + [
+            ",".join([gene] + [f"{x:.3f}" for x in row])
+            for gene, row in zip(
+                gene_names[:1000],
+                rng.exponential(0.2, (1000, csv_cells))
+                * (rng.random((1000, csv_cells)) < 0.1),
+            )
+        ]
+    )
+
+    gene_expression = {
+        "orderedGeneNames": gene_names[:3],
+        "stats": {
+            stat: rng.random(3).tolist()
+            for stat in ["rawMean", "rawStdev", "truncatedMin", "truncatedMax"]
+        },
+        "rawExpression": sparse(3),
+        "truncatedExpression": sparse(3),
+        "zScore": sparse(3),
+    }
+
+    return {
+        "ListGenes": {
+            "total": num_genes,
+            "gene_names": gene_names[:3],
+            "dispersions": rng.gamma(2, size=3).tolist(),
+        },
+        "DifferentialExpression": {
+            "total": num_genes,
+            "data": {
+                "gene_names": gene_names[:de_rows],
+                "p_val": rng.random(de_rows).tolist(),
+                "logFC": rng.normal(size=de_rows).tolist(),
+                "pct_1": rng.random(de_rows).tolist(),
+                "pct_2": rng.random(de_rows).tolist(),
+                "p_val_adj": rng.random(de_rows).tolist(),
+                "auc": rng.random(de_rows).tolist(),
+            },
+        },
+        "GeneExpression": gene_expression,
+        "GeneExpression (typed arrays)": sparse_expression.encode(gene_expression),
+        "GetEmbedding": rng.normal(size=(num_cells, 2)).tolist(),
+        "GetNUmis": rng.integers(500, 50000, size=num_cells).tolist(),
+        "GetNormalizedExpression": csv,
+    }
+
+
+def measure(data, encoding, level, repeat):
+    def run():
+        return CompressedStream(data, encoding, level).read()
+
+    seconds = min(timeit.repeat(run, number=1, repeat=repeat))
+    return seconds, len(run())
+
+
+def run(payloads, bandwidth, repeat):
+    results = {}
+
+    for name, data in payloads.items():
+        policy = compress(data, "application/json", [GZIP, IDENTITY, ZSTD])
+        raw_size = len(CompressedStream(data, IDENTITY, None).read())
+
+        print(
+            f"\n{name}: {raw_size / 1024:,.1f} KB, "
+            f"the policy picks {policy.encoding} {policy.level or ''}"
+        )
+
+        results[name] = {
+            "raw_bytes": raw_size,
+            "policy": f"{policy.encoding} {policy.level or ''}".strip(),
+            "codecs": {},
+        }
+
+        for encoding, level in ENCODINGS:
+            seconds, size = measure(data, encoding, level, repeat)
+            upload = seconds + size / (bandwidth * 1024 * 1024)
+            label = f"{encoding} {level or ''}".strip()
+
+            results[name]["codecs"][label] = {
+                "seconds": seconds,
+                "bytes": size,
+                "upload_seconds": upload,
+            }
+
+            picked = (encoding, level) == (policy.encoding, policy.level)
+            print(
+                f"  {label:<10}{seconds * 1000:>10.2f} ms{size / 1024:>12,.1f} KB"
+                f"{raw_size / size:>8.1f}x{upload * 1000:>12.2f} ms to upload"
+                + (" <" if picked else "")
+            )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, default=100000)
+    parser.add_argument(
+        "--bandwidth", type=float, default=50, help="MB/s of uploads to S3"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    print(
+        f"{args.cells} cells, {args.bandwidth} MB/s, "
+        f"zstd {'available' if compression.zstandard else 'not installed'}"
+    )
+    results = run(get_payloads(args.cells), args.bandwidth, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.datetime.utcnow().isoformat(),
+                    "arguments": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Drive the worker's main loop under load with local stand-ins for AWS.
+
+Messages for a mix of tasks are sent to a fake SQS queue at a given rate
+and consumed by the real loop in worker/__main__.py, which computes them
+with the R worker stand-in and publishes them to a fake S3 and Redis. The
+latency of each request is the time from when it is sent to when its
+WorkResponse is emitted. Run from python/src with:
+
+    python -m benchmarks.load_test --requests 500 --rate 20 --concurrency 4
+
+Pass --redis-url to also publish the responses to a real Redis.
+"""
+import argparse
+import datetime
+import json
+import logging
+import random
+import resource
+import runpy
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import boto3
+import numpy as np
+import redis
+
+from benchmarks import stand_ins
+from benchmarks.synthetic import generate_cell_sets
+from worker.config import config
+from worker.helpers import metrics
+
+DEFAULT_MIX = (
+    "ListGenes=4,GeneExpression=3,GetEmbedding=1,"
+    "DifferentialExpression=1,MarkerHeatmap=1"
+)
+
+
+def parse_mix(mix):
+    weights = {}
+
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight or 1)
+
+    return weights
+
+
+class TaskBodies:
+    """Request bodies of each task type, like the UI sends them."""
+
+    def __init__(self, cell_sets, num_genes, seed=0):
+        self.random = random.Random(seed)
+        self.num_genes = num_genes
+        self.louvain_keys = [
+            cell_set["key"]
+            for cell_class in cell_sets
+            if cell_class["key"] == "louvain"
+            for cell_set in cell_class["children"]
+        ]
+
+    def _gene(self):
+        # a few genes are looked at much more often than the rest
+        index = int(self.random.paretovariate(1.2)) - 1
+        return f"GENE{min(index, self.num_genes - 1)}"
+
+    def ListGenes(self):
+        body = {
+            "selectFields": ["gene_names", "dispersions"],
+            "orderBy": self.random.choice(["dispersions", "gene_names"]),
+            "orderDirection": self.random.choice(["ASC", "DESC"]),
+            "offset": self.random.choice([0, 0, 0, 50, 100]),
+            "limit": 50,
+        }
+
+        # the UI only sends a filter when the user has typed one
+        gene_filter = self.random.choice([None, None, "GENE1", "^GENE2", "7$"])
+        if gene_filter:
+            body["geneNamesFilter"] = gene_filter
+
+        return body
+
+    def GeneExpression(self):
+        return {"genes": [self._gene() for _ in range(self.random.randint(1, 3))]}
+
+    def GetEmbedding(self):
+        return {
+            "type": "umap",
+            "config": {"minimumDistance": 0.3, "distanceMetric": "cosine"},
+        }
+
+    def DifferentialExpression(self):
+        return {
+            "cellSet": self.random.choice(self.louvain_keys),
+            "compareWith": "rest",
+            "basis": "all",
+            "pagination": {
+                "orderBy": "p_val_adj",
+                "orderDirection": "ASC",
+                "offset": self.random.choice([0, 0, 50]),
+                "limit": 50,
+            },
+        }
+
+    def MarkerHeatmap(self):
+        return {
+            "nGenes": 5,
+            "cellSetKey": "louvain",
+            "groupByClasses": ["louvain"],
+            "selectedPoints": "All",
+            "hiddenCellSetKeys": [],
+        }
+
+    def message(self, name):
+        body = getattr(self, name)()
+        pagination = body.pop("pagination", None)
+
+        message = {
+            "ETag": uuid.uuid4().hex,
+            "experimentId": config.EXPERIMENT_ID,
+            "timeout": "2099-12-31 00:00:00",
+            "body": {"name": name, **body},
+        }
+
+        if pagination:
+            message["pagination"] = pagination
+
+        return message
+
+
+class Recorder:
+    """Send and response times of every request, by ETag."""
+
+    def __init__(self):
+        self.sent = {}
+        self.done = {}
+        self.errors = Counter()
+        self.lock = threading.Lock()
+        self.all_done = threading.Event()
+        self.expected = None
+
+    def on_sent(self, message):
+        with self.lock:
+            name = message["body"]["name"]
+            self.sent[message["ETag"]] = (name, time.perf_counter())
+
+    def on_event(self, event, data):
+        if not event.startswith("WorkResponse-"):
+            return
+
+        etag = event[len("WorkResponse-"):]
+
+        with self.lock:
+            if etag not in self.sent or etag in self.done:
+                return
+
+            self.done[etag] = time.perf_counter()
+
+            if data["response"]["error"]:
+                self.errors[self.sent[etag][0]] += 1
+
+            if self.expected is not None and len(self.done) >= self.expected:
+                self.all_done.set()
+
+    def report(self):
+        latencies = defaultdict(list)
+
+        for etag, finished in self.done.items():
+            name, started = self.sent[etag]
+            latencies[name].append(finished - started)
+
+        first_sent = min(started for _, started in self.sent.values())
+        last_done = max(self.done.values(), default=first_sent)
+        elapsed = last_done - first_sent
+
+        return {
+            "requests": len(self.sent),
+            "completed": len(self.done),
+            "seconds": elapsed,
+            "throughput": len(self.done) / elapsed if elapsed else 0,
+            "tasks": {
+                name: {
+                    "completed": len(values),
+                    "errors": self.errors[name],
+                    "p50": float(np.percentile(values, 50)),
+                    "p95": float(np.percentile(values, 95)),
+                    "p99": float(np.percentile(values, 99)),
+                    "max": max(values),
+                }
+                for name, values in sorted(latencies.items())
+            },
+        }
+
+
+def produce(queue, bodies, recorder, mix, count, rate, seed=0):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+
+    for _ in range(count):
+        message = bodies.message(rng.choices(names, weights)[0])
+
+        recorder.on_sent(message)
+        queue.send(message)
+
+        if rate:
+            time.sleep(rng.expovariate(rate))
+
+
+def stage_summary():
+    """Mean duration in ms of each stage of each task, from the worker's metrics."""
+    return {
+        f"{task}/{stage}": stage_metrics.seconds / stage_metrics.count * 1000
+        for (task, stage), stage_metrics in sorted(metrics.registry.stages.items())
+        if stage_metrics.count
+    }
+
+
+def print_report(report, stages):
+    print(
+        f"\n{report['completed']}/{report['requests']} requests in "
+        f"{report['seconds']:.1f}s, {report['throughput']:.1f} requests/s, "
+        f"peak RSS {report['peak_rss_mb']:.0f} MB\n"
+    )
+    print(f"  {'task':<26}{'done':>6}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+
+    for name, task in report["tasks"].items():
+        print(
+            f"  {name:<26}{task['completed']:>6}{task['errors']:>8}"
+            + "".join(f"{task[p] * 1000:>8.0f}ms" for p in ["p50", "p95", "p99"])
+        )
+
+    print("\nMean duration of each stage:")
+    for stage, ms in stages.items():
+        print(f"  {stage:<48}{ms:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--rate", type=float, default=10, help="requests/s, 0 for all at once"
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="task=weight,...")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=config.CONCURRENCY,
+        help="tasks of each latency class computed at a time",
+    )
+    parser.add_argument("--cells", type=int, default=100000)
+    parser.add_argument("--genes", type=int, default=20000)
+    parser.add_argument("--r-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--r-jitter", type=float, default=0.01, help="seconds")
+    parser.add_argument("--max-wait", type=float, default=600, help="seconds")
+    parser.add_argument("--redis-url", help="also publish responses to this Redis")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show the worker logs")
+    args = parser.parse_args()
+
+    # The worker configures logging on import only if it's not configured yet
+    logging.basicConfig(
+        format="%(asctime)s %(message)s",
+        level=logging.INFO if args.verbose else logging.WARNING,
+    )
+
+    print(
+        f"Starting the R worker stand-in with {args.cells} cells "
+        f"and {args.genes} genes"
+    )
+    r_process, r_url = stand_ins.start_r_worker(
+        args.cells, args.genes, args.r_latency, args.r_jitter
+    )
+
+    cell_sets = generate_cell_sets(args.cells)["cellSets"]
+
+    s3 = stand_ins.FakeS3(discard_buckets=[config.RESULTS_BUCKET])
+    s3.put(
+        config.CELL_SETS_BUCKET,
+        config.EXPERIMENT_ID,
+        json.dumps({"cellSets": cell_sets}).encode("utf-8"),
+    )
+    s3.put(config.SOURCE_BUCKET, f"{config.EXPERIMENT_ID}/r.rds", b"seurat object")
+
+    sqs = stand_ins.FakeSQS()
+    recorder = Recorder()
+    recorder.expected = args.requests
+
+    client = redis.Redis.from_url(args.redis_url) if args.redis_url else None
+
+    boto3.client = lambda service, **kwargs: s3
+    boto3.resource = lambda service, **kwargs: sqs
+
+    config.R_WORKER_URL = r_url
+    config.REDIS_CLIENT = stand_ins.FakeRedis(recorder.on_event, client)
+    config.LOCAL_DIR = tempfile.mkdtemp(prefix="load-test-")
+    config.LANE_CONCURRENCY = {
+        **config.LANE_CONCURRENCY,
+        "interactive": args.concurrency,
+        "plot": args.concurrency,
+    }
+    config.TIMEOUT = args.max_wait
+    config.IGNORE_TIMEOUT = False
+
+    producer = threading.Thread(
+        target=produce,
+        args=(
+            sqs.queue,
+            TaskBodies(cell_sets, args.genes),
+            recorder,
+            parse_mix(args.mix),
+            args.requests,
+            args.rate,
+        ),
+        daemon=True,
+    )
+
+    def stop_when_done():
+        recorder.all_done.wait(timeout=args.max_wait)
+        # The worker loop exits once it has been idle for longer than this
+        config.TIMEOUT = 0
+
+    print(
+        f"Sending {args.requests} requests at {args.rate or 'max'} requests/s "
+        f"to a worker running {args.concurrency} tasks of each kind at a time..."
+    )
+    producer.start()
+    threading.Thread(target=stop_when_done, daemon=True).start()
+
+    runpy.run_module("worker.__main__", run_name="__main__")
+    r_process.terminate()
+
+    report = recorder.report()
+    report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    stages = stage_summary()
+
+    print_report(report, stages)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.datetime.utcnow().isoformat(),
+                    "arguments": vars(args),
+                    "report": report,
+                    "stages_ms": stages,
+                },
+                f,
+                indent=2,
+            )
+
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
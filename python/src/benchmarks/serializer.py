@@ -0,0 +1,80 @@
+"""Compare the serializer with the stdlib json module on large payloads.
+
+The payloads are built from the mock data in tests/data, scaled up to the
+size of a large experiment. Run from python/src with:
+
+    python -m benchmarks.serializer
+"""
+import argparse
+import json
+import sys
+import timeit
+
+sys.path.insert(0, "tests")
+
+from data.cell_sets_from_s3 import cell_sets_from_s3  # noqa: E402
+from data.embedding import mock_embedding  # noqa: E402
+from worker.helpers import serializer  # noqa: E402
+
+
+def scale_cell_sets(num_cells):
+    cell_sets = json.loads(json.dumps(cell_sets_from_s3["cellSets"]))
+
+    for cell_class in cell_sets:
+        children = cell_class["children"]
+        for i, cell_set in enumerate(children):
+            cell_set["cellIds"] = list(range(i, num_cells, len(children)))
+
+    return {"cellSets": cell_sets}
+
+
+def get_payloads(num_cells):
+    embedding = (mock_embedding * (num_cells // len(mock_embedding) + 1))[:num_cells]
+
+    return {
+        "cell sets": scale_cell_sets(num_cells),
+        "embedding": embedding,
+        "differential expression request": {
+            "baseCells": list(range(0, num_cells, 2)),
+            "backgroundCells": list(range(1, num_cells, 2)),
+            "genesOnly": False,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backend = "orjson" if serializer.orjson else "stdlib json"
+    print(f"Serializer backend: {backend}, {args.cells} cells")
+
+    encoders = {
+        "json.dumps": lambda data: json.dumps(data).encode("utf-8"),
+        "serializer.dumps": serializer.dumps,
+        "serializer.iterencode": lambda data: b"".join(serializer.iterencode(data)),
+    }
+    decoders = {
+        "json.loads": json.loads,
+        "serializer.loads": serializer.loads,
+    }
+
+    def report(name, run):
+        seconds = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(f"  {name:<24}{seconds * 1000:>10.1f} ms")
+
+    for payload_name, payload in get_payloads(args.cells).items():
+        encoded = serializer.dumps(payload)
+        print(f"\n{payload_name} ({len(encoded) / 1e6:.1f} MB)")
+
+        for name, encode in encoders.items():
+            report(name, lambda: encode(payload))
+
+        for name, decode in decoders.items():
+            report(name, lambda: decode(encoded))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""Local stand-ins for the services the worker talks to, for load tests.
+
+SQS, S3 and Redis are replaced in process by objects with the subset of the
+boto3 and redis APIs the worker uses. The R worker is a real HTTP server
+running in its own process, answering the /v0/* endpoints with synthetic
+results of a configurable size after a configurable latency.
+"""
+import io
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import msgpack
+import numpy as np
+from botocore.exceptions import ClientError
+
+from worker.helpers import typed_arrays
+
+# Longest time a receive waits for messages, shorter than the real 20s long
+# poll so the worker notices the end of a load test quickly.
+MAX_WAIT_SECONDS = 1
+
+
+class FakeMessage:
+    def __init__(self, body):
+        self.body = body
+        self.receipt_handle = uuid.uuid4().hex
+        self.attributes = {"SentTimestamp": str(int(time.time() * 1000))}
+
+    def delete(self):
+        pass
+
+
+class FakeQueue:
+    """FIFO queue. Messages are handed out once, visibility is not simulated."""
+
+    def __init__(self):
+        self.messages = deque()
+        self.condition = threading.Condition()
+
+    def send(self, body):
+        with self.condition:
+            self.messages.append(FakeMessage(json.dumps(body)))
+            self.condition.notify()
+
+    def receive_messages(self, WaitTimeSeconds=0, MaxNumberOfMessages=1, **kwargs):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.messages, timeout=min(WaitTimeSeconds, MAX_WAIT_SECONDS)
+            )
+
+            count = min(MaxNumberOfMessages, len(self.messages))
+            return [self.messages.popleft() for _ in range(count)]
+
+    def change_message_visibility_batch(self, Entries):
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+class FakeSQS:
+    def __init__(self):
+        self.queue = FakeQueue()
+
+    def get_queue_by_name(self, QueueName):
+        return self.queue
+
+
+class FakeS3:
+    """Buckets in memory. Objects put in discard_buckets only keep their size,
+    so the results uploaded during a load test don't add to its memory."""
+
+    def __init__(self, discard_buckets=()):
+        self.objects = {}
+        self.encodings = {}
+        self.discard_buckets = set(discard_buckets)
+        self.lock = threading.Lock()
+
+    def put(self, bucket, key, content):
+        etag = f'"{uuid.uuid4().hex}"'
+        stored = None if bucket in self.discard_buckets else content
+
+        with self.lock:
+            self.objects[(bucket, key)] = (stored, len(content), etag)
+
+    def _get(self, bucket, key):
+        with self.lock:
+            found = self.objects.get((bucket, key))
+
+        if found is None:
+            raise ClientError(
+                {"Error": {"Code": "404", "Message": "Not Found"}}, "GetObject"
+            )
+
+        return found
+
+    def head_object(self, Bucket, Key):
+        _, size, etag = self._get(Bucket, Key)
+        return {"ETag": etag, "ContentLength": size}
+
+    def get_object(self, Bucket, Key):
+        content, size, etag = self._get(Bucket, Key)
+        response = {"Body": io.BytesIO(content), "ETag": etag, "ContentLength": size}
+
+        if (Bucket, Key) in self.encodings:
+            response["ContentEncoding"] = self.encodings[(Bucket, Key)]
+
+        return response
+
+    def list_objects_v2(self, Bucket, Prefix=""):
+        with self.lock:
+            contents = [
+                {"Key": key, "Size": size, "ETag": etag}
+                for (bucket, key), (_, size, etag) in self.objects.items()
+                if bucket == Bucket and key.startswith(Prefix)
+            ]
+
+        return {"Contents": contents, "KeyCount": len(contents)}
+
+    def get_paginator(self, operation):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=""):
+                return [s3.list_objects_v2(Bucket=Bucket, Prefix=Prefix)]
+
+        return Paginator()
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        self.put(Bucket, Key, Fileobj.read())
+
+        encoding = (ExtraArgs or {}).get("ContentEncoding")
+        if encoding:
+            with self.lock:
+                self.encodings[(Bucket, Key)] = encoding
+
+    def download_fileobj(self, Bucket, Key, Fileobj, **kwargs):
+        Fileobj.write(self._get(Bucket, Key)[0])
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        with open(Filename, "wb") as f:
+            self.download_fileobj(Bucket, Key, f)
+
+    def put_object_tagging(self, **kwargs):
+        return {}
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.messages = []
+
+    def publish(self, channel, message):
+        self.messages.append((channel, message))
+
+    def execute(self):
+        return [self.redis.publish(*message) for message in self.messages]
+
+
+class FakeRedis:
+    """Redis client that hands every socket.io event to a listener, and
+    publishes it to a real Redis too if a client is given."""
+
+    def __init__(self, listener, client=None):
+        self.listener = listener
+        self.client = client
+
+    def publish(self, channel, message):
+        _, packet, _ = msgpack.unpackb(message, raw=False)
+        event, data = packet["data"][0], packet["data"][1]
+
+        self.listener(event, data)
+
+        if self.client is not None:
+            return self.client.publish(channel, message)
+
+        return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class RWorkerData:
+    """Synthetic results of the R worker for an experiment of a given size."""
+
+    def __init__(self, num_cells, num_genes, seed=0):
+        rng = np.random.default_rng(seed)
+
+        self.num_cells = num_cells
+        self.gene_names = [f"GENE{i}" for i in range(num_genes)]
+
+        per_cell = rng.random(num_cells).tolist()
+        p_values = rng.random(num_genes)
+
+        self.static = {
+            "getEmbedding": rng.normal(size=(num_cells, 2)).tolist(),
+            "getGeneDispersion": {
+                "gene_names": self.gene_names,
+                "dispersions": rng.gamma(2, size=num_genes).tolist(),
+            },
+            "DifferentialExpression": {
+                "gene_results": {
+                    "p_val": p_values.tolist(),
+                    "logFC": rng.normal(size=num_genes).tolist(),
+                    "pct_1": rng.random(num_genes).tolist(),
+                    "pct_2": rng.random(num_genes).tolist(),
+                    "p_val_adj": np.minimum(p_values * num_genes, 1).tolist(),
+                    "auc": rng.random(num_genes).tolist(),
+                    "gene_names": self.gene_names,
+                    "Gene": [f"ENSG{i:011d}" for i in range(num_genes)],
+                },
+                "full_count": num_genes,
+            },
+            "getNUmis": per_cell,
+            "getNGenes": per_cell,
+            "getMitochondrialContent": per_cell,
+            "getDoubletScore": per_cell,
+        }
+
+        # Encoded once, these don't depend on the request
+        self.encoded = {
+            endpoint: json.dumps({"data": data}).encode("utf-8")
+            for endpoint, data in self.static.items()
+        }
+
+        self.rng = rng
+
+    def expression(self, genes, density=0.1):
+        """runExpression result, with sparse matrices of the given density."""
+        genes = [gene for gene in genes if gene in self.gene_names] or genes[:1]
+        nnz = int(self.num_cells * density)
+
+        def matrix():
+            index = np.sort(
+                np.concatenate(
+                    [
+                        self.rng.choice(self.num_cells, nnz, replace=False)
+                        for _ in genes
+                    ]
+                )
+            )
+
+            return {
+                "values": self.rng.random(nnz * len(genes)).round(3).tolist(),
+                "index": index.tolist(),
+                "ptr": [i * nnz for i in range(len(genes) + 1)],
+                "size": [self.num_cells, len(genes)],
+            }
+
+        return {
+            "orderedGeneNames": genes,
+            "stats": {
+                stat: self.rng.random(len(genes)).tolist()
+                for stat in ["rawMean", "rawStdev", "truncatedMin", "truncatedMax"]
+            },
+            "rawExpression": matrix(),
+            "truncatedExpression": matrix(),
+            "zScore": matrix(),
+        }
+
+    def respond(self, endpoint, request):
+        if endpoint in self.encoded:
+            return self.encoded[endpoint]
+
+        if endpoint == "runExpression":
+            data = self.expression(request.get("genes", []))
+        elif endpoint == "runMarkerHeatmap":
+            data = self.expression(self.gene_names[: request.get("nGenes", 5)])
+        else:
+            data = {}
+
+        return json.dumps({"data": data}).encode("utf-8")
+
+
+def _serve_r_worker(port_queue, num_cells, num_genes, latency, jitter):
+    data = RWorkerData(num_cells, num_genes)
+    rng = np.random.default_rng()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._send(b"up", "text/plain")
+
+        def do_POST(self):
+            content = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            if self.headers.get("Content-Type") == typed_arrays.CONTENT_TYPE:
+                request = typed_arrays.decode(content)
+            else:
+                request = json.loads(content or b"{}")
+
+            time.sleep(max(0.0, rng.normal(latency, jitter)))
+
+            endpoint = self.path.rsplit("/", 1)[-1]
+            self._send(data.respond(endpoint, request), "application/json")
+
+        def _send(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_r_worker(num_cells, num_genes, latency=0.05, jitter=0.01):
+    """Starts the fake R worker in its own process, so its memory and CPU
+    are not counted as the worker's. Returns the process and its URL."""
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+
+    process = context.Process(
+        target=_serve_r_worker,
+        args=(port_queue, num_cells, num_genes, latency, jitter),
+        daemon=True,
+    )
+    process.start()
+
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=120)}"
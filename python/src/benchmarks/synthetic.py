@@ -0,0 +1,138 @@
+"""Synthetic cell sets with the shape of the ones of real experiments.
+
+The cell sets object has a louvain clustering, samples, metadata tracks and
+custom cell sets in the scratchpad, like the ones the UI creates. Sizes of
+clusters are skewed and some cells are filtered out of the clustering, so
+cell classes don't all cover the same cells.
+"""
+import uuid
+
+import numpy as np
+
+from worker.helpers.color_pool import COLOR_POOL
+
+SEED = 42
+
+# number of cells of the experiments benchmarked by default
+SIZES = [10000, 100000, 500000, 1000000]
+
+# share of the cells that are left out of the clustering by the filters
+FILTERED_SHARE = 0.03
+
+
+def _key(rng):
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def _cell_set(key, name, cell_ids, color_index, cell_set_type):
+    return {
+        "key": key,
+        "name": name,
+        "rootNode": False,
+        "type": cell_set_type,
+        "color": COLOR_POOL[color_index % len(COLOR_POOL)],
+        "cellIds": np.sort(cell_ids).tolist(),
+    }
+
+
+def _cell_class(key, name, cell_set_type, children):
+    return {
+        "key": key,
+        "name": name,
+        "rootNode": True,
+        "type": cell_set_type,
+        "children": children,
+    }
+
+
+def _louvain(rng, cell_ids):
+    num_clusters = int(np.clip(np.sqrt(len(cell_ids)) / 8, 8, 60))
+
+    # a few large clusters and a long tail of small ones
+    weights = rng.dirichlet(np.full(num_clusters, 0.8))
+    clusters = rng.choice(num_clusters, size=len(cell_ids), p=weights)
+
+    children = [
+        _cell_set(
+            f"louvain-{i}", f"Cluster {i}", cell_ids[clusters == i], i, "cellSets"
+        )
+        for i in range(num_clusters)
+    ]
+
+    return _cell_class("louvain", "louvain clusters", "cellSets", children)
+
+
+def _samples(rng, num_cells):
+    num_samples = int(np.clip(num_cells // 62500, 4, 16))
+
+    # cells of a sample are contiguous, samples are added one after the other
+    bounds = np.sort(
+        rng.choice(np.arange(1, num_cells), num_samples - 1, replace=False)
+    )
+    samples = np.split(np.arange(num_cells), bounds)
+
+    children = [
+        _cell_set(_key(rng), f"Sample {i}", cell_ids, i, "metadataCategorical")
+        for i, cell_ids in enumerate(samples)
+    ]
+
+    return _cell_class("sample", "Samples", "metadataCategorical", children), samples
+
+
+def _metadata_track(rng, key, values, samples):
+    # every sample has one of the values of the track
+    sample_values = rng.integers(len(values), size=len(samples))
+
+    children = [
+        _cell_set(
+            _key(rng),
+            value,
+            np.concatenate(
+                [samples[i] for i in np.flatnonzero(sample_values == v)] or [[]]
+            ).astype(int),
+            v,
+            "metadataCategorical",
+        )
+        for v, value in enumerate(values)
+    ]
+
+    return _cell_class(key, key, "metadataCategorical", children)
+
+
+def _scratchpad(rng, cell_ids, num_custom=5):
+    children = [
+        _cell_set(
+            _key(rng),
+            f"Custom cell set {i}",
+            rng.choice(
+                cell_ids,
+                size=max(1, int(len(cell_ids) * rng.uniform(0.01, 0.1))),
+                replace=False,
+            ),
+            i,
+            "cellSets",
+        )
+        for i in range(num_custom)
+    ]
+
+    return _cell_class("scratchpad", "Custom cell sets", "cellSets", children)
+
+
+def generate_cell_sets(num_cells, seed=SEED):
+    """Cell sets object, as stored in S3, of an experiment with num_cells cells."""
+    rng = np.random.default_rng(seed)
+
+    all_cells = np.arange(num_cells)
+    kept_cells = all_cells[rng.random(num_cells) >= FILTERED_SHARE]
+
+    sample, samples = _samples(rng, num_cells)
+
+    return {
+        "cellSets": [
+            _louvain(rng, kept_cells),
+            _scratchpad(rng, kept_cells),
+            sample,
+            _metadata_track(rng, "condition", ["control", "treated"], samples),
+            _metadata_track(rng, "batch", ["batch 1", "batch 2", "batch 3"], samples),
+        ]
+    }
@@ -17,6 +17,7 @@ class PythonWorkerException(WorkerException):
 class ErrorCodes:
     PYTHON_WORKER_ERROR = "PYTHON_WORKER_ERROR"
     INVALID_INPUT = "INVALID_INPUT"
+    GENE_NOT_FOUND = "R_WORKER_GENE_NOT_FOUND"
 
 
 def raise_if_error(result):
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+import aws_xray_sdk as xray
+import mock
+import pytest
+from aws_xray_sdk.core import patch, xray_recorder
+from worker.config import config
+from worker.helpers import s3 as s3_helpers
+
+
+@pytest.fixture(autouse=True)
+def isolate_local_dir(tmp_path):
+    """Keeps the files tests download out of the repository."""
+    with mock.patch.object(config, "LOCAL_DIR", str(tmp_path)):
+        yield
+
+
+@pytest.fixture
+def isolate_embedding_cache():
+    """Keeps the embeddings downloaded by a test away from the other tests."""
+    with mock.patch.object(s3_helpers, "_embedding_cache", OrderedDict()):
+        yield
+
+
+@pytest.fixture
+def tracing_enabled():
+    """Enables X-Ray, which is disabled in tests, with botocore and requests
+    patched as in a deployed worker. Segments are recorded but not sent."""
+    xray.global_sdk_config.set_sdk_enabled(True)
+    patch(["botocore", "requests"])
+
+    # Calls without a segment fail, as with the pinned version of the SDK
+    context_missing = xray_recorder.context.context_missing
+    xray_recorder.context.context_missing = "RUNTIME_ERROR"
+
+    with mock.patch.object(xray_recorder, "_emitter") as emitter:
+        try:
+            yield emitter
+        finally:
+            xray_recorder.clear_trace_entities()
+            xray_recorder.context.context_missing = context_missing
+            xray.global_sdk_config.set_sdk_enabled(False)
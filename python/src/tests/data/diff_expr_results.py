@@ -0,0 +1,77 @@
+# runDE result with missing values, None is NA
+diff_expr_results = {
+    "p_val": [0.01, 0.5, None, 0.001, 0.2, 0.05],
+    "logFC": [1.5, -0.2, 0.7, 3.0, None, 0.9],
+    "gene_names": ["G1", "G2", "G3", "G4", "G5", "G6"],
+    "Gene": ["ENSG1", "ENSG2", "ENSG3", "ENSG4", "ENSG5", "ENSG6"],
+}
+
+BOTH_FILTERS = [
+    {"columnName": "logFC", "comparison": "greaterThan", "value": 0},
+    {"columnName": "p_val", "comparison": "lessThan", "value": 0.1},
+]
+
+# Pages of diff_expr_results as paginateDE returns them, as
+# (pagination, genes of the page, full_count). handlePagination counts the
+# rows before na.omit drops the ones with NAs from the page, and rows with NA
+# in a filtered column become rows of NAs that are sorted last.
+diff_expr_pages = [
+    (
+        {"orderBy": "logFC", "orderDirection": "DESC", "offset": 0, "limit": 3},
+        ["G4", "G1", "G6"],
+        6,
+    ),
+    (
+        {"orderBy": "logFC", "orderDirection": "DESC", "offset": 3, "limit": 3},
+        ["G2"],
+        6,
+    ),
+    (
+        {"orderBy": "logFC", "orderDirection": "DESC", "offset": 4, "limit": 5},
+        ["G2"],
+        6,
+    ),
+    (
+        {"orderBy": "p_val", "orderDirection": "ASC", "offset": 0, "limit": 6},
+        ["G4", "G1", "G6", "G2"],
+        6,
+    ),
+    (
+        {"orderBy": "auc", "orderDirection": "ASC", "offset": 0, "limit": 3},
+        ["G1", "G2"],
+        6,
+    ),
+    (
+        {
+            "orderBy": "p_val",
+            "orderDirection": "ASC",
+            "offset": 0,
+            "limit": 10,
+            "filters": BOTH_FILTERS[:1],
+        },
+        ["G4", "G1", "G6"],
+        5,
+    ),
+    (
+        {
+            "orderBy": "logFC",
+            "orderDirection": "DESC",
+            "offset": 0,
+            "limit": 3,
+            "filters": BOTH_FILTERS,
+        },
+        ["G4", "G1", "G6"],
+        5,
+    ),
+    (
+        {
+            "orderBy": "logFC",
+            "orderDirection": "ASC",
+            "offset": 0,
+            "limit": 2,
+            "filters": BOTH_FILTERS,
+        },
+        ["G6", "G1"],
+        5,
+    ),
+]
@@ -0,0 +1,21 @@
+def mock_gene_expression(genes, rows=4):
+    """runExpression result where gene i is expressed in cells 0 and 2."""
+    matrix = {
+        "values": [float(v) for i in range(len(genes)) for v in (i + 1, i + 2)],
+        "index": [0, 2] * len(genes),
+        "ptr": list(range(0, 2 * len(genes) + 1, 2)),
+        "size": [rows, len(genes)],
+    }
+
+    return {
+        "orderedGeneNames": genes,
+        "stats": {
+            "rawMean": [i + 0.5 for i in range(len(genes))],
+            "rawStdev": [1.0] * len(genes),
+            "truncatedMin": [0.0] * len(genes),
+            "truncatedMax": [i + 2.0 for i in range(len(genes))],
+        },
+        "rawExpression": matrix,
+        "truncatedExpression": matrix,
+        "zScore": matrix,
+    }
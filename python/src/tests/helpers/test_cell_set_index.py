@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from worker.helpers.cell_set_index import (
+    CellSetIndex,
+    difference,
+    intersection,
+    union,
+)
+
+
+class TestCellSetIndex:
+    @pytest.fixture(autouse=True)
+    def load_cellsets(self):
+        with open(os.path.join("tests/data", "MockCellSet.json")) as f:
+            cell_sets = json.load(f)
+            self.cell_set_index = CellSetIndex(cell_sets["cellSets"])
+
+    def test_cell_ids_are_stored_as_sorted_int32_arrays(self):
+        louvain_1 = {"key": "louvain-1", "cellIds": [3, 1, 2]}
+        cell_set_index = CellSetIndex([{"key": "louvain", "children": [louvain_1]}])
+
+        cell_ids = cell_set_index.get("louvain-1")
+
+        assert cell_ids.dtype == np.int32
+        assert cell_ids.tolist() == [1, 2, 3]
+
+    def test_get_returns_empty_for_missing_cell_set(self):
+        assert len(self.cell_set_index.get("louvain-3")) == 0
+
+    def test_get_all_returns_cells_of_all_children(self):
+        cell_ids = self.cell_set_index.get_all("condition")
+
+        assert cell_ids.tolist() == [1, 2, 3, 4, 5, 6]
+
+    def test_get_all_raises_for_missing_cell_set(self):
+        with pytest.raises(KeyError):
+            self.cell_set_index.get_all("louvain-3")
+
+    def test_union_of_cell_classes_and_cell_sets(self):
+        cell_ids = self.cell_set_index.union(["condition", "patient-b"])
+
+        assert cell_ids.tolist() == [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+
+    def test_in_same_hierarchy(self):
+        assert self.cell_set_index.in_same_hierarchy("louvain-2").tolist() == [
+            1,
+            2,
+            3,
+            4,
+            5,
+        ]
+        assert self.cell_set_index.in_same_hierarchy(
+            "condition-control"
+        ).tolist() == [4, 5, 6]
+        assert len(self.cell_set_index.in_same_hierarchy("louvain-3")) == 0
+
+    def test_all_cells(self):
+        assert self.cell_set_index.all_cells().tolist() == list(range(1, 11))
+
+    def test_set_operations(self):
+        first = self.cell_set_index.get("louvain-1")
+        second = self.cell_set_index.get("condition-treated")
+
+        assert union(first, second).tolist() == [1, 2, 3, 4, 5, 6]
+        assert intersection(first, second).tolist() == [4, 5]
+        assert difference(first, second).tolist() == [1, 2, 3]
+        assert len(union()) == 0
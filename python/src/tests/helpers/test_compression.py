@@ -0,0 +1,117 @@
+import gzip
+import json
+
+import pytest
+
+from worker.helpers import compression
+from worker.helpers.compression import (
+    CHUNK_SIZE,
+    GZIP,
+    IDENTITY,
+    LARGE_SIZE,
+    ZSTD,
+    CompressedStream,
+    choose_encoding,
+    compress,
+)
+
+
+class TestCompressedStream:
+    def test_stream_contains_the_gzipped_json_encoding(self):
+        data = {"genes": ["a", "b"], "values": list(range(100000))}
+
+        stream = CompressedStream(data)
+
+        assert json.loads(gzip.decompress(stream.read())) == data
+        assert stream.read() == b""
+
+    def test_strings_are_compressed_as_they_are(self):
+        data = "a,b,c\n" * CHUNK_SIZE
+
+        assert gzip.decompress(CompressedStream(data).read()).decode("utf-8") == data
+
+    def test_bytes_are_compressed_as_they_are(self):
+        data = bytes(range(256)) * CHUNK_SIZE
+
+        assert gzip.decompress(CompressedStream(data).read()) == data
+
+    def test_stream_can_be_read_in_parts(self):
+        data = {"values": [str(i) for i in range(100000)]}
+        stream = CompressedStream(data)
+
+        parts = []
+        while True:
+            part = stream.read(1024)
+            if not part:
+                break
+
+            assert len(part) <= 1024
+            parts.append(part)
+
+        assert len(parts) > 1
+        assert json.loads(gzip.decompress(b"".join(parts))) == data
+
+    def test_stream_is_not_seekable(self):
+        assert not CompressedStream({}).seekable()
+
+    def test_default_level_is_the_one_of_the_encoding(self):
+        assert CompressedStream({}).level == compression.LEVELS[GZIP]
+
+
+class TestCompressionPolicy:
+    def test_small_results_are_not_compressed_if_clients_accept_it(self):
+        assert choose_encoding("application/json", 200, [GZIP, IDENTITY]) == (
+            IDENTITY,
+            None,
+        )
+        assert choose_encoding("application/json", 200, [GZIP]) == (GZIP, 6)
+
+    def test_compressed_content_is_not_compressed_again(self):
+        assert choose_encoding("image/png", 10000, [GZIP, IDENTITY])[0] == IDENTITY
+
+    def test_large_results_are_compressed_with_a_fast_level(self):
+        assert choose_encoding("application/json", 10000, [GZIP]) == (GZIP, 6)
+        assert choose_encoding("application/json", None, [GZIP]) == (GZIP, 1)
+
+    def test_large_results_use_zstd_if_clients_accept_it(self, mocker):
+        mocker.patch.object(compression, "zstandard", object())
+        assert choose_encoding("application/json", None, [GZIP, ZSTD])[0] == ZSTD
+        assert choose_encoding("application/json", 10000, [GZIP, ZSTD])[0] == GZIP
+
+        mocker.patch.object(compression, "zstandard", None)
+        assert choose_encoding("application/json", None, [GZIP, ZSTD])[0] == GZIP
+
+    def test_small_result_is_streamed_as_it_is(self):
+        stream = compress({"total": 1}, "application/json", [GZIP, IDENTITY])
+
+        assert stream.encoding == IDENTITY
+        assert json.loads(stream.read()) == {"total": 1}
+
+    def test_large_result_is_compressed_whole(self):
+        data = {"values": list(range(LARGE_SIZE // 2))}
+
+        stream = compress(data, "application/json", [GZIP])
+
+        assert (stream.encoding, stream.level) == (GZIP, 1)
+        assert json.loads(gzip.decompress(stream.read())) == data
+        assert stream.raw_bytes > LARGE_SIZE
+
+    @pytest.mark.parametrize("encoding", [IDENTITY, GZIP, ZSTD])
+    def test_decompress_reverts_the_stream(self, encoding):
+        if encoding == ZSTD and not compression.zstandard:
+            pytest.skip("zstandard is not installed")
+
+        data = {"values": list(range(100000))}
+        content = CompressedStream(data, encoding, 1).read()
+
+        assert json.loads(compression.decompress(content, encoding)) == data
+
+    @pytest.mark.skipif(not compression.zstandard, reason="zstandard not installed")
+    def test_zstd_stream_can_be_decompressed(self):
+        data = {"values": list(range(LARGE_SIZE // 2))}
+
+        stream = compress(data, "application/json", [GZIP, ZSTD])
+
+        assert stream.encoding == ZSTD
+        decompressed = compression.zstandard.ZstdDecompressor().decompressobj()
+        assert json.loads(decompressed.decompress(stream.read())) == data
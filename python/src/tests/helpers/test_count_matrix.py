@@ -0,0 +1,93 @@
+import json
+import os
+
+import mock
+import pytest
+from worker.config import config
+from worker.helpers.count_matrix import MANIFEST_NAME, CountMatrix
+
+
+class TestCountMatrix:
+    @pytest.fixture(autouse=True)
+    def set_up_count_matrix(self, tmp_path):
+        with mock.patch.object(config, "LOCAL_DIR", str(tmp_path)), mock.patch(
+            "worker.helpers.count_matrix.notifier"
+        ), mock.patch(
+            "worker.helpers.count_matrix.download_file",
+            side_effect=self.write_file,
+        ) as download_file:
+            self.count_matrix = CountMatrix()
+            self.count_matrix.s3 = mock.Mock()
+            self.count_matrix.check_if_received = mock.Mock()
+            self.download_file = download_file
+
+            self.experiment_path = tmp_path / config.EXPERIMENT_ID
+            self.key = f"{config.EXPERIMENT_ID}/r.rds"
+
+            yield
+
+    def write_file(self, client, bucket, key, filename, transfer_config):
+        with open(filename, "wb") as f:
+            f.write(b"data")
+
+    def set_objects(self, etag="etag"):
+        paginator = self.count_matrix.s3.get_paginator.return_value
+        paginator.paginate.return_value = [
+            {"Contents": [{"Key": self.key, "ETag": etag, "Size": 4}]}
+        ]
+
+    def test_sync_downloads_new_objects_and_records_them(self):
+        self.set_objects()
+
+        self.count_matrix.sync()
+
+        self.download_file.assert_called_once()
+        client, _, key, _, transfer_config = self.download_file.call_args.args
+        assert client is self.count_matrix.s3
+        assert key == self.key
+        assert transfer_config.max_concurrency == config.SYNC_MULTIPART_CONCURRENCY
+        self.count_matrix.check_if_received.assert_called_once()
+
+        with open(self.experiment_path / MANIFEST_NAME) as f:
+            assert json.load(f) == {self.key: {"ETag": "etag", "Size": 4}}
+
+    def test_sync_clears_cached_gene_expression_of_the_previous_files(self):
+        self.set_objects()
+
+        with mock.patch(
+            "worker.helpers.count_matrix.gene_expression_cache"
+        ) as gene_expression_cache:
+            self.count_matrix.sync()
+
+        gene_expression_cache.clear.assert_called_once()
+
+    def test_sync_skips_objects_that_did_not_change(self):
+        self.set_objects()
+        os.makedirs(self.experiment_path)
+        (self.experiment_path / "r.rds").write_bytes(b"data")
+        (self.experiment_path / MANIFEST_NAME).write_text(
+            json.dumps({self.key: {"ETag": "etag", "Size": 4}})
+        )
+
+        self.count_matrix.sync()
+
+        self.download_file.assert_not_called()
+        self.count_matrix.check_if_received.assert_not_called()
+
+    def test_sync_downloads_objects_with_a_different_etag(self):
+        self.set_objects()
+        self.count_matrix.sync()
+
+        self.set_objects(etag="new-etag")
+        self.count_matrix.last_sync = None
+        self.count_matrix.sync()
+
+        assert self.download_file.call_count == 2
+
+    def test_sync_lists_objects_at_most_once_per_interval(self):
+        self.set_objects()
+
+        self.count_matrix.sync()
+        self.count_matrix.sync()
+
+        self.count_matrix.s3.get_paginator.assert_called_once()
@@ -0,0 +1,113 @@
+import pytest
+from tests.data.diff_expr_results import diff_expr_pages, diff_expr_results
+from worker.helpers.diff_expr_cache import DiffExprCache, DiffExprTable, cache_key
+
+GENE_RESULTS = {
+    "p_val": [0.01, 0.5, None, 0.001],
+    "logFC": [1.5, -0.2, 0.7, 3.0],
+    "gene_names": ["CD3E", "GAPDH", "Lin2", "CD3D"],
+    "Gene": ["ENSG1", "ENSG2", "ENSG3", "ENSG4"],
+}
+
+
+def pagination(order_by="logFC", order_direction="DESC", offset=0, limit=10, **kw):
+    return {
+        "orderBy": order_by,
+        "orderDirection": order_direction,
+        "offset": offset,
+        "limit": limit,
+        **kw,
+    }
+
+
+class TestDiffExprTable:
+    @pytest.fixture(autouse=True)
+    def build_table(self):
+        self.table = DiffExprTable(GENE_RESULTS)
+
+    def test_returns_the_whole_result_without_pagination(self):
+        result = self.table.query({})
+
+        assert result == {"gene_results": GENE_RESULTS, "full_count": 4}
+
+    def test_sorts_and_paginates(self):
+        result = self.table.query(pagination(offset=1, limit=2))
+
+        assert result["full_count"] == 4
+        assert result["gene_results"]["gene_names"] == ["CD3E"]
+        assert result["gene_results"]["p_val"] == [0.01]
+
+    def test_rows_with_missing_values_are_counted_but_left_out(self):
+        for direction in ["ASC", "DESC"]:
+            result = self.table.query(pagination("p_val", direction))
+
+            assert "Lin2" not in result["gene_results"]["gene_names"]
+            assert result["full_count"] == 4
+
+    @pytest.mark.parametrize("page_pagination, genes, full_count", diff_expr_pages)
+    def test_pages_are_the_same_as_the_ones_of_r(
+        self, page_pagination, genes, full_count
+    ):
+        result = DiffExprTable(diff_expr_results).query(page_pagination)
+
+        assert result["gene_results"]["gene_names"] == genes
+        assert result["full_count"] == full_count
+
+    def test_applies_numeric_and_text_filters(self):
+        filters = [
+            {"columnName": "logFC", "comparison": "greaterThan", "value": 0},
+            {"columnName": "p_val", "comparison": "lessThan", "value": 0.1},
+        ]
+
+        # Lin2 has no p value, R keeps it as a row of NAs
+        result = self.table.query(pagination(filters=filters))
+        assert result["gene_results"]["gene_names"] == ["CD3D", "CD3E"]
+        assert result["full_count"] == 3
+
+        result = self.table.query(pagination(filters=filters), False, "3e$")
+        assert result["gene_results"]["gene_names"] == ["CD3E"]
+
+    def test_genes_only_returns_names_and_ids(self):
+        result = self.table.query(pagination(offset=2, limit=2), genes_only=True)
+
+        assert result == {
+            "gene_results": {
+                "gene_names": ["CD3D", "CD3E"],
+                "gene_id": ["ENSG4", "ENSG1"],
+            },
+            "full_count": 2,
+        }
+
+
+class TestDiffExprCache:
+    def test_cache_key_ignores_cell_order(self):
+        request = {
+            "baseCells": [3, 1],
+            "backgroundCells": [2],
+            "comparisonType": "within",
+        }
+
+        assert cache_key(request) == cache_key(
+            {**request, "baseCells": [1, 3], "pagination": {"limit": 5}}
+        )
+        assert cache_key(request) != cache_key(
+            {**request, "comparisonType": "between"}
+        )
+        assert cache_key(request) != cache_key(
+            {**request, "baseCells": [2], "backgroundCells": [1, 3]}
+        )
+
+    def test_evicts_the_least_recently_used_result(self):
+        cache = DiffExprCache(2)
+
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+        cache.clear()
+        assert cache.get("a") is None
@@ -0,0 +1,62 @@
+import numpy as np
+from tests.data.gene_expression import mock_gene_expression as get_expression
+from worker.helpers.gene_expression_cache import (
+    GeneExpressionCache,
+    merge_genes,
+    split_genes,
+)
+
+
+class TestGeneExpressionCache:
+    def test_split_and_merge_returns_the_same_result(self):
+        data = get_expression(["Tpt1", "Zzz3", "Cd4"])
+
+        assert merge_genes(split_genes(data)) == data
+
+    def test_merge_genes_from_different_results(self):
+        tpt1, zzz3 = split_genes(get_expression(["Tpt1", "Zzz3"]))
+        (cd4,) = split_genes(get_expression(["Cd4"]))
+
+        data = merge_genes([cd4, tpt1])
+
+        assert data["orderedGeneNames"] == ["Cd4", "Tpt1"]
+        assert data["stats"]["rawMean"] == [0.5, 0.5]
+        assert data["rawExpression"] == {
+            "values": [1.0, 2.0, 1.0, 2.0],
+            "index": [0, 2, 0, 2],
+            "ptr": [0, 2, 4],
+            "size": [4, 2],
+        }
+
+    def test_least_recently_used_genes_are_evicted(self):
+        genes = split_genes(get_expression(["A", "B", "C"]))
+        gene_size = sum(
+            array.nbytes
+            for matrix in ("rawExpression", "truncatedExpression", "zScore")
+            for array in genes[0][matrix]
+        )
+
+        cache = GeneExpressionCache(max_size=2 * gene_size)
+        cache.put("A", [genes[0]])
+        cache.put("B", [genes[1]])
+        cache.get(["A"])
+        cache.put("C", [genes[2]])
+
+        assert list(cache.get(["A", "B", "C"])) == ["A", "C"]
+        assert cache.size == 2 * gene_size
+
+    def test_clear_removes_all_genes(self):
+        cache = GeneExpressionCache(max_size=1024)
+        cache.put("A", split_genes(get_expression(["A"])))
+
+        cache.clear()
+
+        assert cache.get(["A"]) == {}
+        assert cache.size == 0
+
+    def test_split_genes_returns_numpy_columns(self):
+        (gene,) = split_genes(get_expression(["A"]))
+
+        values, index = gene["zScore"]
+        assert values.dtype == np.float64
+        assert index.tolist() == [0, 2]
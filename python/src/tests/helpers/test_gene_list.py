@@ -0,0 +1,78 @@
+import pytest
+from worker.helpers.gene_list import GeneList, NameIndex
+
+GENE_NAMES = ["LINC1", "Cd3e", "lin2", "CD3D", "ALIN", "GAPDH"]
+DISPERSIONS = [1.5, 3.0, float("nan"), 3.0, 0.5, 2.0]
+
+
+class TestGeneList:
+    @pytest.fixture(autouse=True)
+    def build_gene_list(self):
+        self.gene_list = GeneList(GENE_NAMES, DISPERSIONS)
+
+    def matches(self, pattern):
+        mask = NameIndex(GENE_NAMES).match(pattern)
+        return [name for name, matched in zip(GENE_NAMES, mask) if matched]
+
+    def test_match_contains_ignoring_case(self):
+        assert self.matches("lin") == ["LINC1", "lin2", "ALIN"]
+        assert self.matches("") == GENE_NAMES
+
+    def test_match_starts_with(self):
+        assert self.matches("^lin") == ["LINC1", "lin2"]
+        assert self.matches("^cd3") == ["Cd3e", "CD3D"]
+
+    def test_match_ends_with(self):
+        assert self.matches("LIN$") == ["ALIN"]
+        assert self.matches("3d$") == ["CD3D"]
+
+    def test_match_exact(self):
+        assert self.matches("^gapdh$") == ["GAPDH"]
+        assert self.matches("^GAPD$") == []
+
+    def test_match_falls_back_to_regex(self):
+        assert self.matches("^cd3[de]$") == ["Cd3e", "CD3D"]
+        assert self.matches("^$LIN") == []
+        assert self.matches("[") == []
+
+    def test_query_sorts_by_dispersion(self):
+        result, total = self.gene_list.query("dispersions", "DESC", 0, 10)
+
+        assert total == 5
+        assert result["gene_names"] == ["Cd3e", "CD3D", "GAPDH", "LINC1", "ALIN"]
+        assert result["dispersions"] == [3.0, 3.0, 2.0, 1.5, 0.5]
+
+        result, _ = self.gene_list.query("dispersions", "ASC", 0, 10)
+        assert result["gene_names"] == ["ALIN", "LINC1", "GAPDH", "Cd3e", "CD3D"]
+
+    def test_query_leaves_out_genes_without_dispersion(self):
+        gene_list = GeneList(["A", "B", "C"], [None, float("nan"), 1.0])
+
+        for order_by in ["dispersions", "gene_names", "unknown"]:
+            result, total = gene_list.query(order_by, "ASC", 0, 10)
+
+            assert total == 1
+            assert result == {"gene_names": ["C"], "dispersions": [1.0]}
+
+    def test_query_sorts_by_name_ignoring_case(self):
+        result, _ = self.gene_list.query("gene_names", "ASC", 0, 10)
+
+        assert result["gene_names"] == [
+            "ALIN",
+            "CD3D",
+            "Cd3e",
+            "GAPDH",
+            "LINC1",
+        ]
+
+    def test_query_filters_and_paginates(self):
+        result, total = self.gene_list.query("gene_names", "DESC", 1, 1, "lin")
+
+        assert total == 2
+        assert result == {"gene_names": ["ALIN"], "dispersions": [0.5]}
+
+    def test_query_keeps_table_order_for_unknown_columns(self):
+        result, total = self.gene_list.query("unknown", "ASC", 0, 2)
+
+        assert total == 5
+        assert result["gene_names"] == ["LINC1", "Cd3e"]
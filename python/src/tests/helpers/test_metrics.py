@@ -0,0 +1,93 @@
+import json
+import threading
+import urllib.request
+
+import pytest
+from worker.helpers import metrics
+
+
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def isolate_registry(self, mocker):
+        self.registry = metrics.Registry()
+        mocker.patch.object(metrics, "registry", self.registry)
+
+    def test_stages_are_recorded_for_the_current_task(self, mocker):
+        log = mocker.patch.object(metrics, "info")
+
+        with metrics.task("GetEmbedding", "etag"):
+            with metrics.stage("r_call") as stage:
+                stage.bytes = 100
+
+            metrics.record("r_call", 0.5, 20)
+
+        r_call = self.registry.stages[("GetEmbedding", "r_call")]
+        assert r_call.count == 2
+        assert r_call.bytes == 120
+        assert ("GetEmbedding", "total") in self.registry.stages
+
+        line = json.loads(log.call_args.args[0])
+        assert line["type"] == "TaskMetrics"
+        assert line["task"] == "GetEmbedding"
+        assert line["etag"] == "etag"
+        assert line["stages"]["r_call"]["bytes"] == 120
+        assert line["stages"]["r_call"]["seconds"] >= 0.5
+
+    def test_stages_outside_of_tasks_are_recorded_as_unknown(self):
+        @metrics.timed("request_build")
+        def build():
+            return "request"
+
+        assert build() == "request"
+        metrics.record("sqs_wait", 1.0, task="ListGenes")
+
+        assert ("unknown", "request_build") in self.registry.stages
+        assert ("ListGenes", "sqs_wait") in self.registry.stages
+
+    def test_propagate_records_stages_of_other_threads_for_the_task(self, mocker):
+        mocker.patch.object(metrics, "info")
+
+        with metrics.task("BatchDifferentialExpression"):
+            thread = threading.Thread(
+                target=metrics.propagate(metrics.record), args=("r_call", 1.0)
+            )
+            thread.start()
+            thread.join()
+
+        assert ("BatchDifferentialExpression", "r_call") in self.registry.stages
+
+    def test_prometheus_text_format(self):
+        self.registry.record("ListGenes", "r_call", 0.2, 10)
+        self.registry.record("ListGenes", "r_call", 3, 5)
+
+        text = self.registry.to_prometheus()
+
+        labels = 'task="ListGenes",stage="r_call"'
+        assert "# TYPE worker_stage_duration_seconds histogram" in text
+        assert f'worker_stage_duration_seconds_bucket{{{labels},le="0.25"}} 1' in text
+        assert f'worker_stage_duration_seconds_bucket{{{labels},le="5"}} 2' in text
+        assert f'worker_stage_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+        assert f"worker_stage_duration_seconds_sum{{{labels}}} 3.2" in text
+        assert f"worker_stage_duration_seconds_count{{{labels}}} 2" in text
+        assert f"worker_stage_bytes_total{{{labels}}} 15" in text
+
+    def test_server_serves_the_metrics(self):
+        self.registry.record("ListGenes", "r_call", 0.2, 10)
+        server = metrics.start_server(0)
+
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                assert response.read().decode() == self.registry.to_prometheus()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_mean_seconds_of_a_stage(self):
+        assert self.registry.mean_seconds("ListGenes", "compute") is None
+
+        self.registry.record("ListGenes", "compute", 1)
+        self.registry.record("ListGenes", "compute", 2)
+
+        assert self.registry.mean_seconds("ListGenes", "compute") == 1.5
@@ -0,0 +1,118 @@
+import threading
+
+import msgpack
+import pytest
+import redis
+
+from worker.config import config
+from worker.helpers.notifier import Notifier
+
+
+class Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.messages = []
+
+    def publish(self, channel, message):
+        self.messages.append((channel, msgpack.unpackb(message, raw=False)))
+
+    def execute(self):
+        self.client.before_execute()
+
+        if self.client.failures:
+            self.client.failures -= 1
+            raise redis.exceptions.ConnectionError("Connection reset by peer")
+
+        self.client.executed.append(self.messages)
+
+
+class Client:
+    def __init__(self, failures=0):
+        self.executed = []
+        self.failures = failures
+
+    def pipeline(self, transaction=True):
+        return Pipeline(self)
+
+    def before_execute(self):
+        pass
+
+
+class TestNotifier:
+    @pytest.fixture(autouse=True)
+    def set_up(self, mocker):
+        self.client = Client()
+        mocker.patch.object(config, "REDIS_CLIENT", self.client, create=True)
+
+        # Don't wait between retries
+        mocker.patch("backoff._sync.time.sleep")
+
+        self.notifier = Notifier()
+
+    def events(self, executed):
+        return [message[1]["data"] for _, message in executed]
+
+    def test_events_of_an_emit_are_published_in_one_round_trip(self):
+        self.notifier.emit([("Heartbeat-id", {"type": "a"}), ("WorkResponse-e", 1)])
+
+        assert len(self.client.executed) == 1
+        channel, message = self.client.executed[0][0]
+        assert channel == "socket.io#/#"
+        assert message[0] == "emitter"
+        assert self.events(self.client.executed[0]) == [
+            ["Heartbeat-id", {"type": "a"}],
+            ["WorkResponse-e", 1],
+        ]
+
+    def test_events_emitted_while_publishing_are_published_together(self):
+        publishing = threading.Event()
+        release = threading.Event()
+
+        def before_execute():
+            if not publishing.is_set():
+                publishing.set()
+                release.wait(timeout=5)
+
+        self.client.before_execute = before_execute
+
+        first = threading.Thread(target=self.notifier.emit, args=([("first", 0)],))
+        first.start()
+        publishing.wait(timeout=5)
+
+        others = [
+            threading.Thread(target=self.notifier.emit, args=([(f"event-{i}", i)],))
+            for i in range(3)
+        ]
+        for thread in others:
+            thread.start()
+
+        # All the others wait for the first batch before publishing theirs
+        while len(self.notifier.next_batch.events) < 3:
+            threading.Event().wait(0.01)
+
+        release.set()
+        for thread in [first, *others]:
+            thread.join(timeout=5)
+
+        assert len(self.client.executed) == 2
+        assert self.events(self.client.executed[0]) == [["first", 0]]
+        assert sorted(self.events(self.client.executed[1])) == [
+            [f"event-{i}", i] for i in range(3)
+        ]
+
+    def test_publishing_is_retried_when_the_connection_drops(self):
+        self.client.failures = 1
+
+        self.notifier.emit([("WorkResponse-etag", 1)])
+
+        assert self.events(self.client.executed[0]) == [["WorkResponse-etag", 1]]
+
+    def test_errors_are_raised_to_the_emitters(self):
+        self.client.failures = 3
+
+        with pytest.raises(redis.exceptions.ConnectionError):
+            self.notifier.emit([("WorkResponse-etag", 1)])
+
+        # The next emit is published once Redis is back
+        self.notifier.emit([("WorkResponse-etag", 1)])
+        assert len(self.client.executed) == 1
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+import responses
+from exceptions import RWorkerException
+from worker.config import config
+from worker.helpers import r_worker, typed_arrays
+from worker.helpers.r_worker import CONNECT_TIMEOUT, send_r_request, session
+
+
+class TestRWorker:
+    @responses.activate
+    def test_send_r_request_posts_json_and_returns_the_result(self):
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/getEmbedding",
+            json={"data": [[1, 2], [3, 4]]},
+            status=200,
+        )
+
+        result = send_r_request("getEmbedding", {"type": "umap"})
+
+        assert result == {"data": [[1, 2], [3, 4]]}
+        assert len(responses.calls) == 1
+        assert json.loads(responses.calls[0].request.body) == {"type": "umap"}
+        request = responses.calls[0].request
+        assert request.headers["content-type"] == "application/json"
+
+    @responses.activate
+    def test_send_r_request_raises_on_r_worker_error(self):
+        payload = {
+            "error": {"error_code": "MOCK_ERROR", "user_message": "Some worker error"}
+        }
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/getNUmis",
+            json=payload,
+            status=200,
+        )
+
+        with pytest.raises(RWorkerException) as exc_info:
+            send_r_request("getNUmis", {})
+
+        assert exc_info.value.args[0] == "MOCK_ERROR"
+        assert len(responses.calls) == 1
+
+    def test_send_r_request_waits_for_the_answer_without_limit(self, mocker):
+        post = mocker.patch.object(session, "post")
+        post.return_value.content = b'{"data": {}}'
+
+        send_r_request("runExpression", {})
+        assert post.call_args.kwargs["timeout"] == (CONNECT_TIMEOUT, None)
+
+    def test_send_r_request_uses_the_configured_timeout(self, mocker):
+        mocker.patch.object(config, "R_WORKER_TIMEOUT", 120)
+        post = mocker.patch.object(session, "post")
+        post.return_value.content = b'{"data": {}}'
+
+        send_r_request("runExpression", {})
+        assert post.call_args.kwargs["timeout"] == (CONNECT_TIMEOUT, 120)
+
+    @responses.activate
+    def test_send_r_request_sends_long_arrays_as_typed_arrays(self, mocker):
+        mocker.patch.object(r_worker, "typed_arrays_enabled", True)
+        request = {"cellIds": list(range(typed_arrays.MIN_LENGTH))}
+        result = {"data": {"embedding": [1.5] * typed_arrays.MIN_LENGTH}}
+
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/getEmbedding",
+            body=typed_arrays.encode(result),
+            content_type=typed_arrays.CONTENT_TYPE,
+            status=200,
+        )
+
+        assert send_r_request("getEmbedding", request) == result
+
+        sent = responses.calls[0].request
+        assert sent.headers["content-type"] == typed_arrays.CONTENT_TYPE
+        assert sent.headers["accept"].startswith(typed_arrays.CONTENT_TYPE)
+        assert typed_arrays.decode(sent.body) == request
+
+    @responses.activate
+    def test_send_r_request_falls_back_to_json(self, mocker):
+        mocker.patch.object(r_worker, "typed_arrays_enabled", True)
+        request = {"cellIds": list(range(typed_arrays.MIN_LENGTH))}
+        url = f"{config.R_WORKER_URL}/v0/getEmbedding"
+
+        responses.add(responses.POST, url, status=415)
+        responses.add(responses.POST, url, json={"data": []}, status=200)
+
+        assert send_r_request("getEmbedding", request) == {"data": []}
+
+        assert len(responses.calls) == 2
+        assert json.loads(responses.calls[1].request.body) == request
+        assert not r_worker.typed_arrays_enabled
@@ -5,34 +5,36 @@ from unittest import TestCase
 
 import boto3
 import mock
+import numpy as np
+import pytest
 from botocore.stub import Stubber
 from tests.data.embedding import mock_embedding
 from worker.config import config
-from worker.helpers.s3 import get_embedding
+from worker.helpers import s3 as s3_helpers
+from worker.helpers.s3 import get_cell_sets, get_embedding
+from worker.helpers.serializer import dumps
 
 mock_embedding_etag = "mockEmbeddingETag"
 
+@pytest.mark.usefixtures("isolate_embedding_cache")
 class TestS3:
-    def get_s3_stub(self):
+    def get_s3_stub(self, encoding=None):
         s3 = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
-        response = {
-            "ContentLength": 10,
-            "ContentType": "utf-8",
-            "ResponseMetadata": {
-                "Bucket": config.RESULTS_BUCKET,
-            },
-        }
 
         expected_params = {
             "Bucket": config.RESULTS_BUCKET,
             "Key": mock_embedding_etag,
         }
         stubber = Stubber(s3)
-        stubber.add_response("head_object", response, expected_params)
 
         # Get object
         content_string = json.dumps(mock_embedding).encode("utf-8")
         content_bytes = gzip.compress(content_string)
+
+        # Results without an encoding were uploaded gzipped
+        if encoding == "identity":
+            content_bytes = content_string
+
         data = io.BytesIO()
         data.write(content_bytes)
         data.seek(0)
@@ -45,9 +47,42 @@ class TestS3:
                 "Bucket": config.RESULTS_BUCKET,
             },
         }
+
+        if encoding:
+            response["ContentEncoding"] = encoding
+
         stubber.add_response("get_object", response, expected_params)
         return (stubber, s3)
 
+    @pytest.mark.parametrize("encoding", [None, "gzip", "identity"])
+    def test_get_embedding_decodes_the_encoding_of_the_result(self, encoding):
+        stubber, s3 = self.get_s3_stub(encoding)
+
+        with mock.patch("boto3.client") as n, stubber:
+            n.return_value = s3
+
+            embedding = get_embedding(mock_embedding_etag, format_for_r=False)
+
+        assert len(embedding) == len(mock_embedding)
+        stubber.assert_no_pending_responses()
+
+    def test_embedding_is_only_downloaded_once(self):
+        stubber, s3 = self.get_s3_stub()
+
+        with mock.patch("boto3.client") as n, stubber:
+            n.return_value = s3
+
+            first = get_embedding(mock_embedding_etag, format_for_r=False)
+
+            # The stubber has no more responses, so a download would fail
+            assert get_embedding(mock_embedding_etag, format_for_r=False) == first
+
+            # Once it is out of memory, it is mapped from its file again
+            s3_helpers._embedding_cache.clear()
+            assert get_embedding(mock_embedding_etag, format_for_r=False) == first
+
+        assert n.call_count == 1
+
     def test_get_embedding_should_not_replace_nulls_if_not_formatted_for_r(self):
       stubber, s3 = self.get_s3_stub()
 
@@ -67,21 +102,72 @@ class TestS3:
             else:
               assert val is not None
 
-    def test_get_embedding_should_replace_nulls_if_formatted_for_r(self):
+    def test_get_embedding_is_sent_to_r_as_the_array(self):
       stubber, s3 = self.get_s3_stub()
 
-      na_positions = []
-      for idx, val in enumerate(mock_embedding):
-        if val is None:
-          na_positions.append(idx)
-
       with mock.patch("boto3.client") as n, stubber:
           n.return_value = s3
 
-          request = get_embedding(mock_embedding_etag, format_for_r=True)
+          embedding = get_embedding(mock_embedding_etag, format_for_r=True)
 
-          for idx, val in enumerate(request):
-            if idx in na_positions:
-              assert val == ['NA', 'NA']
-            else:
-              assert val is not None
\ No newline at end of file
+      assert isinstance(embedding, np.ndarray)
+      assert embedding.shape == (len(mock_embedding), 2)
+
+      # Filtered cells keep their row, as a pair of nulls R reads as NAs
+      encoded = json.loads(dumps({"embedding": embedding}))["embedding"]
+      for val, row in zip(mock_embedding, encoded):
+          if val is None:
+              assert row == [None, None]
+          else:
+              assert row == pytest.approx(val, rel=1e-6)
+
+    def add_cell_sets_responses(self, stubber, etag, cell_sets=None):
+        expected_params = {
+            "Bucket": config.CELL_SETS_BUCKET,
+            "Key": config.EXPERIMENT_ID,
+        }
+        stubber.add_response("head_object", {"ETag": etag}, expected_params)
+
+        if cell_sets is None:
+            return
+
+        content_bytes = json.dumps({"cellSets": cell_sets}).encode("utf-8")
+        response = {
+            "ContentLength": len(content_bytes),
+            "ETag": etag,
+            "Body": io.BytesIO(content_bytes),
+        }
+        stubber.add_response("get_object", response, expected_params)
+
+    def test_get_cell_sets_only_downloads_cell_sets_once_if_unchanged(self):
+        s3 = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
+        stubber = Stubber(s3)
+        cell_sets = [{"key": "louvain", "children": []}]
+
+        self.add_cell_sets_responses(stubber, '"first-etag"', cell_sets)
+        self.add_cell_sets_responses(stubber, '"first-etag"')
+
+        with mock.patch.object(s3_helpers, "_cell_sets_cache", {}):
+            with mock.patch("boto3.client") as n, stubber:
+                n.return_value = s3
+
+                assert get_cell_sets(config.EXPERIMENT_ID) == cell_sets
+                assert get_cell_sets(config.EXPERIMENT_ID) == cell_sets
+                stubber.assert_no_pending_responses()
+
+    def test_get_cell_sets_downloads_cell_sets_again_if_changed(self):
+        s3 = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
+        stubber = Stubber(s3)
+        old_cell_sets = [{"key": "louvain", "children": []}]
+        new_cell_sets = [{"key": "scratchpad", "children": []}]
+
+        self.add_cell_sets_responses(stubber, '"first-etag"', old_cell_sets)
+        self.add_cell_sets_responses(stubber, '"second-etag"', new_cell_sets)
+
+        with mock.patch.object(s3_helpers, "_cell_sets_cache", {}):
+            with mock.patch("boto3.client") as n, stubber:
+                n.return_value = s3
+
+                assert get_cell_sets(config.EXPERIMENT_ID) == old_cell_sets
+                assert get_cell_sets(config.EXPERIMENT_ID) == new_cell_sets
+                stubber.assert_no_pending_responses()
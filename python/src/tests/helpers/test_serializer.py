@@ -0,0 +1,49 @@
+import json
+
+import numpy as np
+from worker.helpers.serializer import ITEMS_PER_CHUNK, dumps, iterencode, loads
+
+
+class TestSerializer:
+    def test_dumps_returns_json_bytes(self):
+        data = {"genes": ["a", "b"], "values": [1, 2.5, None], "valid": True}
+
+        encoded = dumps(data)
+
+        assert isinstance(encoded, bytes)
+        assert json.loads(encoded) == data
+
+    def test_dumps_encodes_numpy_types(self):
+        data = {
+            "ids": np.array([1, 2, 3], dtype=np.int32),
+            "values": np.array([[0.5, 1.5]], dtype=np.float32),
+            "count": np.int64(3),
+        }
+
+        assert json.loads(dumps(data)) == {
+            "ids": [1, 2, 3],
+            "values": [[0.5, 1.5]],
+            "count": 3,
+        }
+
+    def test_dumps_encodes_nan_in_arrays_as_null(self):
+        embedding = np.array([[0.5, 1.5], [np.nan, np.nan]], dtype=np.float32)
+        data = {"embedding": embedding}
+
+        assert json.loads(dumps(data)) == {"embedding": [[0.5, 1.5], [None, None]]}
+
+    def test_iterencode_matches_dumps(self):
+        data = {
+            "cellIds": list(range(3 * ITEMS_PER_CHUNK + 1)),
+            "nested": {"a": [{"b": 1}], 1: "non string key"},
+            "empty": [],
+        }
+
+        encoded = b"".join(iterencode(data))
+
+        assert json.loads(encoded) == json.loads(dumps(data))
+        assert json.loads(encoded)["nested"]["1"] == "non string key"
+
+    def test_loads_decodes_bytes_and_strings(self):
+        assert loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+        assert loads('{"a": [1, 2]}') == {"a": [1, 2]}
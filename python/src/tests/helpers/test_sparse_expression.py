@@ -0,0 +1,46 @@
+import json
+import math
+
+from tests.data.gene_expression import mock_gene_expression
+from worker.helpers import sparse_expression
+from worker.helpers.typed_arrays import decode
+
+
+def get_header(content):
+    header_length = int.from_bytes(content[:4], "little")
+    return json.loads(content[4:4 + header_length])
+
+
+class TestSparseExpression:
+    def test_wants_typed_arrays(self):
+        assert sparse_expression.wants_typed_arrays({"resultFormat": "typedArrays"})
+        assert not sparse_expression.wants_typed_arrays({"name": "GeneExpression"})
+
+    def test_matrices_are_packed_and_the_rest_stays_in_the_header(self):
+        data = mock_gene_expression(["Tpt1", "Zzz3"])
+
+        header = get_header(sparse_expression.encode(data))
+
+        assert header["body"]["orderedGeneNames"] == ["Tpt1", "Zzz3"]
+        assert header["body"]["stats"] == data["stats"]
+        assert header["body"]["zScore"] == {
+            "values": {"__buffer__": 6},
+            "index": {"__buffer__": 7},
+            "ptr": {"__buffer__": 8},
+            "size": [4, 2],
+        }
+        assert header["buffers"]["types"] == ["float32", "int32", "int32"] * 3
+
+    def test_decode_returns_the_result(self):
+        data = mock_gene_expression(["Tpt1", "Zzz3"])
+
+        assert decode(sparse_expression.encode(data)) == data
+
+    def test_missing_values_are_encoded_as_nan(self):
+        data = mock_gene_expression(["Tpt1"])
+        data["zScore"] = {**data["zScore"], "values": [None, 1.0]}
+
+        decoded = decode(sparse_expression.encode(data))
+
+        assert math.isnan(decoded["zScore"]["values"][0])
+        assert decoded["zScore"]["values"][1] == 1.0
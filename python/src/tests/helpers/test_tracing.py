@@ -0,0 +1,77 @@
+import threading
+
+import boto3
+import pytest
+from aws_xray_sdk.core import xray_recorder
+from aws_xray_sdk.core.models.dummy_entities import DummySegment
+from botocore.stub import Stubber
+from worker.helpers import tracing
+from worker.helpers.s3 import upload_fileobj
+
+TRACE_HEADER = (
+    "Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f42cd8ad8;Sampled=1"
+)
+
+
+@pytest.mark.usefixtures("tracing_enabled")
+class TestTracing:
+    def test_segments_without_trace_header_are_not_sampled(self):
+        segment = tracing.begin_segment()
+
+        assert isinstance(segment, DummySegment)
+        assert xray_recorder.current_segment() is segment
+
+    def test_segments_with_trace_header_continue_the_trace(self):
+        segment = tracing.begin_segment(TRACE_HEADER)
+
+        assert segment.sampled
+        assert segment.trace_id == "1-5759e988-bd862e3fe1be46a994272793"
+        assert segment.parent_id == "53995c3f42cd8ad8"
+
+    def test_detached_segment_is_taken_off_the_thread(self):
+        segment = tracing.begin_segment(TRACE_HEADER)
+
+        assert tracing.detach_segment() is segment
+        assert tracing.get_trace_entity() is None
+
+    def test_segment_is_sent_once_ended_on_another_thread(self, tracing_enabled):
+        segment = tracing.begin_segment(TRACE_HEADER)
+        tracing.detach_segment()
+
+        thread = threading.Thread(target=tracing.end_segment, args=(segment,))
+        thread.start()
+        thread.join()
+
+        tracing_enabled.send_entity.assert_called_once_with(segment)
+
+    def test_pool_threads_trace_as_part_of_the_caller(self):
+        segment = tracing.begin_segment(TRACE_HEADER)
+
+        with tracing.TracedThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(xray_recorder.current_segment) for _ in range(4)
+            ]
+
+        assert all(future.result() is segment for future in futures)
+
+    def test_uploads_are_traced_as_part_of_the_caller(self):
+        segment = tracing.begin_segment(TRACE_HEADER)
+
+        client = boto3.client("s3", region_name="eu-west-1")
+        stubber = Stubber(client)
+        stubber.add_response("put_object", {})
+
+        with stubber:
+            upload_fileobj(client, _File(b"data"), "bucket", "key")
+
+        stubber.assert_no_pending_responses()
+        assert [s.name for s in segment.subsegments] == ["s3"]
+
+
+class _File:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size=-1):
+        data, self.data = self.data, b""
+        return data
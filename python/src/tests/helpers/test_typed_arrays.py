@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+from worker.helpers.typed_arrays import MIN_LENGTH, decode, encode
+
+
+class TestTypedArrays:
+    def test_long_numeric_arrays_are_packed_as_buffers(self):
+        request = {
+            "baseCells": list(range(MIN_LENGTH)),
+            "nested": {"values": np.linspace(0, 1, MIN_LENGTH)},
+            "genesOnly": False,
+        }
+
+        content = encode(request)
+
+        header_length = int.from_bytes(content[:4], "little")
+        header = json.loads(content[4:4 + header_length])
+
+        assert header["body"]["baseCells"] == {"__buffer__": 0}
+        assert header["body"]["nested"]["values"] == {"__buffer__": 1}
+        assert header["buffers"] == {
+            "types": ["int32", "float64"],
+            "offsets": [0, 4 * MIN_LENGTH],
+            "lengths": [MIN_LENGTH, MIN_LENGTH],
+        }
+        assert len(content) == 4 + header_length + 12 * MIN_LENGTH
+
+    def test_decode_returns_the_encoded_data(self):
+        request = {
+            "baseCells": list(range(MIN_LENGTH)),
+            "backgroundCells": list(range(-MIN_LENGTH, 0)),
+            "nested": {"values": [0.5] * MIN_LENGTH},
+        }
+
+        assert decode(encode(request)) == request
+
+    def test_arrays_that_cannot_be_typed_stay_in_the_header(self):
+        request = {
+            "names": ["a"] * MIN_LENGTH,
+            "missing": [1, None] * MIN_LENGTH,
+            "pairs": [[1, 2]] * MIN_LENGTH,
+            "large": [2 ** 40] * MIN_LENGTH,
+            "ids": list(range(MIN_LENGTH)),
+        }
+
+        content = encode(request)
+        header_length = int.from_bytes(content[:4], "little")
+        header = json.loads(content[4:4 + header_length])
+
+        assert header["body"]["names"] == request["names"]
+        assert header["body"]["missing"] == request["missing"]
+        assert header["body"]["pairs"] == request["pairs"]
+        assert header["body"]["large"] == request["large"]
+        assert header["body"]["ids"] == {"__buffer__": 0}
+
+    def test_float32_arrays_are_packed_as_float32(self):
+        request = {"values": np.linspace(0, 1, MIN_LENGTH, dtype=np.float32)}
+
+        content = encode(request)
+        header_length = int.from_bytes(content[:4], "little")
+        header = json.loads(content[4:4 + header_length])
+
+        assert header["buffers"]["types"] == ["float32"]
+        assert len(content) == 4 + header_length + 4 * MIN_LENGTH
+        assert decode(content) == {"values": request["values"].tolist()}
+
+    def test_min_length_only_applies_to_numpy_arrays(self):
+        request = {
+            "index": np.array([0, 2], dtype=np.int32),
+            "empty": np.array([], dtype=np.int32),
+            "stats": [0.5, 1.5],
+        }
+
+        content = encode(request, min_length=0)
+        header_length = int.from_bytes(content[:4], "little")
+        header = json.loads(content[4:4 + header_length])
+
+        assert header["body"] == {
+            "index": {"__buffer__": 0},
+            "empty": {"__buffer__": 1},
+            "stats": [0.5, 1.5],
+        }
+        assert decode(content) == {"index": [0, 2], "empty": [], "stats": [0.5, 1.5]}
+
+    def test_encode_returns_none_without_long_arrays(self):
+        assert encode({"cellIds": [1, 2, 3], "name": "GetEmbedding"}) is None
+
+    def test_decode_matrices_into_rows(self):
+        header = json.dumps(
+            {
+                "body": {"data": [{"__buffer__": 0}], "error": None},
+                "buffers": {
+                    "types": ["float64"],
+                    "offsets": [0],
+                    "lengths": [6],
+                    "rows": [3],
+                },
+            }
+        ).encode("utf-8")
+        buffer = np.arange(6, dtype="<f8").tobytes()
+
+        content = len(header).to_bytes(4, "little") + header + buffer
+
+        assert decode(content) == {
+            "data": [[[0.0, 1.0], [2.0, 3.0], [4.0, 5.0]]],
+            "error": None,
+        }
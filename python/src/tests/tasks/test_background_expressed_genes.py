@@ -0,0 +1,69 @@
+import json
+
+import pytest
+import responses
+from exceptions import RWorkerException
+from tests.data.cell_set_types import cell_set_types
+from worker.config import config
+from worker.helpers.cell_set_index import CellSetIndex
+from worker.tasks.background_expressed_genes import GetBackgroundExpressedGenes
+
+
+class TestBackgroundExpressedGenes:
+    @pytest.fixture(autouse=True)
+    def set_up(self, mocker):
+        self.request = {
+            "experimentId": config.EXPERIMENT_ID,
+            "timeout": "2099-12-31 00:00:00",
+            "body": {
+                "name": "GetBackgroundExpressedGenes",
+                "cellSet": "cluster1",
+                "compareWith": "cluster2",
+                "basis": "all",
+            },
+        }
+
+        mocker.patch(
+            "worker.tasks.background_expressed_genes.get_cell_set_index",
+            return_value=CellSetIndex(
+                cell_set_types["hierarchichal_sets"]["cellSets"]
+            ),
+        )
+
+    def test_throws_on_missing_parameters(self):
+        with pytest.raises(TypeError):
+            GetBackgroundExpressedGenes()
+
+    def test_request_has_the_cells_of_both_sets(self):
+        request = GetBackgroundExpressedGenes(self.request)._format_request()
+
+        assert request == {"baseCells": [4], "backgroundCells": [5, 6]}
+
+    @responses.activate
+    def test_returns_the_genes_of_the_r_worker(self):
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/getBackgroundExpressedGenes",
+            json={"data": {"genes": ["CD3E", "GAPDH"]}},
+            status=200,
+        )
+
+        result = GetBackgroundExpressedGenes(self.request).compute()
+
+        assert result.data == {"genes": ["CD3E", "GAPDH"]}
+        sent = json.loads(responses.calls[0].request.body)
+        assert sent == {"baseCells": [4], "backgroundCells": [5, 6]}
+
+    @responses.activate
+    def test_should_throw_exception_on_r_worker_error(self):
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/getBackgroundExpressedGenes",
+            json={"error": {"error_code": "R_ERROR", "user_message": "Failed"}},
+            status=200,
+        )
+
+        with pytest.raises(RWorkerException) as exc_info:
+            GetBackgroundExpressedGenes(self.request).compute()
+
+        assert exc_info.value.args[0] == "R_ERROR"
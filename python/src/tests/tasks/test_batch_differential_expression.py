@@ -5,12 +5,16 @@ from exceptions import ErrorCodes, PythonWorkerException
 from tests.data.cell_set_types import cell_set_types
 from worker.config import config
 from worker.tasks.batch_differential_expression import BatchDifferentialExpression
+from worker.helpers import tracing
 from worker.helpers.s3 import get_cell_sets
 from unittest.mock import patch, MagicMock
 from botocore.stub import Stubber
 import io
 import boto3
 
+TRACE_HEADER = "Root=1-5759e988-bd862e3fe1be46a994272793;Sampled=1"
+
+
 class TestBatchDifferentialExpression:
     def get_request(
         self,
@@ -92,8 +96,8 @@ class TestBatchDifferentialExpression:
             }
             mock_format_request.side_effect = [PythonWorkerException(ErrorCodes.INVALID_INPUT, "No data available for this comparison"), valid_request]
 
-            with patch('requests.post') as mock_post:
-                mock_post.return_value = MagicMock(status_code=200, json=lambda: {"data": {"full_count": 10, "gene_results": "Some gene results"}})
+            with patch('worker.helpers.r_worker.session.post') as mock_post:
+                mock_post.return_value = MagicMock(status_code=200, content=b'{"data": {"full_count": 10, "gene_results": "Some gene results"}}')
 
                 with patch("boto3.client") as n, stubber:
                     n.return_value = s3
@@ -103,3 +107,66 @@ class TestBatchDifferentialExpression:
                     assert len(result.data) == len(basis)
                     assert {"total": 0, "data": "No data available for this comparison"} in result.data
                     assert {"total": 10, "data": "Some gene results"} in result.data
+
+    def test_comparisons_are_published_as_they_finish(self):
+        basis = ["louvain-0", "louvain-1", "louvain-2"]
+        request_data = self.get_request(cellSet=["cluster1"], basis=basis)
+        request_data["ETag"] = "batch-etag"
+
+        def format_request(base_cs, first_cs, second_cell_set_name, cell_set_index):
+            return {"baseCells": [base_cs]}
+
+        def send_r_request(endpoint, request):
+            return {"data": {"full_count": 1, "gene_results": request["baseCells"][0]}}
+
+        with patch(
+            "worker.tasks.batch_differential_expression.get_cell_set_index"
+        ), patch.object(
+            BatchDifferentialExpression, "_format_request", side_effect=format_request
+        ), patch(
+            "worker.tasks.batch_differential_expression.send_r_request",
+            side_effect=send_r_request,
+        ), patch(
+            "worker.tasks.batch_differential_expression.notifier"
+        ) as notifier:
+            result = BatchDifferentialExpression(request_data).compute()
+
+        assert result.data == [{"total": 1, "data": b} for b in basis]
+
+        emits = notifier.emit.call_args_list
+        assert len(emits) == len(basis)
+
+        for [(channel, message)] in (emit.args[0] for emit in emits):
+            assert channel == "PartialWorkResponse-batch-etag"
+            assert message["count"] == len(basis)
+            assert message["result"] == {"total": 1, "data": basis[message["index"]]}
+
+    @responses.activate
+    @pytest.mark.usefixtures("tracing_enabled")
+    def test_comparisons_are_traced_as_part_of_the_task(self):
+        basis = ["louvain-0", "louvain-1", "louvain-2"]
+        request_data = self.get_request(cellSet=["cluster1"], basis=basis)
+
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/DifferentialExpression",
+            json={"data": {"full_count": 1, "gene_results": "Some gene results"}},
+        )
+
+        segment = tracing.begin_segment(TRACE_HEADER)
+
+        with patch(
+            "worker.tasks.batch_differential_expression.get_cell_set_index"
+        ), patch.object(
+            BatchDifferentialExpression,
+            "_format_request",
+            return_value={"baseCells": [1]},
+        ), patch(
+            "worker.tasks.batch_differential_expression.notifier"
+        ):
+            result = BatchDifferentialExpression(request_data).compute()
+
+        assert result.data == [{"total": 1, "data": "Some gene results"}] * 3
+
+        [compute] = segment.subsegments
+        assert len(compute.subsegments) == len(basis)
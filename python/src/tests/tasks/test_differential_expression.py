@@ -11,10 +11,31 @@ from botocore.stub import Stubber
 from exceptions import RWorkerException
 from tests.data.cell_set_types import cell_set_types
 from worker.config import config
+from worker.helpers import diff_expr_cache
+from worker.helpers.cell_set_index import CellSetIndex
 from worker.tasks.differential_expression import DifferentialExpression
 
+DE_RESULT = {
+    "gene_results": {
+        "p_val": [0.01, 0.5, 0.001],
+        "logFC": [1.5, -0.2, 3.0],
+        "gene_names": ["CD3E", "GAPDH", "CD3D"],
+        "Gene": ["ENSG1", "ENSG2", "ENSG3"],
+    },
+    "full_count": 3,
+}
+
 
 class TestDifferentialExpression:
+    @pytest.fixture(autouse=True)
+    def clear_diff_expr_cache(self, mocker):
+        mocker.patch.object(
+            diff_expr_cache, "cache", diff_expr_cache.DiffExprCache(16)
+        )
+        mocker.patch(
+            "worker.tasks.differential_expression.cache", diff_expr_cache.cache
+        )
+
     def get_request(
         self,
         cellSet="cluster1",
@@ -226,3 +247,62 @@ class TestDifferentialExpression:
 
             assert exc_info.value.args[0] == error_code
             assert exc_info.value.args[1] == user_message
+
+    @responses.activate
+    def test_pages_are_taken_from_the_cached_result(self, mocker):
+        mocker.patch(
+            "worker.tasks.differential_expression.get_cell_set_index",
+            return_value=CellSetIndex(
+                cell_set_types["hierarchichal_sets"]["cellSets"]
+            ),
+        )
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/DifferentialExpression",
+            json={"data": DE_RESULT},
+            status=200,
+        )
+
+        request = self.get_request(cellSet="cluster1", compareWith="cluster2")
+
+        request["pagination"] = {
+            "orderBy": "logFC",
+            "orderDirection": "DESC",
+            "offset": 0,
+            "limit": 2,
+        }
+        result = DifferentialExpression(request).compute().data
+
+        assert result["total"] == 3
+        assert result["data"]["gene_names"] == ["CD3D", "CD3E"]
+
+        request["pagination"] = {
+            "orderBy": "p_val",
+            "orderDirection": "ASC",
+            "offset": 0,
+            "limit": 10,
+            "filters": [
+                {"type": "text", "columnName": "gene_names", "expression": "^CD3"},
+                {
+                    "type": "numeric",
+                    "columnName": "p_val",
+                    "comparison": "lessThan",
+                    "value": 0.005,
+                },
+            ],
+        }
+        result = DifferentialExpression(request).compute().data
+
+        assert result == {
+            "total": 1,
+            "data": {
+                "p_val": [0.001],
+                "logFC": [3.0],
+                "gene_names": ["CD3D"],
+                "Gene": ["ENSG3"],
+            },
+        }
+
+        # The full result is computed once, without the pagination
+        assert len(responses.calls) == 1
+        assert "pagination" not in json.loads(responses.calls[0].request.body)
@@ -4,12 +4,21 @@ import os
 import numpy as np
 import pytest
 import responses
-from exceptions import RWorkerException
+from exceptions import ErrorCodes, RWorkerException
+from tests.data.gene_expression import mock_gene_expression
 from worker.config import config
+from worker.helpers import typed_arrays
+from worker.helpers.gene_expression_cache import cache
 from worker.tasks.gene_expression import GeneExpression
 
 
 class TestGeneExpression:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+        yield
+        cache.clear()
+
     @pytest.fixture(autouse=True)
     def load_correct_definition(self):
         self.correct_one_gene = {
@@ -56,3 +65,71 @@ class TestGeneExpression:
 
         assert exception_info.value.args[0] == error_code
         assert exception_info.value.args[1] == user_message
+
+    def add_expression_response(self):
+        def callback(request):
+            genes = json.loads(request.body)["genes"]
+            found = [gene for gene in genes if gene != "Missing"]
+
+            if not found:
+                error = {
+                    "error_code": ErrorCodes.GENE_NOT_FOUND,
+                    "user_message": "Gene(s): Missing not found!",
+                }
+                return (200, {}, json.dumps({"error": error}))
+
+            return (200, {}, json.dumps({"data": mock_gene_expression(found)}))
+
+        responses.add_callback(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/runExpression",
+            callback=callback,
+            content_type="application/json",
+        )
+
+    def get_request(self, genes):
+        body = {"name": "GeneExpression", "genes": genes}
+        return {**self.correct_request, "body": body}
+
+    @responses.activate
+    def test_only_genes_that_are_not_cached_are_fetched(self):
+        self.add_expression_response()
+
+        GeneExpression(self.get_request(["Tpt1", "Zzz3"])).compute()
+        result = GeneExpression(self.get_request(["Cd4", "tpt1", "Zzz3"])).compute()
+
+        assert len(responses.calls) == 2
+        assert json.loads(responses.calls[1].request.body)["genes"] == ["Cd4"]
+
+        assert result.data["orderedGeneNames"] == ["Cd4", "Tpt1", "Zzz3"]
+        assert result.data["rawExpression"]["ptr"] == [0, 2, 4, 6]
+        assert result.data["rawExpression"]["size"] == [4, 3]
+
+    @responses.activate
+    def test_genes_that_are_not_found_are_left_out(self):
+        self.add_expression_response()
+
+        GeneExpression(self.get_request(["Tpt1"])).compute()
+        result = GeneExpression(self.get_request(["Tpt1", "Missing"])).compute()
+
+        assert result.data["orderedGeneNames"] == ["Tpt1"]
+
+        with pytest.raises(RWorkerException) as exception_info:
+            GeneExpression(self.get_request(["Missing"])).compute()
+
+        assert exception_info.value.args[0] == ErrorCodes.GENE_NOT_FOUND
+
+    @responses.activate
+    def test_result_is_encoded_as_typed_arrays_if_requested(self):
+        self.add_expression_response()
+
+        request = self.get_request(["Tpt1", "Zzz3"])
+        request["body"]["resultFormat"] = "typedArrays"
+
+        result = GeneExpression(request).compute()
+
+        assert result.content_type == typed_arrays.CONTENT_TYPE
+
+        data = typed_arrays.decode(result.data)
+        assert data["orderedGeneNames"] == ["Tpt1", "Zzz3"]
+        assert data["rawExpression"]["ptr"] == [0, 2, 4]
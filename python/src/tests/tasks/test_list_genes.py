@@ -2,10 +2,15 @@ import pytest
 import responses
 from exceptions import RWorkerException
 from worker.config import config
+from worker.helpers import gene_list
 from worker.tasks.list_genes import ListGenes
 
 
 class TestListGenes:
+    @pytest.fixture(autouse=True)
+    def clear_gene_list(self, mocker):
+        mocker.patch.object(gene_list, "_gene_list", None)
+
     @pytest.fixture(autouse=True)
     def load_correct_definition(self):
         self.correct_desc = {
@@ -82,27 +87,50 @@ class TestListGenes:
     @responses.activate
     def test_formats_result_appropriately(self):
         payload = {
-            'data':{
-                'gene_results':{
-                    'gene_names': ['gene1', 'gene2', 'gene2'],
-                    'dispersions': [4, 420, 1],
-                },
-                'full_count': 3
+            'data': {
+                'gene_names': ['gene1', 'gene2', 'gene3'],
+                'dispersions': [4, 420, 1],
             }
         }
 
         responses.add(
             responses.POST,
-            f"{config.R_WORKER_URL}/v0/listGenes",
+            f"{config.R_WORKER_URL}/v0/getGeneDispersion",
             json=payload,
             status=200,
         )
-        
-        pyWorkerResponse = {'total': 3, 'gene_names': ['gene1', 'gene2', 'gene2'], 'dispersions': [4, 420, 1]}
+
+        pyWorkerResponse = {'total': 3, 'gene_names': ['gene2', 'gene1', 'gene3'], 'dispersions': [420, 4, 1]}
         assert (
             ListGenes(self.correct_desc).compute().data == pyWorkerResponse
         )
 
+    @responses.activate
+    def test_fetches_the_gene_list_once(self):
+        payload = {
+            'data': {
+                'gene_names': ['LINC1', 'CD3', 'lin2', 'GAPDH'],
+                'dispersions': [1, 2, 3, 4],
+            }
+        }
+
+        responses.add(
+            responses.POST,
+            f"{config.R_WORKER_URL}/v0/getGeneDispersion",
+            json=payload,
+            status=200,
+        )
+
+        ListGenes(self.correct_desc).compute()
+        result = ListGenes(self.correct_filter).compute().data
+
+        assert result == {
+            'total': 2,
+            'gene_names': ['LINC1', 'lin2'],
+            'dispersions': [1, 3],
+        }
+        assert len(responses.calls) == 1
+
     @responses.activate
     def test_should_throw_exception_on_r_worker_error(self):
 
@@ -113,7 +141,7 @@ class TestListGenes:
 
         responses.add(
             responses.POST,
-            f"{config.R_WORKER_URL}/v0/listGenes",
+            f"{config.R_WORKER_URL}/v0/getGeneDispersion",
             json=payload,
             status=200,
         )
@@ -1,7 +1,6 @@
 import io
 import json
 
-import random
 import boto3
 import mock
 import pytest
@@ -10,7 +9,9 @@ from botocore.stub import Stubber
 from exceptions import RWorkerException
 from tests.data.cell_set_types import cell_set_types
 from tests.data.cell_sets_from_s3 import cell_sets_from_s3
+from tests.data.gene_expression import mock_gene_expression
 from worker.config import config
+from worker.helpers import typed_arrays
 from worker.tasks.marker_heatmap import MarkerHeatmap
 
 def get_cell_ids(cell_class_key, cell_set_key, cell_sets):
@@ -85,6 +86,16 @@ class TestMarkerHeatmap:
     def test_works_with_request(self):
         MarkerHeatmap(self.correct_request)
 
+    def test_result_is_encoded_as_typed_arrays_if_requested(self):
+        request = {**self.correct_request}
+        request["body"] = {**request["body"], "resultFormat": "typedArrays"}
+
+        data = {**mock_gene_expression(["Cd4", "Tpt1"]), "cellOrder": [2, 0, 1, 3]}
+        result = MarkerHeatmap(request)._format_result(data)
+
+        assert result.content_type == typed_arrays.CONTENT_TYPE
+        assert typed_arrays.decode(result.data) == data
+
     def test_generates_correct_request_keys(self):
         stubber, s3 = self.get_s3_stub(cell_sets_from_s3)
 
@@ -137,8 +148,6 @@ class TestMarkerHeatmap:
     def test_downsamples_correctly(self):
         stubber, s3 = self.get_s3_stub(cell_sets_from_s3)
 
-        random.seed(900)
-
         with mock.patch("boto3.client") as n, stubber:
             n.return_value = s3
 
@@ -161,7 +170,7 @@ class TestMarkerHeatmap:
             r_request, cell_order = bla._format_request()
             assert isinstance(py_request, dict)
 
-        expected_cell_ids = [324, 622, 166, 916, 38, 344, 31, 374, 630, 386, 149, 22, 68, 202, 620, 777, 701, 254, 134, 679, 384, 113, 277, 554, 213, 422, 751, 903, 247, 564, 356, 495, 655, 582, 882, 352, 331, 127, 673, 135, 89, 141, 814, 262, 506, 792, 502, 404, 599, 879, 594, 287, 864, 896, 21, 291, 547, 0, 351, 176, 13, 742, 285, 170, 121, 669, 132, 787, 319, 548, 760, 320, 315, 553, 230, 557, 371, 180, 556, 691, 409, 219, 289, 736, 726, 387, 909, 821, 768, 175, 771, 310, 207, 443, 158, 498, 697]
+        expected_cell_ids = [644, 3, 415, 781, 179, 541, 137, 143, 696, 824, 439, 213, 451, 422, 139, 6, 533, 671, 251, 286, 229, 532, 701, 38, 667, 113, 311, 853, 793, 16, 98, 764, 597, 127, 243, 886, 336, 804, 792, 78, 497, 595, 628, 589, 110, 298, 730, 151, 28, 263, 503, 323, 778, 85, 637, 317, 436, 4, 795, 216, 906, 910, 142, 868, 636, 66, 180, 917, 849, 385, 212, 691, 725, 729, 750, 512, 81, 347, 586, 544, 427, 233, 307, 782, 518, 39, 105, 346, 160, 790, 703, 719, 603, 656, 798, 832, 720]
 
         assert r_request["cellSets"]["key"] == py_request["body"]["cellSetKey"]
         assert r_request["cellIds"] == expected_cell_ids
@@ -169,8 +178,6 @@ class TestMarkerHeatmap:
     def test_downsamples_by_many_groups_correctly(self):
         stubber, s3 = self.get_s3_stub(cell_sets_from_s3)
 
-        random.seed(900)
-
         with mock.patch("boto3.client") as n, stubber:
             n.return_value = s3
 
@@ -193,16 +200,40 @@ class TestMarkerHeatmap:
             r_request, cell_order = bla._format_request()
             assert isinstance(py_request, dict)
 
-        expected_cell_ids = [899, 644, 199, 558, 422, 551, 137, 178, 536, 100, 244, 131, 838, 229, 827, 665, 202, 134, 334, 57, 252, 420, 54, 438, 650, 383, 174, 595, 446, 397, 151, 221, 156, 624, 681, 882, 314, 298, 333, 465, 618, 382, 98, 458, 352, 876, 14, 452, 670, 868, 21, 303, 883, 0, 218, 831, 94, 376, 522, 122, 654, 484, 433, 586, 180, 683, 834, 887, 43, 302, 894, 371, 556, 780, 64, 851, 395, 329, 32, 890, 425, 245, 289, 25, 702, 771, 182, 17, 839, 205, 165]
+        expected_cell_ids = [740, 3, 461, 202, 631, 148, 155, 838, 536, 251, 540, 500, 149, 6, 619, 824, 275, 343, 254, 617, 841, 40, 383, 464, 527, 477, 372, 33, 135, 808, 153, 290, 397, 91, 646, 807, 830, 802, 141, 350, 183, 58, 333, 582, 410, 321, 792, 29, 291, 626, 351, 907, 95, 783, 342, 566, 9, 228, 173, 778, 317, 4, 742, 81, 191, 437, 222, 884, 917, 577, 93, 369, 691, 634, 232, 861, 607, 528, 245, 401, 629, 39, 518, 377, 160, 889, 753, 805, 773, 862, 165]
 
         assert cell_order == r_request["cellIds"]
         assert r_request["cellIds"] == expected_cell_ids
     
+    def test_downsampling_is_reproducible(self):
+        py_request = {
+            "experimentId": config.EXPERIMENT_ID,
+            "timeout": "2099-12-31 00:00:00",
+            "body": {
+                "name": "MarkerHeatmap",
+                "nGenes": 5,
+                "cellSetKey": "louvain",
+                "groupByClasses": ["louvain", "sample"],
+                "selectedPoints": "All",
+                "hiddenCellSetKeys": [],
+                "maxCells": 100,
+            },
+        }
+
+        cell_orders = []
+        for _ in range(2):
+            stubber, s3 = self.get_s3_stub(cell_sets_from_s3)
+
+            with mock.patch("boto3.client") as n, stubber:
+                n.return_value = s3
+                _, cell_order = MarkerHeatmap(py_request)._format_request()
+                cell_orders.append(cell_order)
+
+        assert cell_orders[0] == cell_orders[1]
+
     def test_downsamples_with_filter_correctly(self):
         stubber, s3 = self.get_s3_stub(cell_sets_from_s3)
 
-        random.seed(900)
-
         with mock.patch("boto3.client") as n, stubber:
             n.return_value = s3
 
@@ -238,8 +269,6 @@ class TestMarkerHeatmap:
     def test_downsamples_with_hidden_cell_sets(self):
         stubber, s3 = self.get_s3_stub(cell_sets_from_s3)
 
-        random.seed(900)
-
         with mock.patch("boto3.client") as n, stubber:
             n.return_value = s3
 
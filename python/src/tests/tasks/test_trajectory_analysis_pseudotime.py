@@ -17,6 +17,7 @@ from worker.tasks.trajectory_analysis_pseudotime import GetTrajectoryAnalysisPse
 mock_embedding_etag = "mockEmbeddingETag"
 
 
+@pytest.mark.usefixtures("isolate_embedding_cache")
 class TestTrajectoryAnalysisPseudoTime:
     @pytest.fixture(autouse=True)
     def load_correct_definition(self):
@@ -94,23 +95,6 @@ class TestTrajectoryAnalysisPseudoTime:
 
         stubber.add_response("get_object", cell_sets_get_object["response"], cell_sets_get_object["params"])
 
-        embedding_head_object = {
-          "params": {
-            "Bucket": config.RESULTS_BUCKET,
-            "Key": mock_embedding_etag,
-          },
-          "response": {
-              "ContentLength": 10,
-              "ContentType": "utf-8",
-              "ResponseMetadata": {
-                  "Bucket": config.RESULTS_BUCKET,
-              },
-          }
-        }
-
-        # Stubbing response for embedding head object
-        stubber.add_response("head_object", embedding_head_object["response"], embedding_head_object["params"])
-
         # Stubbing response for embedding get object
         content_string = json.dumps(mock_embedding).encode("utf-8")
         content_bytes = gzip.compress(content_string)
@@ -126,6 +110,7 @@ class TestTrajectoryAnalysisPseudoTime:
           "response": {
             "ContentLength": len(content_bytes),
             "ContentType": "application/gzip",
+            "ContentEncoding": "gzip",
             "Body": data,
             "ResponseMetadata": {
                 "Bucket": config.RESULTS_BUCKET,
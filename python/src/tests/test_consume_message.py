@@ -1,12 +1,35 @@
+import collections
+
 import boto3
 import mock
+import pytest
 from botocore.stub import ANY, Stubber
 
+from worker import consume_message
 from worker.config import config
-from worker.consume_message import _read_sqs_message, consume
+from worker.consume_message import (
+    _read_sqs_message,
+    consume,
+    extend_buffered_visibility,
+    take_buffered_duplicates,
+)
 
 
 class TestConsumeMessage:
+    @pytest.fixture(autouse=True)
+    def reset_sqs_state(self):
+        with mock.patch.object(consume_message, "_sqs", None), mock.patch.object(
+            consume_message, "_queue", None
+        ), mock.patch.object(consume_message, "_buffer", collections.deque()):
+            yield
+
+    def get_message(self, id, body='{"ETag": "random-etag"}'):
+        return {
+            "MessageId": id,
+            "ReceiptHandle": f"{id}-handle",
+            "Body": body,
+        }
+
     def test_read_sqs_message_fetches_messages_from_the_correct_queue(self):
         sqs = boto3.resource("sqs", **config.BOTO_RESOURCE_KWARGS)
         stubber = Stubber(sqs.meta.client)
@@ -21,7 +44,9 @@ class TestConsumeMessage:
             {
                 "QueueUrl": "my_very_valid_and_existing_queue_url",
                 "WaitTimeSeconds": ANY,
-                "AttributeNames": ["AWSTraceHeader"],
+                "MaxNumberOfMessages": config.SQS_PREFETCH_COUNT,
+                "VisibilityTimeout": config.SQS_VISIBILITY_TIMEOUT,
+                "AttributeNames": ["AWSTraceHeader", "SentTimestamp"],
             },
         )
 
@@ -60,7 +85,9 @@ class TestConsumeMessage:
             {
                 "QueueUrl": "my_very_valid_and_existing_queue_url",
                 "WaitTimeSeconds": ANY,
-                "AttributeNames": ["AWSTraceHeader"],
+                "MaxNumberOfMessages": config.SQS_PREFETCH_COUNT,
+                "VisibilityTimeout": config.SQS_VISIBILITY_TIMEOUT,
+                "AttributeNames": ["AWSTraceHeader", "SentTimestamp"],
             },
         )
 
@@ -92,7 +119,9 @@ class TestConsumeMessage:
             {
                 "QueueUrl": "my_very_valid_and_existing_queue_url",
                 "WaitTimeSeconds": ANY,
-                "AttributeNames": ["AWSTraceHeader"],
+                "MaxNumberOfMessages": config.SQS_PREFETCH_COUNT,
+                "VisibilityTimeout": config.SQS_VISIBILITY_TIMEOUT,
+                "AttributeNames": ["AWSTraceHeader", "SentTimestamp"],
             },
         )
         stubber.add_response(
@@ -110,6 +139,124 @@ class TestConsumeMessage:
             assert not r
             stubber.assert_no_pending_responses()
 
+    def test_read_sqs_message_buffers_messages_from_a_single_receive(self):
+        sqs = boto3.resource("sqs", **config.BOTO_RESOURCE_KWARGS)
+        stubber = Stubber(sqs.meta.client)
+        stubber.add_response(
+            "get_queue_url",
+            {"QueueUrl": "my_very_valid_and_existing_queue_url"},
+            {"QueueName": config.QUEUE_NAME},
+        )
+        stubber.add_response(
+            "receive_message",
+            {
+                "Messages": [
+                    self.get_message("first", '{"ETag": "first-etag"}'),
+                    self.get_message("second", '{"ETag": "second-etag"}'),
+                ]
+            },
+            {
+                "QueueUrl": "my_very_valid_and_existing_queue_url",
+                "WaitTimeSeconds": ANY,
+                "MaxNumberOfMessages": config.SQS_PREFETCH_COUNT,
+                "VisibilityTimeout": config.SQS_VISIBILITY_TIMEOUT,
+                "AttributeNames": ["AWSTraceHeader", "SentTimestamp"],
+            },
+        )
+        for id in ["first", "second"]:
+            stubber.add_response(
+                "delete_message",
+                {},
+                {
+                    "QueueUrl": "my_very_valid_and_existing_queue_url",
+                    "ReceiptHandle": f"{id}-handle",
+                },
+            )
+
+        with mock.patch("boto3.resource") as m, stubber:
+            m.return_value = sqs
+            assert _read_sqs_message() == {"ETag": "first-etag"}
+            assert _read_sqs_message() == {"ETag": "second-etag"}
+            stubber.assert_no_pending_responses()
+
+        assert m.call_count == 1
+
+    def test_read_sqs_message_reuses_the_queue_between_receives(self):
+        sqs = boto3.resource("sqs", **config.BOTO_RESOURCE_KWARGS)
+        stubber = Stubber(sqs.meta.client)
+        stubber.add_response(
+            "get_queue_url",
+            {"QueueUrl": "my_very_valid_and_existing_queue_url"},
+            {"QueueName": config.QUEUE_NAME},
+        )
+        for _ in range(2):
+            stubber.add_response(
+                "receive_message",
+                {"Messages": []},
+                {
+                    "QueueUrl": "my_very_valid_and_existing_queue_url",
+                    "WaitTimeSeconds": ANY,
+                    "MaxNumberOfMessages": config.SQS_PREFETCH_COUNT,
+                    "VisibilityTimeout": config.SQS_VISIBILITY_TIMEOUT,
+                    "AttributeNames": ["AWSTraceHeader", "SentTimestamp"],
+                },
+            )
+
+        with mock.patch("boto3.resource") as m, stubber:
+            m.return_value = sqs
+            assert not _read_sqs_message()
+            assert not _read_sqs_message()
+            stubber.assert_no_pending_responses()
+
+        assert m.call_count == 1
+
+    def test_extend_buffered_visibility_only_extends_expiring_messages(self):
+        queue = mock.Mock()
+        expiring = mock.Mock(receipt_handle="expiring-handle")
+        fresh = mock.Mock(receipt_handle="fresh-handle")
+
+        with mock.patch("time.monotonic") as monotonic:
+            monotonic.return_value = 1000
+            consume_message._queue = queue
+            consume_message._buffer.extend(
+                [
+                    [expiring, 1005],
+                    [fresh, 1000 + config.SQS_VISIBILITY_TIMEOUT],
+                ]
+            )
+
+            extend_buffered_visibility()
+
+        queue.change_message_visibility_batch.assert_called_once_with(
+            Entries=[
+                {
+                    "Id": "0",
+                    "ReceiptHandle": "expiring-handle",
+                    "VisibilityTimeout": config.SQS_VISIBILITY_TIMEOUT,
+                }
+            ]
+        )
+        assert consume_message._buffer[0][1] == 1000 + config.SQS_VISIBILITY_TIMEOUT
+
+    def test_take_buffered_duplicates_removes_messages_with_the_same_etag(self):
+        duplicate = mock.Mock(body='{"ETag": "random-etag", "uuid": "other"}')
+        different = mock.Mock(body='{"ETag": "other-etag"}')
+        malformed = mock.Mock(body="not json")
+
+        consume_message._buffer.extend(
+            [[duplicate, 1000], [different, 1000], [malformed, 1000]]
+        )
+
+        duplicates = take_buffered_duplicates("random-etag")
+
+        assert duplicates == [{"ETag": "random-etag", "uuid": "other"}]
+        duplicate.delete.assert_called_once()
+        different.delete.assert_not_called()
+        assert [entry[0] for entry in consume_message._buffer] == [
+            different,
+            malformed,
+        ]
+
     def test_request_with_expired_timeout_is_discarded(self):
         request = {
             "experimentId": "random-experiment-id",
@@ -0,0 +1,87 @@
+import os
+
+import mock
+import pytest
+
+from worker import precompute
+from worker.config import config
+from worker.helpers import metrics
+from worker.precompute import Precompute, load_etag_hook
+from worker.result import Result
+
+REQUESTS = [{"name": "GetNGenes"}, {"name": "GetNUmis"}]
+
+
+def etag_hook(experiment_id, body):
+    return f"{experiment_id}-{body['name']}"
+
+
+class TestPrecompute:
+    @pytest.fixture(autouse=True)
+    def set_up(self, mocker):
+        mocker.patch.object(metrics, "registry", metrics.Registry())
+        mocker.patch.object(metrics, "info")
+
+        self.response_exists = mocker.patch.object(
+            precompute, "_response_exists", return_value=None
+        )
+        self.response = mocker.patch.object(precompute, "Response")
+
+        self.task_factory = mock.Mock()
+        self.task_factory.submit.return_value = Result({"data": "some data"})
+
+    def run(self, busy=False, etag_hook=etag_hook):
+        worker = Precompute(
+            self.task_factory, lambda: busy, etag_hook, requests=REQUESTS
+        )
+        thread = worker.start()
+
+        if busy:
+            worker.stop()
+
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+    def test_results_are_uploaded_under_the_etag_of_the_hook(self):
+        self.run()
+
+        names = [
+            call.args[0]["body"]["name"]
+            for call in self.task_factory.submit.call_args_list
+        ]
+        assert names == ["GetNGenes", "GetNUmis"]
+
+        request = self.response.call_args.args[0]
+        assert request["ETag"] == f"{config.EXPERIMENT_ID}-GetNUmis"
+        assert self.response.return_value.upload.call_count == 2
+        self.response.return_value.publish.assert_not_called()
+
+    def test_results_already_in_s3_are_not_computed(self):
+        self.response_exists.return_value = 100
+
+        self.run()
+
+        self.task_factory.submit.assert_not_called()
+
+    def test_results_without_etag_are_not_computed(self):
+        self.run(etag_hook=lambda experiment_id, body: None)
+
+        self.task_factory.submit.assert_not_called()
+        self.response.assert_not_called()
+        self.response_exists.assert_not_called()
+
+    def test_nothing_is_computed_while_the_worker_is_busy(self):
+        self.run(busy=True)
+
+        self.task_factory.submit.assert_not_called()
+
+    def test_failing_request_does_not_stop_precomputing(self):
+        self.task_factory.submit.side_effect = [Exception("R died"), Result({})]
+
+        self.run()
+
+        assert self.response.return_value.upload.call_count == 1
+
+    def test_load_etag_hook(self):
+        assert load_etag_hook(None) is None
+        assert load_etag_hook("os.path:join") is os.path.join
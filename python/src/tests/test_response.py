@@ -4,13 +4,16 @@ import pytest
 from botocore.stub import Stubber
 
 from worker.config import config
+from worker.helpers import typed_arrays
 from worker.response import Response
 from worker.result import Result
 
 
 class TestResponse:
     @pytest.fixture(autouse=True)
-    def load_correct_definition(self):
+    def load_correct_definition(self, mocker):
+        self.upload = mocker.patch("worker.response.upload_fileobj")
+
         self.request = {
             "body": {
                 "name": "DifferentialExpression",
@@ -39,6 +42,42 @@ class TestResponse:
 
         assert key == self.request["ETag"]
 
+    @mock.patch("boto3.client")
+    def test_upload_sets_the_encoding_of_the_result(self, mocked_client):
+        resp = Response(self.request, Result({"values": list(range(1000))}))
+        resp._upload(resp._construct_data_for_upload(), "obj")
+
+        extra_args = self.upload.call_args.args[4]
+        assert extra_args == {"ContentEncoding": "gzip"}
+
+    @mock.patch("boto3.client")
+    def test_upload_sets_the_type_of_results_that_are_not_json(self, mocked_client):
+        result = Result(b"\x00" * 2000, content_type=typed_arrays.CONTENT_TYPE)
+        resp = Response(self.request, result)
+        resp._upload(resp._construct_data_for_upload(), "obj")
+
+        extra_args = self.upload.call_args.args[4]
+        assert extra_args == {
+            "ContentEncoding": "gzip",
+            "ContentType": typed_arrays.CONTENT_TYPE,
+        }
+
+    @mock.patch("boto3.client")
+    def test_upload_time_leaves_out_compression_done_before_it(
+        self, mocked_client, mocker
+    ):
+        record = mocker.patch("worker.response.metrics.record")
+        resp = Response(self.request, Result({"values": list(range(1000))}))
+
+        # Time spent compressing the start of the result to pick its encoding
+        stream = resp._construct_data_for_upload()
+        stream.seconds = 1.0
+
+        resp._upload(stream, "obj")
+
+        uploads = [c.args for c in record.call_args_list if c.args[0] == "upload"]
+        assert uploads[0][1] >= 0
+
     def test_construct_response_msg_works(self):
         resp = Response(self.request, Result({"result1key": "result1val"}))
         response_msg = resp._construct_response_msg()
@@ -58,9 +97,9 @@ class TestResponse:
         resp = Response(self.request, result)
         spy = mocker.spy(resp, "_upload")
 
-        with mock.patch("worker.response.Emitter") as redis_emitter:
+        with mock.patch("worker.response.notifier") as notifier:
             resp.publish()
-            assert redis_emitter.call_count == 1
+            assert notifier.emit.call_count == 1
         assert spy.call_count == 1
 
     @mock.patch("boto3.client")
@@ -76,9 +115,9 @@ class TestResponse:
         resp = Response(self.request, result)
         spy = mocker.spy(resp, "_upload")
 
-        with mock.patch("worker.response.Emitter") as redis_emitter:
+        with mock.patch("worker.response.notifier") as notifier:
             resp.publish()
-            assert redis_emitter.call_count == 1
+            assert notifier.emit.call_count == 1
         assert spy.call_count == 1
 
     @mock.patch("boto3.client")
@@ -95,7 +134,7 @@ class TestResponse:
         resp = Response(self.request, result)
         spy = mocker.spy(resp, "_upload")
 
-        with mock.patch("worker.response.Emitter") as redis_emitter:
+        with mock.patch("worker.response.notifier") as notifier:
             resp.publish()
-            assert redis_emitter.call_count == 1
+            assert notifier.emit.call_count == 1
         assert spy.call_count == 1
@@ -0,0 +1,119 @@
+import datetime
+import threading
+
+import mock
+import pytest
+
+from worker.helpers import metrics
+from worker.result import Result
+from worker.scheduler import Scheduler
+from worker.task_pool import TaskPool
+
+BUDGETS = {"interactive": 1, "plot": 1, "export": 1}
+
+
+class TestScheduler:
+    @pytest.fixture(autouse=True)
+    def set_up(self, mocker):
+        mocker.patch.object(metrics, "registry", metrics.Registry())
+        self.response = mocker.patch("worker.task_pool.Response")
+
+        self.release = threading.Event()
+        self.computed = []
+
+        def compute(request):
+            self.computed.append(request["ETag"])
+            self.release.wait(timeout=5)
+            return Result({"data": "some data"})
+
+        task_factory = mock.Mock()
+        task_factory.submit.side_effect = compute
+
+        self.pool = TaskPool(task_factory, sum(BUDGETS.values()))
+        self.scheduler = Scheduler(self.pool, BUDGETS, max_pending=2)
+
+        yield
+
+        self.release.set()
+        self.pool.shutdown()
+
+    def request(self, etag, name, timeout="2099-12-31 00:00:00"):
+        return {
+            "ETag": etag,
+            "experimentId": "random-experiment-id",
+            "timeout": timeout,
+            "body": {"name": name},
+        }
+
+    def wait_until_idle(self):
+        self.release.set()
+
+        for _ in range(500):
+            if not self.scheduler.busy:
+                return
+
+            threading.Event().wait(0.01)
+
+        raise AssertionError("The scheduler did not finish its requests")
+
+    def test_exports_do_not_hold_up_interactive_requests(self):
+        self.scheduler.add(self.request("export", "GetNormalizedExpression"))
+        self.scheduler.add(self.request("rds", "DownloadAnnotSeuratObject"))
+        self.scheduler.add(self.request("genes", "ListGenes"))
+
+        # The second export waits for the first, the genes are computed anyway
+        assert self.scheduler.pending["export"]
+        assert not self.scheduler.pending["interactive"]
+        assert self.scheduler.running == {"interactive": 1, "plot": 0, "export": 1}
+
+        self.wait_until_idle()
+        assert sorted(self.computed) == ["export", "genes", "rds"]
+
+    def test_requests_of_a_lane_run_earliest_deadline_first(self):
+        self.scheduler.add(self.request("first", "GeneExpression"))
+        self.scheduler.add(self.request("late", "ListGenes", "2099-12-31"))
+        self.scheduler.add(self.request("early", "GetEmbedding", "2099-01-01"))
+
+        self.wait_until_idle()
+        assert self.computed == ["first", "early", "late"]
+
+    def test_requests_that_cannot_finish_before_their_deadline_are_dropped(self):
+        metrics.registry.record("GeneExpression", "compute", 3600)
+
+        in_ten_minutes = datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
+
+        # One can't start in time, the other can't finish in time
+        self.scheduler.add(self.request("expired", "ListGenes", "2000-01-01"))
+        self.scheduler.add(
+            self.request("too-slow", "GeneExpression", f"{in_ten_minutes}Z")
+        )
+
+        self.wait_until_idle()
+        assert self.computed == []
+
+    def test_duplicates_of_a_dropped_request_are_scheduled(self):
+        self.scheduler.add(self.request("blocking", "ListGenes"))
+        self.scheduler.add(self.request("etag", "GeneExpression", "2000-01-01"))
+
+        duplicates = [
+            {**self.request("etag", "GeneExpression"), "uuid": uuid}
+            for uuid in ["first", "second", "third"]
+        ]
+        for duplicate in duplicates:
+            assert self.pool.coalesce(duplicate)
+
+        self.wait_until_idle()
+        assert self.computed == ["blocking", "etag"]
+
+        # The first duplicate is computed and the others are notified of it
+        notified = [call.args[0] for call in self.response.call_args_list]
+        assert all(duplicate in notified for duplicate in duplicates)
+
+    def test_there_is_room_until_max_pending_requests_wait(self):
+        for etag in ["a", "b", "c"]:
+            self.scheduler.add(self.request(etag, "MarkerHeatmap"))
+
+        assert not self.scheduler.wait_for_room(timeout=0)
+
+        self.wait_until_idle()
+        assert self.scheduler.wait_for_room(timeout=0)
@@ -0,0 +1,132 @@
+import threading
+
+import mock
+import pytest
+
+from worker.result import Result
+from worker.task_pool import TaskPool
+
+
+class TestTaskPool:
+    @pytest.fixture(autouse=True)
+    def load_correct_definition(self):
+        self.request = {
+            "body": {
+                "name": "GetNUmis",
+            },
+            "experimentId": "random-experiment-id",
+            "timeout": "2099-12-31 00:00:00",
+            "uuid": "random-uuid",
+            "ETag": "random-etag",
+        }
+
+    def test_submitted_request_gets_computed_and_published(self):
+        task_factory = mock.Mock()
+        result = Result({"data": "some data"})
+        task_factory.submit.return_value = result
+
+        pool = TaskPool(task_factory, 2)
+
+        with mock.patch("worker.task_pool.Response") as response:
+            assert pool.acquire_slot(timeout=0)
+            pool.submit(self.request).result()
+            pool.shutdown()
+
+        task_factory.submit.assert_called_once_with(self.request)
+        response.assert_called_once_with(self.request, result)
+        response.return_value.publish.assert_called_once()
+
+    def test_slots_are_bounded_by_the_concurrency_limit(self):
+        release = threading.Event()
+        task_factory = mock.Mock()
+        task_factory.submit.side_effect = lambda request: release.wait()
+
+        pool = TaskPool(task_factory, 2)
+
+        with mock.patch("worker.task_pool.Response"):
+            futures = []
+            for _ in range(2):
+                assert pool.acquire_slot(timeout=0)
+                futures.append(pool.submit(self.request))
+
+            assert pool.busy
+            assert not pool.acquire_slot(timeout=0)
+
+            release.set()
+            for future in futures:
+                future.result()
+            pool.shutdown()
+
+        assert not pool.busy
+        assert pool.acquire_slot(timeout=0)
+
+    def test_failing_request_does_not_stop_the_pool(self):
+        task_factory = mock.Mock()
+        task_factory.submit.side_effect = KeyError("Task class was not found")
+
+        pool = TaskPool(task_factory, 1)
+
+        with mock.patch("worker.task_pool.Response") as response:
+            assert pool.acquire_slot(timeout=0)
+            pool.submit(self.request).result()
+
+            assert pool.acquire_slot(timeout=0)
+            pool.release_slot()
+            pool.shutdown()
+
+        response.assert_not_called()
+        assert not pool.busy
+
+    def test_requests_with_the_same_etag_are_computed_once(self):
+        release = threading.Event()
+        task_factory = mock.Mock()
+        result = Result({"data": "some data"})
+        task_factory.submit.side_effect = lambda request: release.wait() and result
+
+        duplicate = {**self.request, "uuid": "another-uuid"}
+
+        pool = TaskPool(task_factory, 2)
+
+        with mock.patch("worker.task_pool.Response") as response:
+            assert not pool.coalesce(self.request)
+
+            assert pool.acquire_slot(timeout=0)
+            future = pool.submit(self.request)
+
+            assert pool.coalesce(duplicate)
+
+            release.set()
+            future.result()
+            pool.shutdown()
+
+        task_factory.submit.assert_called_once_with(self.request)
+        response.assert_any_call(self.request, result)
+        response.assert_any_call(duplicate, result)
+        response.return_value.publish.assert_called_once()
+        response.return_value._send_notification.assert_called_once()
+
+        # Once the request is done, the next one with its ETag is computed again
+        assert not pool.coalesce(duplicate)
+
+    def test_duplicates_are_told_when_the_request_fails(self):
+        task_factory = mock.Mock()
+        task_factory.submit.side_effect = KeyError("Task class was not found")
+
+        duplicate = {**self.request, "uuid": "another-uuid"}
+
+        pool = TaskPool(task_factory, 1)
+
+        with mock.patch("worker.task_pool.Response") as response:
+            pool.reserve(self.request)
+            assert pool.coalesce(duplicate)
+
+            assert pool.acquire_slot(timeout=0)
+            pool.submit(self.request).result()
+            pool.shutdown()
+
+        response.assert_called_once()
+        request, result = response.call_args.args
+        assert request == duplicate
+        assert result.error
+        assert result.data["error_code"] == "PYTHON_WORKER_ERROR"
+        response.return_value._send_notification.assert_called_once()
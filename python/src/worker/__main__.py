@@ -2,12 +2,18 @@ import datetime
 import time
 from logging import INFO, basicConfig, info
 
-import aws_xray_sdk as xray
 from aws_xray_sdk.core import xray_recorder
 
 from .config import config
-from .consume_message import consume
-from .response import Response
+from .consume_message import (
+    consume,
+    extend_buffered_visibility,
+    take_buffered_duplicates,
+)
+from .helpers import metrics, tracing
+from .precompute import Precompute, load_etag_hook
+from .scheduler import Scheduler
+from .task_pool import TaskPool
 from .tasks.factory import TaskFactory
 
 # configure logging
@@ -22,34 +28,67 @@ def main():
         info("Experiment not yet assigned, waiting...")
         time.sleep(5)
 
-    # Disable X-Ray for initial setup so we don't end up
-    # with segment warnings before any message is sent
-    xray.global_sdk_config.set_sdk_enabled(False)
+    # X-Ray is not toggled once tasks run on other threads. Calls that are not
+    # part of a request, like the first sync of the experiment files or the
+    # reads of the queue, are made in an unsampled segment instead.
+    tracing.begin_segment()
+
+    if config.METRICS_PORT:
+        metrics.start_server(config.METRICS_PORT)
 
-    last_activity = datetime.datetime.utcnow()
     task_factory = TaskFactory()
+    task_pool = TaskPool(task_factory, sum(config.LANE_CONCURRENCY.values()))
+    scheduler = Scheduler(
+        task_pool, config.LANE_CONCURRENCY, config.MAX_PENDING_TASKS
+    )
+
+    # The files of the experiment were synced when the factory was created
+    precompute = None
+    etag_hook = load_etag_hook(config.PRECOMPUTE_ETAG_HOOK)
+    if config.PRECOMPUTE and etag_hook:
+        precompute = Precompute(task_factory, lambda: scheduler.busy, etag_hook)
+        precompute.start()
+    elif config.PRECOMPUTE:
+        info("No PRECOMPUTE_ETAG_HOOK set, results will not be precomputed.")
+
     info(
-        f"Now listening for experiment {config.EXPERIMENT_ID}, waiting for work to do..."
+        f"Now listening for experiment {config.EXPERIMENT_ID}, running up to "
+        f"{config.LANE_CONCURRENCY} tasks of each kind at a time, "
+        "waiting for work to do..."
     )
 
     while (
-        datetime.datetime.utcnow() - last_activity
-    ).total_seconds() <= config.TIMEOUT or config.IGNORE_TIMEOUT:
+        datetime.datetime.utcnow() - task_pool.last_activity
+    ).total_seconds() <= config.TIMEOUT or config.IGNORE_TIMEOUT or scheduler.busy:
 
-        # Disable X-Ray before message is identified and processed
-        xray.global_sdk_config.set_sdk_enabled(False)
+        # Only read a new message once there is room to keep it, otherwise
+        # it would be taken off the queue while the worker has enough to do.
+        if not scheduler.wait_for_room(timeout=5):
+            extend_buffered_visibility()
+            continue
 
         request = consume()
-        if request:
-            result = task_factory.submit(request)
 
-            response = Response(request, result)
-            response.publish()
+        # Requests for an ETag that is already scheduled are answered with
+        # its result once it finishes, so they are not scheduled again. The
+        # ETag is reserved before the request is scheduled, so the buffered
+        # duplicates are attached to it even if it finishes right away.
+        if request and not task_pool.coalesce(request):
+            task_pool.reserve(request)
+
+            for duplicate in take_buffered_duplicates(request["ETag"]):
+                task_pool.coalesce(duplicate)
+
+            scheduler.add(request)
+        else:
+            xray_recorder.end_segment()
 
-            last_activity = datetime.datetime.utcnow()
+        tracing.begin_segment()
 
-        xray_recorder.end_segment()
+    if precompute:
+        precompute.stop()
 
+    task_pool.shutdown()
     info("Timeout exceeded, shutting down...")
 
 
@@ -18,6 +18,55 @@ timeout = int(
 )
 
 ignore_timeout = os.getenv("IGNORE_TIMEOUT") == "true"
+
+# maximum number of interactive tasks, and of plots, the worker computes at the
+# same time. With the defaults it runs up to three tasks at once, one of each
+# latency class below.
+concurrency = int(os.getenv("WORK_CONCURRENCY", default="1"))
+
+# maximum number of tasks of each latency class computed at the same time, on
+# top of each other. Interactive tasks and plots use the work concurrency, and
+# exports have a budget of their own so they never hold up the other two.
+lane_concurrency = {
+    "interactive": int(os.getenv("INTERACTIVE_CONCURRENCY", str(concurrency))),
+    "plot": int(os.getenv("PLOT_CONCURRENCY", str(concurrency))),
+    "export": int(os.getenv("EXPORT_CONCURRENCY", default="1")),
+}
+
+# number of requests read from the queue that can wait in the worker for their
+# latency class to have room to compute them. They are deleted from the queue
+# once read, so the ones waiting are lost if the worker dies and have to be
+# sent again by the clients. A few are enough to let interactive requests skip
+# ahead of exports.
+max_pending_tasks = int(os.getenv("MAX_PENDING_TASKS", default="4"))
+
+# seconds the worker waits for the R worker to answer a request, unset to wait
+# as long as it takes. Computations on large experiments can take many minutes.
+r_worker_timeout = os.getenv("R_WORKER_TIMEOUT")
+r_worker_timeout = float(r_worker_timeout) if r_worker_timeout else None
+
+# minimum number of seconds between two listings of the experiment files in S3.
+# Tasks received in between use the files that were already downloaded.
+sync_interval = int(os.getenv("SYNC_INTERVAL", default="15"))
+
+# send long numeric arrays to the R worker as binary buffers instead of JSON.
+# JSON is still used if the R worker does not support them.
+r_worker_typed_arrays = os.getenv("R_WORKER_TYPED_ARRAYS", default="true") == "true"
+
+# compute the results users request first while the worker is idle. The hook is
+# a `module:function` that derives the ETag of a request, nothing is computed
+# without it and only the requests it knows the ETag of are computed.
+precompute = os.getenv("PRECOMPUTE") == "true"
+precompute_etag_hook = os.getenv("PRECOMPUTE_ETAG_HOOK")
+
+# encodings the clients of the results in S3 can decode, which are picked from
+# by size. Results are gzipped if it is the only one, with a faster level the
+# larger they are. With identity, small results are uploaded uncompressed.
+result_encodings = os.getenv("RESULT_ENCODINGS", default="gzip").split(",")
+
+# port the Prometheus metrics of every task stage are served at. They are not
+# served unless it is set, so workers don't open a port nobody scrapes.
+metrics_port = int(os.getenv("METRICS_PORT", default="0"))
 aws_account_id = os.getenv("AWS_ACCOUNT_ID")
 aws_region = os.getenv("AWS_DEFAULT_REGION")
 
@@ -113,6 +162,32 @@ config = Config(
     CLUSTER_ENV=cluster_env,
     TIMEOUT=timeout,
     IGNORE_TIMEOUT=ignore_timeout,
+    CONCURRENCY=concurrency,
+    LANE_CONCURRENCY=lane_concurrency,
+    MAX_PENDING_TASKS=max_pending_tasks,
+    # number of comparisons of a BatchDifferentialExpression sent to the R
+    # worker at the same time
+    BATCH_DE_CONCURRENCY=int(os.getenv("BATCH_DE_CONCURRENCY", default="4")),
+    # number of messages fetched from SQS on each receive, and how long
+    # they stay hidden from other consumers while they wait in the worker
+    SQS_PREFETCH_COUNT=10,
+    SQS_VISIBILITY_TIMEOUT=60,
+    SYNC_INTERVAL=sync_interval,
+    METRICS_PORT=metrics_port,
+    PRECOMPUTE=precompute,
+    RESULT_ENCODINGS=result_encodings,
+    PRECOMPUTE_ETAG_HOOK=precompute_etag_hook,
+    # number of files downloaded at the same time, and number of byte ranges
+    # of each file that are downloaded in parallel
+    SYNC_CONCURRENCY=4,
+    SYNC_MULTIPART_CONCURRENCY=10,
+    SYNC_MULTIPART_CHUNK_SIZE=64 * 1024 * 1024,
+    # maximum size in bytes of the expression of genes kept in memory
+    GENE_EXPRESSION_CACHE_SIZE=256 * 1024 * 1024,
+    # number of embeddings kept memory mapped
+    EMBEDDING_CACHE_COUNT=8,
+    # number of full differential expression results kept in memory
+    DIFF_EXPR_CACHE_COUNT=16,
     AWS_ACCOUNT_ID=aws_account_id,
     AWS_DEFAULT_REGION=aws_region,
     BOTO_RESOURCE_KWARGS={"region_name": aws_region},
@@ -120,6 +195,8 @@ config = Config(
     SOURCE_BUCKET=f"processed-matrix-{cluster_env}-{aws_account_id}",
     RESULTS_BUCKET=f"worker-results-{cluster_env}-{aws_account_id}",
     R_WORKER_URL="http://localhost:4000",
+    R_WORKER_TYPED_ARRAYS=r_worker_typed_arrays,
+    R_WORKER_TIMEOUT=r_worker_timeout,
     # this works because in CI, `data/` is deployed under `worker/`
     # whereas in a container, it is mounted to `/data`. Either way, this ensures
     # that the appropriate path is selected, as both are two directories up
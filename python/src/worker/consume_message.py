@@ -1,21 +1,38 @@
+import collections
 import datetime
 import json
+import time
 import traceback
 from logging import info
 
-import aws_xray_sdk as xray
 import boto3
 import dateutil
 import pytz
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core.models.trace_header import TraceHeader
 from botocore.exceptions import ClientError
 
 from .config import config
+from .helpers import metrics, tracing
 
 
-def _read_sqs_message():
-    sqs = boto3.resource("sqs", **config.BOTO_RESOURCE_KWARGS)
+# The SQS resource and queue handle are created once and reused for
+# the life of the worker instead of being looked up on every poll.
+_sqs = None
+_queue = None
+
+# Messages received from SQS that have not been consumed yet. Each entry
+# holds the message and the time at which it becomes visible again.
+_buffer = collections.deque()
+
+
+def _get_queue():
+    global _sqs, _queue
+
+    if _queue:
+        return _queue
+
+    if not _sqs:
+        _sqs = boto3.resource("sqs", **config.BOTO_RESOURCE_KWARGS)
 
     """
     It is possible that the queue was not created by the time
@@ -27,44 +44,123 @@ def _read_sqs_message():
     as if we didn't receive a message in this time frame.
     """
     try:
-        queue = sqs.get_queue_by_name(QueueName=config.QUEUE_NAME)
+        _queue = _sqs.get_queue_by_name(QueueName=config.QUEUE_NAME)
     except ClientError as e:
         if e.response["Error"]["Code"] == "AWS.SimpleQueueService.NonExistentQueue":
             return None
         else:
             raise e
 
-    message = queue.receive_messages(
-        WaitTimeSeconds=20, AttributeNames=["AWSTraceHeader"]
+    return _queue
+
+
+def _fill_buffer(queue):
+    messages = queue.receive_messages(
+        WaitTimeSeconds=20,
+        MaxNumberOfMessages=config.SQS_PREFETCH_COUNT,
+        VisibilityTimeout=config.SQS_VISIBILITY_TIMEOUT,
+        AttributeNames=["AWSTraceHeader", "SentTimestamp"],
     )
 
-    if not message:
+    visible_at = time.monotonic() + config.SQS_VISIBILITY_TIMEOUT
+    _buffer.extend([message, visible_at] for message in messages)
+
+    if len(messages) > 1:
+        info(f"Received {len(messages)} messages from SQS.")
+
+
+def extend_buffered_visibility():
+    """Keeps messages waiting in the buffer hidden from other consumers.
+
+    Only messages that would become visible again within half of the
+    visibility timeout are extended, so this is cheap to call often.
+    """
+    if not _buffer or not _queue:
+        return
+
+    now = time.monotonic()
+    expiring = [
+        entry
+        for entry in _buffer
+        if entry[1] - now < config.SQS_VISIBILITY_TIMEOUT / 2
+    ]
+
+    if not expiring:
+        return
+
+    _queue.change_message_visibility_batch(
+        Entries=[
+            {
+                "Id": str(i),
+                "ReceiptHandle": message.receipt_handle,
+                "VisibilityTimeout": config.SQS_VISIBILITY_TIMEOUT,
+            }
+            for i, (message, _) in enumerate(expiring)
+        ]
+    )
+
+    for entry in expiring:
+        entry[1] = now + config.SQS_VISIBILITY_TIMEOUT
+
+
+def take_buffered_duplicates(etag):
+    """Removes the messages for the given ETag from the buffer.
+
+    Returns their bodies so they can be answered with the result of the
+    request that is already being computed for that ETag.
+    """
+    duplicates = []
+
+    for entry in list(_buffer):
+        message = entry[0]
+
+        try:
+            body = json.loads(message.body)
+        except ValueError:
+            continue
+
+        if body.get("ETag") != etag:
+            continue
+
+        _buffer.remove(entry)
+        message.delete()
+        duplicates.append(body)
+
+    if duplicates:
+        info(f"Found {len(duplicates)} buffered requests with ETag {etag}.")
+
+    return duplicates
+
+
+def _read_sqs_message():
+    if not _buffer:
+        queue = _get_queue()
+
+        if not queue:
+            return None
+
+        _fill_buffer(queue)
+
+    if not _buffer:
         return None
 
+    extend_buffered_visibility()
+    message, _ = _buffer.popleft()
+
     # Try to parse it as JSON
     try:
-        message = message[0]
-
         trace_header = message.attributes and message.attributes.get(
             "AWSTraceHeader", None
         )
 
-        if trace_header:
-            xray.global_sdk_config.set_sdk_enabled(True)
-
-            header = TraceHeader.from_header_str(trace_header)
-            trace_id = header.root
-            sampled = header.sampled
-
-            xray_recorder.begin_segment(
-                f"worker-{config.CLUSTER_ENV}-{config.SANDBOX_ID}",
-                traceid=trace_id,
-                sampling=sampled,
-                parent_id=header.parent,
-            )
+        # The request is traced in a segment of its own, which replaces
+        # the one the message was read in
+        tracing.begin_segment(trace_header)
 
         body = json.loads(message.body)
         info("Consumed a message from SQS.")
+
+        _record_queue_wait(message, body)
     except Exception as e:
         xray_recorder.current_segment().add_exception(e, traceback.format_exc())
 
@@ -77,6 +173,21 @@ def _read_sqs_message():
     return body
 
 
+def _record_queue_wait(message, body):
+    """Records how long the message waited since it was sent to the queue."""
+    sent_timestamp = message.attributes and message.attributes.get("SentTimestamp")
+
+    if not sent_timestamp:
+        return
+
+    metrics.record(
+        "sqs_wait",
+        max(0.0, time.time() - int(sent_timestamp) / 1000),
+        len(message.body),
+        task=body.get("body", {}).get("name", metrics.UNKNOWN_TASK),
+    )
+
+
 @xray_recorder.capture("consume_message._response_exists")
 def _response_exists(mssg_body):
     client = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
@@ -92,14 +203,19 @@ def _response_exists(mssg_body):
             return obj["Size"]
 
 
+def get_deadline(mssg_body):
+    """The time in UTC after which the response to the message isn't needed."""
+    timeout = dateutil.parser.parse(mssg_body["timeout"])
+    return timeout.astimezone(pytz.utc).replace(tzinfo=None)
+
+
 def consume():
     mssg_body = _read_sqs_message()
 
     if not mssg_body:
         return None
 
-    timeout = mssg_body["timeout"]
-    timeout = dateutil.parser.parse(timeout).astimezone(pytz.utc).replace(tzinfo=None)
+    timeout = get_deadline(mssg_body)
 
     if timeout <= datetime.datetime.utcnow():
         info(
@@ -109,7 +225,13 @@ def consume():
 
         return None
 
-    if _response_exists(mssg_body):
+    with metrics.stage(
+        "response_exists",
+        task=mssg_body.get("body", {}).get("name", metrics.UNKNOWN_TASK),
+    ):
+        response_exists = _response_exists(mssg_body)
+
+    if response_exists:
         info(
             f"Skipping processing task with ETag {mssg_body['ETag']} "
             f"as a response with this hash is already in S3."
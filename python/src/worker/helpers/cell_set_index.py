@@ -0,0 +1,119 @@
+from functools import reduce
+
+import numpy as np
+
+EMPTY = np.empty(0, dtype=np.int32)
+
+
+def to_cell_ids(cell_ids):
+    """Convert a list of cell ids into a sorted array of unique np.int32 ids."""
+    return np.unique(np.asarray(cell_ids, dtype=np.int32))
+
+
+def union(*cell_ids):
+    if not cell_ids:
+        return EMPTY
+
+    return np.unique(np.concatenate(cell_ids))
+
+
+def intersection(*cell_ids):
+    return reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), cell_ids)
+
+
+def difference(cell_ids, *others):
+    return reduce(
+        lambda a, b: np.setdiff1d(a, b, assume_unique=True), others, cell_ids
+    )
+
+
+class CellSetIndex:
+    """Cell ids of every cell set in a cell sets object.
+
+    Each cell set is stored once as a sorted array of unique np.int32 ids, so
+    set operations between them run vectorized with the functions above.
+    """
+
+    def __init__(self, cell_sets):
+        self.cell_sets = cell_sets
+
+        # own cell ids of each cell set, the same as its "cellIds"
+        self._cell_ids = {}
+        self._children_keys = {}
+        self._parent_keys = {}
+
+        # cell ids of cell sets including all of their children, built lazily
+        self._all_cell_ids = {}
+        self._all_cells = None
+
+        self.root_keys = self._add_level(cell_sets, parent_key=None)
+
+    def _add_level(self, cell_sets, parent_key):
+        keys = []
+
+        for cell_set in cell_sets:
+            key = cell_set["key"]
+
+            # Keep the first cell set found for a key, as find_cells_by_set_id does
+            if key in self._cell_ids:
+                continue
+
+            keys.append(key)
+            self._cell_ids[key] = to_cell_ids(cell_set.get("cellIds", []))
+            self._parent_keys[key] = parent_key
+            self._children_keys[key] = self._add_level(
+                cell_set.get("children") or [], key
+            )
+
+        return keys
+
+    def __contains__(self, key):
+        return key in self._cell_ids
+
+    def children_keys(self, key):
+        return self._children_keys[key]
+
+    def get(self, key):
+        """Cell ids of the cell set, empty if there is no cell set with that key."""
+        return self._cell_ids.get(key, EMPTY)
+
+    def get_all(self, key):
+        """Cell ids of the cell set and all of its children.
+
+        For a cell class (e.g. louvain) these are the cells in any of its cell sets.
+        """
+        if key not in self._all_cell_ids:
+            self._all_cell_ids[key] = union(
+                self._cell_ids[key],
+                *[self.get_all(child_key) for child_key in self._children_keys[key]],
+            )
+
+        return self._all_cell_ids[key]
+
+    def union(self, keys):
+        return union(*[self.get_all(key) for key in keys])
+
+    def in_same_hierarchy(self, key):
+        """Cell ids of all the cell sets on the same level as key, except for key."""
+        if key not in self:
+            return EMPTY
+
+        parent_key = self._parent_keys[key]
+        level_keys = (
+            self.root_keys if parent_key is None else self._children_keys[parent_key]
+        )
+
+        return self.union([level_key for level_key in level_keys if level_key != key])
+
+    def all_cells(self):
+        """Cell ids of every cell set that has no children."""
+        if self._all_cells is None:
+            self._all_cells = union(
+                *[
+                    cell_ids
+                    for key, cell_ids in self._cell_ids.items()
+                    if not self._children_keys[key]
+                ]
+            )
+
+        return self._all_cells
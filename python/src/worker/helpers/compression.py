@@ -0,0 +1,214 @@
+import itertools
+import time
+import zlib
+
+from ..config import config
+from .serializer import iterencode
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# size of the pieces of uncompressed text that are compressed at a time
+CHUNK_SIZE = 64 * 1024
+
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# results smaller than this are not worth compressing, the gzip header and
+# the request to S3 cost more than the bytes saved
+MIN_SIZE = 1024
+
+# results larger than this are compressed with a fast level, compressing
+# them at higher levels takes longer than uploading the bytes it saves
+LARGE_SIZE = 64 * 1024
+
+# level of each encoding for results of medium size, and for large ones
+LEVELS = {GZIP: 6, ZSTD: 3}
+FAST_LEVELS = {GZIP: 1, ZSTD: 1}
+
+# types of content that is already compressed
+COMPRESSED_TYPES = {
+    "application/gzip",
+    "application/zip",
+    "application/zstd",
+    "image/jpeg",
+    "image/png",
+}
+
+
+class _Identity:
+    """Compressor that leaves the data as it is."""
+
+    def compress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+def _compressor(encoding, level):
+    if encoding == GZIP:
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=level).compressobj()
+
+    return _Identity()
+
+
+def choose_encoding(content_type, size, accepted):
+    """Encoding and level to compress a result of the type and size with.
+
+    The size is the number of bytes of the result before compressing it, or
+    None if it is larger than LARGE_SIZE. Only the accepted encodings are
+    chosen, gzip is used if it is the only one.
+    """
+    if IDENTITY in accepted and (
+        content_type in COMPRESSED_TYPES or (size is not None and size < MIN_SIZE)
+    ):
+        return IDENTITY, None
+
+    large = size is None
+
+    # zstd compresses faster than gzip at a similar ratio, so it is used for
+    # large results whenever the clients can decode it
+    if large and ZSTD in accepted and zstandard:
+        return ZSTD, FAST_LEVELS[ZSTD]
+
+    return GZIP, FAST_LEVELS[GZIP] if large else LEVELS[GZIP]
+
+
+def _batched(pieces):
+    """Join the small pieces of bytes into chunks of about CHUNK_SIZE."""
+    batch = []
+    batch_size = 0
+
+    for piece in pieces:
+        batch.append(piece)
+        batch_size += len(piece)
+
+        if batch_size >= CHUNK_SIZE:
+            yield b"".join(batch)
+            batch = []
+            batch_size = 0
+
+    if batch:
+        yield b"".join(batch)
+
+
+def _pieces(data):
+    if isinstance(data, bytes):
+        return (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+    if isinstance(data, str):
+        return (
+            data[i:i + CHUNK_SIZE].encode("utf-8")
+            for i in range(0, len(data), CHUNK_SIZE)
+        )
+
+    return iterencode(data)
+
+
+class CompressedStream:
+    """Read-only file object with the compressed JSON encoding of some data.
+
+    The data is serialized and compressed as it is read, so only the chunk
+    being read is held in memory, not the whole compressed result. Strings
+    and bytes are compressed as they are, without encoding them as JSON.
+    Without a level, the one in LEVELS for the encoding is used.
+    """
+
+    def __init__(self, data, encoding=GZIP, level=None, chunks=None):
+        if level is None:
+            level = LEVELS.get(encoding)
+
+        self._chunks = chunks if chunks is not None else _batched(_pieces(data))
+        self._compressor = _compressor(encoding, level)
+        self._buffer = bytearray()
+
+        self.encoding = encoding
+        self.level = level
+
+        # time spent serializing and compressing, and bytes before and after
+        self.seconds = 0.0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+
+        while self._chunks is not None and (size < 0 or len(self._buffer) < size):
+            chunk = next(self._chunks, None)
+
+            if chunk is None:
+                self._buffer += self._compressor.flush()
+                self._chunks = None
+            else:
+                self._buffer += self._compressor.compress(chunk)
+                self.raw_bytes += len(chunk)
+
+        self.seconds += time.perf_counter() - start
+
+        if size < 0:
+            size = len(self._buffer)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.compressed_bytes += len(data)
+
+        return data
+
+
+def decompress(data, encoding):
+    """Decodes a result that was uploaded with the given content encoding."""
+    if encoding == GZIP:
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+    # The frames of a stream don't have the size of their content, which
+    # ZstdDecompressor.decompress needs
+    if encoding == ZSTD:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    return data
+
+
+def compress(data, content_type, accepted=None):
+    """Stream of the data, compressed with the encoding that suits it best.
+
+    The first LARGE_SIZE bytes of the data are serialized up front to know
+    how large it is, the rest is serialized as the stream is read.
+    """
+    if accepted is None:
+        accepted = config.RESULT_ENCODINGS
+
+    start = time.perf_counter()
+
+    chunks = _batched(_pieces(data))
+    head = []
+    size = 0
+
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+
+        if size > LARGE_SIZE:
+            size = None
+            break
+
+    encoding, level = choose_encoding(content_type, size, accepted)
+
+    stream = CompressedStream(
+        data, encoding, level, chunks=itertools.chain(head, chunks)
+    )
+    stream.seconds = time.perf_counter() - start
+
+    return stream
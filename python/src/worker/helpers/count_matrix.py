@@ -1,16 +1,25 @@
-import datetime
-import backoff
-import requests
+import json
 import os
-from datetime import timezone
-from logging import error, info
+import threading
+import time
+from logging import info
 
-import aws_xray_sdk as xray
+import backoff
 import boto3
+import requests
 from aws_xray_sdk.core import xray_recorder
-from socket_io_emitter import Emitter
+from boto3.s3.transfer import TransferConfig
 
 from ..config import config
+from . import gene_list
+from .diff_expr_cache import cache as diff_expr_cache
+from .gene_expression_cache import cache as gene_expression_cache
+from .notifier import notifier
+from .r_worker import check_r_worker_health
+from .s3 import download_file
+from .tracing import TracedThreadPoolExecutor
+
+MANIFEST_NAME = ".manifest.json"
 
 
 class CountMatrix:
@@ -19,112 +28,146 @@ class CountMatrix:
         self.local_path = os.path.join(
             self.config.LOCAL_DIR, self.config.EXPERIMENT_ID
         )
+        self.manifest_path = os.path.join(self.local_path, MANIFEST_NAME)
         self.s3 = boto3.client("s3", **self.config.BOTO_RESOURCE_KWARGS)
 
-        self.last_fetch = None
+        # Large files are downloaded in byte ranges fetched in parallel.
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.config.SYNC_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=self.config.SYNC_MULTIPART_CHUNK_SIZE,
+            max_concurrency=self.config.SYNC_MULTIPART_CONCURRENCY,
+        )
+
+        # ETag and size of every downloaded object, by key.
+        self.manifest = None
+        self.last_sync = None
+
+        # Tasks computed concurrently all sync before running, make sure
+        # only one of them downloads the files at a time.
+        self.sync_lock = threading.Lock()
 
     def get_objects(self):
-        objects = self.s3.list_objects_v2(
+        paginator = self.s3.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
             Bucket=self.config.SOURCE_BUCKET, Prefix=self.config.EXPERIMENT_ID
         )
-        objects = objects.get("Contents")
 
-        if not objects:
+        return {
+            o["Key"]: {"ETag": o["ETag"], "Size": o["Size"]}
+            for page in pages
+            for o in page.get("Contents", [])
+            if o["Size"] > 0
+        }
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
             return {}
 
-        objects = {
-            o["Key"]: o["LastModified"] for o in objects if o["Size"] > 0
-        }
+    def save_manifest(self):
+        # Written to a temporary file first so a crash never leaves it corrupt.
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.manifest, f)
 
-        return objects
+        os.replace(temp_path, self.manifest_path)
 
-    @xray_recorder.capture("CountMatrix.download_object")
-    def download_object(self, key, last_modified):
+    def is_up_to_date(self, key, remote):
         path = os.path.join(self.config.LOCAL_DIR, key)
 
         try:
-            last_mod_local = datetime.datetime.fromtimestamp(
-                os.path.getmtime(path), tz=timezone.utc
-            )
+            local_size = os.path.getsize(path)
         except FileNotFoundError:
-            last_mod_local = None
-        except Exception as e:
-            error(e)
-            last_mod_local = None
+            return False
 
-        if self.last_fetch and last_modified < self.last_fetch:
-            info(
-                f"Did not fetch as last modified (remote) of {last_modified}"
-                f" was before last fetch time of {self.last_fetch}"
-            )
+        return self.manifest.get(key) == remote and local_size == remote["Size"]
 
-            return False
-        elif last_mod_local and last_modified < last_mod_local:
-            info(
-                f"Did not fetch as last modified (remote) of {last_modified}"
-                f" was before last modified (local) of {last_mod_local}"
-            )
+    @xray_recorder.capture("CountMatrix.download_object")
+    def download_object(self, key):
+        path = os.path.join(self.config.LOCAL_DIR, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
 
-            return False
-        else:
-            info(
-                f"Fetching as last modified date of {last_modified}"
-                f" is more recent than {self.last_fetch or 'Never'}"
-            )
-
-        # Disabled X-Ray to fix a botocore bug where the context
-        # does not propagate to S3 requests. see:
-        # https://github.com/open-telemetry/opentelemetry-python-contrib/issues/298
-        was_enabled = xray.global_sdk_config.sdk_enabled()
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(False)
-
-        with open(path, "wb+") as f:
-            info(f"Downloading {key} from S3...")
-            self.s3.download_fileobj(
-                Bucket=self.config.SOURCE_BUCKET,
-                Key=key,
-                Fileobj=f,
-            )
-
-            self.last_fetch = last_modified
-            f.seek(0)
-
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(True)
-
-        return True
+        info(f"Downloading {key} from S3...")
+
+        # The file is downloaded under a temporary name and renamed once it is
+        # complete, so the R worker never loads a partially written file.
+        download_file(
+            self.s3, self.config.SOURCE_BUCKET, key, path, self.transfer_config
+        )
 
     @backoff.on_exception(
         backoff.constant, requests.exceptions.RequestException, interval=5
     )
     def check_if_received(self):
         info('Count matrices updated, checking if R worker is alive...')
-        r = requests.get(
-            f"{config.R_WORKER_URL}/health",
-        )
+        check_r_worker_health()
 
+    def should_sync(self):
+        return (
+            self.last_sync is None
+            or time.monotonic() - self.last_sync >= self.config.SYNC_INTERVAL
+        )
 
     @xray_recorder.capture("CountMatrix.sync")
     def sync(self):
-        io = Emitter({"client": config.REDIS_CLIENT})
-
-        # check if path existed before running this
-        self.path_exists = os.path.exists(self.local_path)
-
-        if not self.path_exists:
-            info(f"Path {self.local_path} does not yet exist, creating it...")
-            os.makedirs(self.local_path)
-
-        objects = self.get_objects()
-
-        info(f"Found {len(objects)} objects matching experiment.")
-        io.Emit(f'Heartbeat-{self.config.EXPERIMENT_ID}', {"type": "WorkResponse", "info": "downloading seurat object"})
-        synced = {
-            key: self.download_object(key, last_modified)
-            for key, last_modified in objects.items()
-        }
-
-        io.Emit(f'Heartbeat-{self.config.EXPERIMENT_ID}', {"type": "WorkResponse", "info": "checking if R worker is alive"})
-        if True in synced.values():
-            self.check_if_received()
\ No newline at end of file
+        with self.sync_lock:
+            if not self.should_sync():
+                return
+
+            # check if path existed before running this
+            self.path_exists = os.path.exists(self.local_path)
+
+            if not self.path_exists:
+                info(f"Path {self.local_path} does not yet exist, creating it...")
+                os.makedirs(self.local_path)
+
+            if self.manifest is None:
+                self.manifest = self.load_manifest()
+
+            objects = self.get_objects()
+
+            info(f"Found {len(objects)} objects matching experiment.")
+            outdated = {
+                key: remote
+                for key, remote in objects.items()
+                if not self.is_up_to_date(key, remote)
+            }
+
+            if outdated:
+                notifier.emit([(f'Heartbeat-{self.config.EXPERIMENT_ID}', {"type": "WorkResponse", "info": "downloading seurat object"})])
+                self.download_objects(outdated)
+
+                # Expression computed from the previous files is not valid anymore
+                gene_expression_cache.clear()
+                gene_list.clear()
+                diff_expr_cache.clear()
+
+                notifier.emit([(f'Heartbeat-{self.config.EXPERIMENT_ID}', {"type": "WorkResponse", "info": "checking if R worker is alive"})])
+                self.check_if_received()
+            else:
+                info("All objects are up to date.")
+
+            self.last_sync = time.monotonic()
+
+    def download_objects(self, objects):
+        # The downloads are traced as part of the task that syncs the files
+        with TracedThreadPoolExecutor(
+            max_workers=self.config.SYNC_CONCURRENCY
+        ) as executor:
+            futures = {
+                key: executor.submit(self.download_object, key)
+                for key in objects
+            }
+
+        # Keep track of the files that were downloaded even if others
+        # failed, so they are not fetched again on the next sync.
+        for key, future in futures.items():
+            if future.exception() is None:
+                self.manifest[key] = objects[key]
+
+        self.save_manifest()
+
+        for future in futures.values():
+            future.result()
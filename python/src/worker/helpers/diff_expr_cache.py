@@ -0,0 +1,192 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import config
+from .gene_list import NameIndex, sort_orders, to_json_list
+
+
+def cache_key(request):
+    """Key of the full result of a differential expression request.
+
+    Pages, orders and filters of the same comparison share the result, so
+    only the cells compared and the type of comparison identify it.
+    """
+    digest = hashlib.sha256()
+
+    for cell_ids in (request["baseCells"], request["backgroundCells"]):
+        digest.update(np.unique(np.asarray(cell_ids, dtype=np.int64)).tobytes())
+        digest.update(b"|")
+
+    digest.update(request["comparisonType"].encode())
+
+    return digest.hexdigest()
+
+
+def _to_column(values):
+    try:
+        return np.array(values, dtype=np.float64, ndmin=1)
+    except (TypeError, ValueError):
+        return np.array(values, dtype=object, ndmin=1)
+
+
+def _is_missing(column):
+    if column.dtype.kind == "f":
+        return np.isnan(column)
+
+    return np.array([value is None for value in column], dtype=bool, ndmin=1)
+
+
+class DiffExprTable:
+    """Full result of a differential expression comparison, by column.
+
+    Pages are taken with the same semantics as paginateDE in the R worker:
+    the text and numeric filters are applied, then the rows are sorted and
+    sliced, and the rows with missing values are left out of the page like
+    na.omit does. They are still counted in the total. The sorted rows of
+    each column are computed the first time they are needed and reused for
+    every later page.
+    """
+
+    def __init__(self, gene_results):
+        self.columns = {
+            name: _to_column(values) for name, values in gene_results.items()
+        }
+
+        self.gene_names = NameIndex(self.columns["gene_names"])
+        self.complete = ~np.logical_or.reduce(
+            [_is_missing(column) for column in self.columns.values()]
+        )
+        self.orders = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.gene_names)
+
+    def _sorted_rows(self, order_by, order_direction):
+        if order_by not in self.columns:
+            return None
+
+        with self.lock:
+            if order_by not in self.orders:
+                self.orders[order_by] = sort_orders(self.columns[order_by])
+
+        direction = "DESC" if order_direction == "DESC" else "ASC"
+        return self.orders[order_by][direction]
+
+    def _filter(self, filters, gene_names_filter):
+        """Rows kept by the filters, and which of them became rows of NAs.
+
+        R keeps the rows a numeric filter can't be compared with, because of
+        an NA in the filtered column, as rows of NAs.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        missing = np.zeros(len(self), dtype=bool)
+
+        if gene_names_filter is not None:
+            mask &= self.gene_names.match(gene_names_filter)
+
+        for gene_filter in filters:
+            column = self.columns.get(gene_filter.get("columnName"))
+
+            if column is None or column.dtype.kind != "f":
+                continue
+
+            if gene_filter["comparison"] == "greaterThan":
+                keep = column > gene_filter["value"]
+            elif gene_filter["comparison"] == "lessThan":
+                keep = column < gene_filter["value"]
+            else:
+                continue
+
+            mask &= keep | np.isnan(column) | missing
+            missing |= mask & np.isnan(column)
+
+        return mask, missing
+
+    def query(self, pagination, genes_only=False, gene_names_filter=None):
+        """Returns the page of the result asked for and the number of genes."""
+        if not pagination:
+            return {
+                "gene_results": {
+                    name: to_json_list(column)
+                    for name, column in self.columns.items()
+                },
+                "full_count": len(self),
+            }
+
+        mask, missing = self._filter(
+            pagination.get("filters") or [], gene_names_filter
+        )
+        rows = self._sorted_rows(
+            pagination.get("orderBy"), pagination.get("orderDirection")
+        )
+
+        if rows is None:
+            rows = np.flatnonzero(mask)
+        else:
+            # Rows of NAs are sorted last
+            rows = rows[mask[rows]]
+            rows = np.concatenate([rows[~missing[rows]], rows[missing[rows]]])
+
+        offset = pagination.get("offset", 0)
+        limit = pagination["limit"]
+
+        if genes_only:
+            page = rows[:limit]
+            names = self.columns["gene_names"][page]
+            gene_ids = self.columns["Gene"][page]
+
+            return {
+                "gene_results": {
+                    "gene_names": to_json_list(np.where(missing[page], None, names)),
+                    "gene_id": to_json_list(np.where(missing[page], None, gene_ids)),
+                },
+                "full_count": len(page),
+            }
+
+        page = rows[offset:offset + limit]
+        page = page[self.complete[page] & ~missing[page]]
+
+        return {
+            "gene_results": {
+                name: to_json_list(column[page])
+                for name, column in self.columns.items()
+            },
+            "full_count": len(rows),
+        }
+
+
+class DiffExprCache:
+    """Least recently used cache of full differential expression results."""
+
+    def __init__(self, max_count):
+        self.max_count = max_count
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, table):
+        with self.lock:
+            self.entries[key] = table
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_count:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+cache = DiffExprCache(config.DIFF_EXPR_CACHE_COUNT)
@@ -1,5 +1,6 @@
 def get_all_cell_ids_in(cell_set):
-    cell_ids = cell_set["cellIds"]
+    # copy the ids, the cell sets object is shared between requests
+    cell_ids = list(cell_set["cellIds"])
 
     children = cell_set.get("children", None)
     if children:
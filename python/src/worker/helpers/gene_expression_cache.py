@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import config
+
+STATS = ["rawMean", "rawStdev", "truncatedMin", "truncatedMax"]
+MATRICES = ["rawExpression", "truncatedExpression", "zScore"]
+
+
+def split_genes(data):
+    """Split a runExpression result into the data of each of its genes.
+
+    Every statistic has a value per gene and every matrix is a CSC sparse
+    matrix with a column per gene, so each gene can be taken on its own.
+    """
+    genes = []
+
+    for column, name in enumerate(data["orderedGeneNames"]):
+        gene = {
+            "name": name,
+            "stats": {stat: data["stats"][stat][column] for stat in STATS},
+            "rows": data[MATRICES[0]]["size"][0],
+        }
+
+        for matrix_name in MATRICES:
+            matrix = data[matrix_name]
+            start, end = matrix["ptr"][column], matrix["ptr"][column + 1]
+
+            gene[matrix_name] = (
+                np.asarray(matrix["values"][start:end], dtype=np.float64),
+                np.asarray(matrix["index"][start:end], dtype=np.int32),
+            )
+
+        genes.append(gene)
+
+    return genes
+
+
+def merge_genes(genes):
+    """Build a runExpression result with the data of the given genes."""
+    data = {
+        "orderedGeneNames": [gene["name"] for gene in genes],
+        "stats": {stat: [gene["stats"][stat] for gene in genes] for stat in STATS},
+    }
+
+    rows = genes[0]["rows"] if genes else 0
+
+    for matrix_name in MATRICES:
+        values = [gene[matrix_name][0] for gene in genes]
+        index = [gene[matrix_name][1] for gene in genes]
+        ptr = np.concatenate([[0], np.cumsum([len(v) for v in values])])
+
+        data[matrix_name] = {
+            "values": np.concatenate(values).tolist() if genes else [],
+            "index": np.concatenate(index).tolist() if genes else [],
+            "ptr": ptr.astype(int).tolist(),
+            "size": [rows, len(genes)],
+        }
+
+    return data
+
+
+def _size(genes):
+    return sum(
+        gene[matrix_name][0].nbytes + gene[matrix_name][1].nbytes
+        for gene in genes
+        for matrix_name in MATRICES
+    )
+
+
+class GeneExpressionCache:
+    """Least recently used cache of the expression of single genes.
+
+    Entries are keyed by the upper case gene name, as genes are matched case
+    insensitively, and hold the data of all the genes with that name, which
+    is empty if the gene was not found. Its size is bounded by the bytes of
+    the expression values it holds.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, keys):
+        """Returns the entries found for the keys, by key."""
+        with self.lock:
+            found = {}
+
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+
+            return found
+
+    def put(self, key, genes):
+        with self.lock:
+            if key in self.entries:
+                self.size -= _size(self.entries.pop(key))
+
+            self.entries[key] = genes
+            self.size += _size(genes)
+
+            while self.size > self.max_size and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= _size(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+cache = GeneExpressionCache(config.GENE_EXPRESSION_CACHE_SIZE)
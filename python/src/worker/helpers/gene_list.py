@@ -0,0 +1,187 @@
+import re
+import threading
+
+import numpy as np
+
+from .r_worker import send_r_request
+
+# Characters that still have a meaning as a regex once remove_regex has been
+# applied to the names filter, besides ^ and $ at its ends.
+REGEX_CHARS = set("\\^$.|?*+()[]{}")
+
+# Sorts after any other character, so prefix + LAST_CHAR is an upper bound
+# for all the names that start with prefix.
+LAST_CHAR = chr(0x10FFFF)
+
+
+def sort_orders(values):
+    """Positions of the values sorted in ascending and descending order.
+
+    Ties keep the order of the table in both directions and missing values
+    go last, as R's order does. Text is sorted ignoring case.
+    """
+    values = np.asarray(values)
+
+    if values.dtype.kind == "f":
+        ranks = values
+    else:
+        folded = np.array([str(value).casefold() for value in values], ndmin=1)
+        _, ranks = np.unique(folded, return_inverse=True)
+
+    return {
+        "ASC": np.argsort(ranks, kind="stable"),
+        "DESC": np.argsort(-ranks, kind="stable"),
+    }
+
+
+def _prefix_range(sorted_names, prefix):
+    start = np.searchsorted(sorted_names, prefix, side="left")
+    end = np.searchsorted(sorted_names, prefix + LAST_CHAR, side="left")
+    return start, end
+
+
+class NameIndex:
+    """Gene names indexed to be filtered like the UI's gene names filter.
+
+    Names are matched case insensitively like grepl(ignore.case = TRUE) does,
+    with sorted arrays of the case folded names and of their reverse to find
+    the ones that start or end with a text by binary search.
+    """
+
+    def __init__(self, names):
+        self.names = np.array(names, dtype=object, ndmin=1)
+        self.folded_names = np.array(
+            [name.casefold() for name in self.names], dtype=str, ndmin=1
+        )
+
+        self.prefix_rows = np.argsort(self.folded_names, kind="stable")
+        self.prefixes = self.folded_names[self.prefix_rows]
+
+        reversed_names = np.array(
+            [name[::-1] for name in self.folded_names], dtype=str, ndmin=1
+        )
+        self.suffix_rows = np.argsort(reversed_names, kind="stable")
+        self.suffixes = reversed_names[self.suffix_rows]
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, pattern):
+        """Mask of the names that match the names filter.
+
+        The filter is a text with an optional ^ before it to match the names
+        that start with it and an optional $ after it to match the names that
+        end with it. Anything else is matched as a regular expression.
+        """
+        starts = pattern.startswith("^")
+        ends = pattern.endswith("$") and len(pattern) > int(starts)
+        text = pattern[int(starts):len(pattern) - int(ends)]
+
+        if any(char in REGEX_CHARS for char in text):
+            return self._match_regex(pattern)
+
+        text = text.casefold()
+        mask = np.zeros(len(self), dtype=bool)
+
+        if starts and ends:
+            start = np.searchsorted(self.prefixes, text, side="left")
+            end = np.searchsorted(self.prefixes, text, side="right")
+            mask[self.prefix_rows[start:end]] = True
+        elif starts:
+            start, end = _prefix_range(self.prefixes, text)
+            mask[self.prefix_rows[start:end]] = True
+        elif ends:
+            start, end = _prefix_range(self.suffixes, text[::-1])
+            mask[self.suffix_rows[start:end]] = True
+        else:
+            mask = np.char.find(self.folded_names, text) >= 0
+
+        return mask
+
+    def _match_regex(self, pattern):
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            return np.zeros(len(self), dtype=bool)
+
+        return np.array(
+            [regex.search(name) is not None for name in self.names],
+            dtype=bool,
+            ndmin=1,
+        )
+
+
+def to_json_list(values):
+    """Values as a list, with None instead of NaN like R's NA."""
+    if values.dtype.kind == "f":
+        values = np.where(np.isnan(values), None, values)
+
+    return values.tolist()
+
+
+class GeneList:
+    """Gene dispersion table indexed to answer ListGenes requests.
+
+    The rows sorted by each column are computed once, so a page is taken by
+    filtering an already sorted array of rows. Genes without a dispersion are
+    left out, like na.omit leaves them out of the pages of the R worker.
+    """
+
+    def __init__(self, gene_names, dispersions):
+        dispersions = np.array(dispersions, dtype=np.float64, ndmin=1)
+        complete = ~np.isnan(dispersions)
+
+        self.gene_names = NameIndex(np.array(gene_names, dtype=object)[complete])
+        self.dispersions = dispersions[complete]
+
+        self.orders = {
+            "gene_names": sort_orders(self.gene_names.names),
+            "dispersions": sort_orders(self.dispersions),
+        }
+
+    def __len__(self):
+        return len(self.gene_names)
+
+    def query(self, order_by, order_direction, offset, limit, gene_names_filter=None):
+        """Returns a page of the genes that match the filter and their total."""
+        if order_by in self.orders:
+            direction = "DESC" if order_direction == "DESC" else "ASC"
+            rows = self.orders[order_by][direction]
+        else:
+            rows = np.arange(len(self))
+
+        if gene_names_filter is not None:
+            rows = rows[self.gene_names.match(gene_names_filter)[rows]]
+
+        page = rows[offset:offset + limit]
+
+        result = {
+            "gene_names": to_json_list(self.gene_names.names[page]),
+            "dispersions": to_json_list(self.dispersions[page]),
+        }
+
+        return result, len(rows)
+
+
+_gene_list = None
+_lock = threading.Lock()
+
+
+def get_gene_list():
+    """The gene list of the experiment, fetched from the R worker once."""
+    global _gene_list
+
+    with _lock:
+        if _gene_list is None:
+            data = send_r_request("getGeneDispersion", {}).get("data")
+            _gene_list = GeneList(data["gene_names"], data["dispersions"])
+
+        return _gene_list
+
+
+def clear():
+    """Forget the gene list, for it to be fetched again for new data."""
+    global _gene_list
+
+    with _lock:
+        _gene_list = None
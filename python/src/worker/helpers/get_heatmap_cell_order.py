@@ -1,114 +1,114 @@
-from functools import reduce
-import math
-import random
+import numpy as np
 
-from .cell_sets_dict import get_cell_sets_dict
+from .cell_set_index import CellSetIndex, difference, intersection
 
-def get_cell_class_ids(key, cell_sets):
-  children = next(cell_class for cell_class in cell_sets if cell_class["key"] == key)["children"]
-  cell_ids = map(lambda cell_set: cell_set["cellIds"], children)
+# The downsampling is seeded so the same request always returns the same cell order
+DOWNSAMPLING_SEED = 900
 
-  cell_ids_set = set()
-  for i in cell_ids:
-    cell_ids_set.update(i)
+def get_heatmap_cell_order(selected_cell_set, grouped_tracks, selected_points, hidden_cell_set_keys, max_cells, cell_sets, seed=DOWNSAMPLING_SEED):
+  # cell_sets can be either the cell sets object or an index built from it
+  if isinstance(cell_sets, CellSetIndex):
+    cell_set_index = cell_sets
+  else:
+    cell_set_index = CellSetIndex(cell_sets)
 
-  return cell_ids_set
-
-def get_heatmap_cell_order(selected_cell_set, grouped_tracks, selected_points, hidden_cell_set_keys, max_cells, cell_sets):
-  cell_sets_by_key = get_cell_sets_dict(cell_sets)
-
-  filtered_cell_ids = get_cell_class_ids('louvain', cell_sets)
+  filtered_cell_ids = cell_set_index.get_all('louvain')
 
   def get_cells(key, is_root_node=False):
     unfiltered_cell_ids = None
 
-    if (is_root_node): 
-      unfiltered_cell_ids = get_cell_class_ids(key, cell_sets)
-    else: 
-      unfiltered_cell_ids = cell_sets_by_key[key]["cellIds"]
+    if (is_root_node):
+      unfiltered_cell_ids = cell_set_index.get_all(key)
+    else:
+      unfiltered_cell_ids = cell_set_index.get(key)
 
-    return filtered_cell_ids.intersection(set(unfiltered_cell_ids))
+    return intersection(filtered_cell_ids, unfiltered_cell_ids)
 
   def get_all_enabled_cell_ids():
     cell_ids = get_cells(selected_cell_set, is_root_node=True)
 
     if (selected_points != "All"):
       cell_set_key = selected_points.split('/')[1]
-      cell_ids = cell_ids.intersection(get_cells(cell_set_key))
-      
+      cell_ids = intersection(cell_ids, get_cells(cell_set_key))
+
     for hidden_cell_set in hidden_cell_set_keys:
-      cell_ids = cell_ids.difference(get_cells(hidden_cell_set))
+      cell_ids = difference(cell_ids, get_cells(hidden_cell_set))
 
     return cell_ids
 
-  # Returns a list of sets, one for each cell set in the cell_class 
-  # each of them is an intersection of each cell set with cell_ids
-  def get_intersections(cell_ids, cell_class):
-    children = next(curr_class for curr_class in cell_sets if curr_class["key"] == cell_class)["children"]
-    cell_ids_by_set = map(lambda cell_set: cell_set["cellIds"], children)
+  # Adds a row of labels with the position of the cell set each cell belongs to
+  # within cell_class. Cells that are in several of its cell sets are repeated,
+  # one time for each, and cells that aren't in any of them are labelled last
+  def add_labels(cell_ids, labels, cell_class):
+    children_keys = cell_set_index.children_keys(cell_class)
 
-    intersections = []
-    for current_set_ids in cell_ids_by_set:
+    rows = []
+    class_labels = []
+    in_any_cell_set = np.zeros(len(cell_ids), dtype=bool)
 
-      current_intersection = set(current_set_ids).intersection(cell_ids)
-      
-      if (len(current_intersection) > 0):
-        intersections.append(current_intersection)
+    for position, cell_set_key in enumerate(children_keys):
+      in_cell_set = np.isin(cell_ids, cell_set_index.get(cell_set_key))
 
-    return intersections
+      rows.append(np.flatnonzero(in_cell_set))
+      class_labels.append(np.full(np.count_nonzero(in_cell_set), position))
+      in_any_cell_set |= in_cell_set
 
-  def cartesian_product_intersection(buckets, cell_class):
-    new_buckets = []
+    leftover_rows = np.flatnonzero(~in_any_cell_set)
+    rows.append(leftover_rows)
+    class_labels.append(np.full(len(leftover_rows), len(children_keys)))
 
-    for bucket in buckets:
-      intersections = get_intersections(bucket, cell_class)
+    rows = np.concatenate(rows)
 
-      # The cells that werent part of any intersection are also added at the end
-      leftover_cells = reduce(lambda acum, current: acum.difference(current), intersections, bucket)
-      intersections.append(leftover_cells)
-      
-      for intersection in intersections:
-        new_buckets.append(intersection)
+    return cell_ids[rows], np.vstack([labels[:, rows], np.concatenate(class_labels)])
 
-    return new_buckets
+  # Sorts the cells by group, the combination of cell sets they belong to for
+  # every grouped track, and returns them with the group each one is in
+  def split_by_groups(enabled_cell_ids):
+    cell_ids = enabled_cell_ids
+    labels = np.empty((0, len(cell_ids)), dtype=np.int64)
 
-  def split_by_cartesian_intersections(enabled_cell_ids):
-    buckets = None
-    size = None
+    for cell_class_key in grouped_tracks:
+      cell_ids, labels = add_labels(cell_ids, labels, cell_class_key)
 
-    buckets = [enabled_cell_ids]
+    # lexsort sorts by the last key first, so the first track has to go last
+    order = np.lexsort(labels[::-1])
+    cell_ids = cell_ids[order]
+    labels = labels[:, order]
 
-    for cell_class_key in grouped_tracks:
-      buckets = cartesian_product_intersection(buckets, cell_class_key)
+    # Cells are sorted by group, so a new group starts wherever the labels change
+    group_changes = np.any(labels[:, 1:] != labels[:, :-1], axis=0)
+    groups = np.concatenate([[0], np.cumsum(group_changes)])
+
+    return cell_ids, groups
 
+  def downsample(cell_ids, groups):
     # We need to calculate size at the end because we may have repeated cells
     # (due to group bys having the same cell in different groups)
-    size = reduce(lambda acum, bucket: acum + len(bucket), buckets, 0)
-
-    return buckets, size
-  
-  def downsample(buckets, amount_of_cells):
-    downsampled_cell_ids = []
+    amount_of_cells = len(cell_ids)
 
     # If we collected less than max_cells, then no need to downsample
     final_sample_size = min(amount_of_cells, max_cells)
 
-    for bucket in buckets:
-      sample_size = math.floor((len(bucket) / amount_of_cells) * final_sample_size)
+    group_sizes = np.bincount(groups)
+    sample_sizes = np.floor((group_sizes / amount_of_cells) * final_sample_size)
+
+    # Shuffle the cells within each group and keep the first sample_size of each
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(amount_of_cells), groups))
+
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+    position_in_group = np.arange(amount_of_cells) - group_starts[groups[order]]
 
-      # Pick sample_size elements randomly
-      sample = random.sample(list(bucket), sample_size)
+    sampled = order[position_in_group < sample_sizes[groups[order]]]
+
+    return cell_ids[sampled].tolist()
 
-      downsampled_cell_ids.extend(sample)
 
-    return downsampled_cell_ids
-  
-  
   enabled_cell_ids = get_all_enabled_cell_ids()
-  
-  if (len(grouped_tracks) == 0 or len(enabled_cell_ids) == 0): 
+
+  if (len(grouped_tracks) == 0 or len(enabled_cell_ids) == 0):
     return []
 
-  buckets, size = split_by_cartesian_intersections(enabled_cell_ids)
+  cell_ids, groups = split_by_groups(enabled_cell_ids)
 
-  return downsample(buckets, size)
+  return downsample(cell_ids, groups)
@@ -0,0 +1,261 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import info
+
+# Upper bounds in seconds of the buckets of the stage duration histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Label of the stages measured outside of any task
+UNKNOWN_TASK = "unknown"
+
+DURATION = "worker_stage_duration_seconds"
+BYTES = "worker_stage_bytes_total"
+
+
+class StageMetrics:
+    """Durations and bytes of all the times a stage of a task was run."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds, nbytes):
+        self.count += 1
+        self.seconds += seconds
+        self.bytes += nbytes
+
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sample(metric, value, **labels):
+    labels = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+    return f"{metric}{{{labels}}} {value}"
+
+
+class Registry:
+    """Metrics of every stage of every task type since the worker started."""
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, task, stage, seconds, nbytes=0):
+        with self.lock:
+            key = (task, stage)
+
+            if key not in self.stages:
+                self.stages[key] = StageMetrics()
+
+            self.stages[key].add(seconds, nbytes)
+
+    def mean_seconds(self, task, stage):
+        """Mean duration of the stage of the task, None if it never ran."""
+        with self.lock:
+            metrics = self.stages.get((task, stage))
+
+            if not metrics or not metrics.count:
+                return None
+
+            return metrics.seconds / metrics.count
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self.lock:
+            stages = sorted(self.stages.items())
+
+            lines = [
+                f"# HELP {DURATION} Duration of each stage of a task.",
+                f"# TYPE {DURATION} histogram",
+            ]
+
+            for (task, stage), metrics in stages:
+                labels = {"task": task, "stage": stage}
+
+                for bound, count in zip(BUCKETS, metrics.buckets):
+                    lines.append(
+                        _sample(f"{DURATION}_bucket", count, **labels, le=bound)
+                    )
+
+                lines += [
+                    _sample(f"{DURATION}_bucket", metrics.count, **labels, le="+Inf"),
+                    _sample(f"{DURATION}_sum", metrics.seconds, **labels),
+                    _sample(f"{DURATION}_count", metrics.count, **labels),
+                ]
+
+            lines += [
+                f"# HELP {BYTES} Bytes handled by each stage of a task.",
+                f"# TYPE {BYTES} counter",
+            ]
+
+            for (task, stage), metrics in stages:
+                lines.append(_sample(BYTES, metrics.bytes, task=task, stage=stage))
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class TaskRecord:
+    """Stages of a single task, logged as a JSON line once it finishes."""
+
+    def __init__(self, name, etag):
+        self.name = name
+        self.etag = etag
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds, nbytes):
+        with self.lock:
+            totals = self.stages.setdefault(stage, {"seconds": 0.0, "bytes": 0})
+            totals["seconds"] += seconds
+            totals["bytes"] += nbytes
+
+    def to_json(self):
+        with self.lock:
+            return json.dumps(
+                {
+                    "type": "TaskMetrics",
+                    "task": self.name,
+                    "etag": self.etag,
+                    "stages": self.stages,
+                }
+            )
+
+
+# The task being run by each thread, stages run in it are recorded for it
+_local = threading.local()
+
+
+def _current():
+    return getattr(_local, "record", None)
+
+
+@contextmanager
+def task(name, etag=None):
+    """Measures the stages run in this thread as part of the task."""
+    record = TaskRecord(name, etag)
+    previous = _current()
+    _local.record = record
+
+    start = time.perf_counter()
+
+    try:
+        yield record
+    finally:
+        _local.record = previous
+
+        seconds = time.perf_counter() - start
+        registry.record(name, "total", seconds)
+        record.add("total", seconds, 0)
+
+        info(record.to_json())
+
+
+def record(stage, seconds, nbytes=0, task=None):
+    """Records a run of a stage for the given task, or the current one."""
+    current = _current()
+
+    if task is None:
+        task = current.name if current else UNKNOWN_TASK
+
+    registry.record(task, stage, seconds, nbytes)
+
+    if current and current.name == task:
+        current.add(stage, seconds, nbytes)
+
+
+class Stage:
+    """A stage being measured. Its bytes can be set while it runs."""
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes = 0
+
+
+@contextmanager
+def stage(name, task=None):
+    """Measures the duration of the block as a stage of the task."""
+    measured = Stage(name)
+    start = time.perf_counter()
+
+    try:
+        yield measured
+    finally:
+        record(name, time.perf_counter() - start, measured.bytes, task)
+
+
+def timed(name):
+    """Decorator that measures every call to the function as a stage."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(function):
+    """Wraps the function to record its stages for the task of the caller,
+    for functions that run on other threads."""
+    current = _current()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous = _current()
+        _local.record = current
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.record = previous
+
+    return wrapper
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = registry.to_prometheus().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent, don't fill the logs with them
+        pass
+
+
+def start_server(port):
+    """Serves the metrics at /metrics on the port from a background thread."""
+    server = ThreadingHTTPServer(("", port), _Handler)
+
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    )
+    thread.start()
+
+    info(f"Serving metrics at port {server.server_address[1]}")
+    return server
@@ -0,0 +1,82 @@
+import threading
+
+import backoff
+import redis
+from socket_io_emitter import Emitter
+
+from ..config import config
+
+
+class _Batch:
+    """Events emitted by threads at the same time, published together."""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+
+
+class Notifier:
+    """Emits socket.io events to the clients through Redis.
+
+    Every emit waits for its events to be published, but the events of all
+    the threads emitting at the same time are published together, in a single
+    round trip to Redis. While one batch is being published, the events
+    emitted in the meantime gather in the next one.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.publishing = False
+        self.next_batch = _Batch()
+
+    def emit(self, events):
+        """Publishes the events, given as (event, data) pairs, in order."""
+        with self.condition:
+            batch = self.next_batch
+            batch.events.extend(events)
+
+            # Another thread is publishing, the events of this one go next
+            while self.publishing and not batch.done:
+                self.condition.wait()
+
+            if not batch.done:
+                self.publishing = True
+                self.next_batch = _Batch()
+                leader = True
+            else:
+                leader = False
+
+        if leader:
+            try:
+                self._publish(batch.events)
+            except Exception as e:
+                batch.error = e
+
+            with self.condition:
+                batch.done = True
+                self.publishing = False
+                self.condition.notify_all()
+
+        if batch.error:
+            raise batch.error
+
+    # A connection that was dropped is replaced by a new one from the pool of
+    # the client on the next try, so a Redis failover is only a short delay.
+    @backoff.on_exception(
+        backoff.expo,
+        (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError),
+        max_tries=3,
+    )
+    def _publish(self, events):
+        # The emitter only encodes the packets, they are sent by the pipeline
+        pipeline = config.REDIS_CLIENT.pipeline(transaction=False)
+        io = Emitter({"client": pipeline})
+
+        for event, data in events:
+            io.Emit(event, data)
+
+        pipeline.execute()
+
+
+notifier = Notifier()
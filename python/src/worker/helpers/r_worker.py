@@ -0,0 +1,117 @@
+from logging import info
+
+import backoff
+import requests
+from exceptions import raise_if_error
+from requests.adapters import HTTPAdapter
+
+from ..config import config
+from . import metrics, typed_arrays
+from .serializer import dumps, loads
+
+# seconds to wait for a connection to the R worker, it is on the same pod
+CONNECT_TIMEOUT = 5
+
+
+def _timeout():
+    # The answer is waited for as long as configured, by default without limit
+    return (CONNECT_TIMEOUT, config.R_WORKER_TIMEOUT)
+
+
+# A single session is shared by every task so connections to the R worker
+# are kept alive and reused instead of being opened for each request.
+session = requests.Session()
+session.mount(
+    "http://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=max(10, sum(config.LANE_CONCURRENCY.values())),
+    ),
+)
+
+# Whether long arrays in requests are sent as typed arrays. It is turned off
+# the first time the R worker answers that it doesn't support them.
+typed_arrays_enabled = config.R_WORKER_TYPED_ARRAYS
+
+
+def _encode_request(request):
+    if typed_arrays_enabled:
+        content = typed_arrays.encode(request)
+
+        if content is not None:
+            return typed_arrays.CONTENT_TYPE, content
+
+    return "application/json", dumps(request)
+
+
+def _decode_response(response):
+    content_type = response.headers.get("content-type", "")
+
+    if content_type.split(";")[0].strip() == typed_arrays.CONTENT_TYPE:
+        return typed_arrays.decode(response.content)
+
+    return loads(response.content)
+
+
+def _post(endpoint, content_type, data):
+    accept = "application/json"
+    if typed_arrays_enabled:
+        accept = f"{typed_arrays.CONTENT_TYPE}, {accept}"
+
+    return session.post(
+        f"{config.R_WORKER_URL}/v0/{endpoint}",
+        headers={"content-type": content_type, "accept": accept},
+        data=data,
+        timeout=_timeout(),
+    )
+
+
+@backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=30)
+def send_r_request(endpoint, request):
+    """Send a request to an endpoint of the R worker.
+
+    Long numeric arrays in the request and the result are sent as typed arrays
+    when the R worker supports them, everything else is sent as JSON.
+
+    Args:
+        endpoint (str): Name of the endpoint, e.g. "getEmbedding"
+        request (Dict): JSON serializable body of the request
+
+    Raises:
+        RWorkerException: If the R worker returned an error
+
+    Returns:
+        Dict: JSON result returned by the R worker
+    """
+    global typed_arrays_enabled
+
+    with metrics.stage("encode") as stage:
+        content_type, data = _encode_request(request)
+        stage.bytes = len(data)
+
+    with metrics.stage("r_call") as stage:
+        response = _post(endpoint, content_type, data)
+
+        # R workers without support for typed arrays answer 415 Unsupported Media Type
+        if content_type == typed_arrays.CONTENT_TYPE and response.status_code == 415:
+            info("The R worker does not support typed arrays, sending JSON instead.")
+            typed_arrays_enabled = False
+            response = _post(endpoint, "application/json", dumps(request))
+
+        stage.bytes = len(response.content)
+
+    # raise an exception if an HTTPError occurred. otherwise the json is not valid
+    response.raise_for_status()
+
+    with metrics.stage("decode") as stage:
+        result = _decode_response(response)
+        stage.bytes = len(response.content)
+
+    raise_if_error(result)
+
+    return result
+
+
+def check_r_worker_health():
+    response = session.get(f"{config.R_WORKER_URL}/health", timeout=_timeout())
+    response.raise_for_status()
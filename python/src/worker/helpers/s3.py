@@ -1,82 +1,176 @@
-import gzip
-import json
 import os
+import threading
+from collections import OrderedDict
 from logging import info
 from pathlib import Path
 
-import aws_xray_sdk as xray
 import boto3
+import numpy as np
+from s3transfer.manager import TransferManager
 
 from ..config import config
+from . import metrics
+from .cell_set_index import CellSetIndex
+from .compression import GZIP, decompress
+from .serializer import loads
+from .tracing import TracedThreadPoolExecutor
+
+
+# Parsed cell sets by experiment id, along with the ETag of the S3 object
+# they were parsed from. They are only downloaded again when it changes.
+_cell_sets_cache = {}
+_cell_set_index_cache = {}
+_cell_sets_lock = threading.Lock()
+
+# Embeddings by ETag, memory mapped from the files they are stored in. They
+# never change, the ETag of a new embedding is different.
+_embedding_cache = OrderedDict()
+_embedding_lock = threading.Lock()
+
+
+def _transfer_manager(client, transfer_config=None):
+    # boto3 transfers files on threads of its own, where X-Ray has no segment,
+    # so the threads of this manager are handed the segment of the caller.
+    return TransferManager(
+        client, transfer_config, executor_cls=TracedThreadPoolExecutor
+    )
+
+
+def upload_fileobj(client, fileobj, bucket, key, extra_args=None):
+    """Like client.upload_fileobj, tracing the upload as part of the caller."""
+    with _transfer_manager(client) as manager:
+        manager.upload(fileobj, bucket, key, extra_args).result()
+
+
+def download_file(client, bucket, key, filename, transfer_config=None):
+    """Like client.download_file, tracing the download as part of the caller."""
+    with _transfer_manager(client, transfer_config) as manager:
+        manager.download(bucket, key, filename).result()
 
 
 def get_cell_sets(experiment_id):
-    dir_path = os.path.join(config.LOCAL_DIR, f"{experiment_id}")
+    s3 = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
 
-    Path(dir_path).mkdir(parents=True, exist_ok=True)
+    head = s3.head_object(Bucket=config.CELL_SETS_BUCKET, Key=experiment_id)
+    etag = head.get("ETag")
 
-    with open(f"{dir_path}/cell_sets.json", "wb+") as f:
-        s3 = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
+    with _cell_sets_lock:
+        cached = _cell_sets_cache.get(experiment_id)
 
-        info(f"Downloading cellsets for experiment {experiment_id}")
+    if etag and cached and cached[0] == etag:
+        info(f"Cellsets for experiment {experiment_id} unchanged, using cache")
+        return cached[1]
 
-        # Disabled X-Ray to fix a botocore bug where the context
-        # does not propagate to S3 requests. see:
-        # https://github.com/open-telemetry/opentelemetry-python-contrib/issues/298
-        was_enabled = xray.global_sdk_config.sdk_enabled()
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(False)
+    info(f"Downloading cellsets for experiment {experiment_id}")
 
-        s3.download_fileobj(
-            Bucket=config.CELL_SETS_BUCKET,
-            Key=experiment_id,
-            Fileobj=f,
-        )
+    with metrics.stage("cell_sets_fetch") as stage:
+        response = s3.get_object(Bucket=config.CELL_SETS_BUCKET, Key=experiment_id)
+        content = response["Body"].read()
+        stage.bytes = len(content)
 
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(True)
+    with metrics.stage("cell_sets_parse") as stage:
+        cell_sets = loads(content)["cellSets"]
+        stage.bytes = len(content)
 
-        f.seek(0)
+    # Objects without an ETag can't be revalidated, so they are not cached
+    etag = response.get("ETag", etag)
+    if etag:
+        with _cell_sets_lock:
+            _cell_sets_cache[experiment_id] = (etag, cell_sets)
 
-        cell_sets_string = f.read()
-        cell_sets = json.loads(cell_sets_string)
+    return cell_sets
 
-        return cell_sets["cellSets"]
 
+def get_cell_set_index(experiment_id):
+    cell_sets = get_cell_sets(experiment_id)
+
+    # The index is built again only when new cell sets were downloaded
+    with _cell_sets_lock:
+        cached = _cell_set_index_cache.get(experiment_id)
+
+    if cached and cached[0] is cell_sets:
+        return cached[1]
+
+    cell_set_index = CellSetIndex(cell_sets)
+
+    with _cell_sets_lock:
+        _cell_set_index_cache[experiment_id] = (cell_sets, cell_set_index)
+
+    return cell_set_index
 
-def get_embedding(etag, format_for_r):
-    dir_path = os.path.join(config.LOCAL_DIR, f"{etag}")
 
-    Path(dir_path).mkdir(parents=True, exist_ok=True)
+def _download_embedding(etag, path):
+    s3 = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
 
-    with open(f"{dir_path}/embedding.json", "wb+") as f:
-        s3 = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
+    info(f"Downloading embedding with ETag {etag}")
 
-        info(f"Downloading embedding with ETag {etag}")
+    response = s3.get_object(Bucket=config.RESULTS_BUCKET, Key=etag)
+    content = response["Body"].read()
 
-        # Disabled X-Ray to fix a botocore bug where the context
-        # does not propagate to S3 requests. see:
-        # https://github.com/open-telemetry/opentelemetry-python-contrib/issues/298
-        was_enabled = xray.global_sdk_config.sdk_enabled()
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(False)
+    # Results uploaded before their encoding was recorded are all gzipped
+    encoding = response.get("ContentEncoding", GZIP)
+    embedding = loads(decompress(content, encoding))
 
-        s3.download_fileobj(
-            Bucket=config.RESULTS_BUCKET,
-            Key=etag,
-            Fileobj=f,
-        )
+    # Filtered cells have no coordinates, they are kept as NaN
+    array = np.full((len(embedding), 2), np.nan, dtype=np.float32)
+    valid = np.array([e is not None for e in embedding], dtype=bool)
+    if valid.any():
+        array[valid] = [e for e in embedding if e is not None]
+
+    # Saved under a temporary name first, so other threads never map a file
+    # that is still being written
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as temp_file:
+        np.save(temp_file, array)
+
+    os.replace(temp_path, path)
+
+
+def get_embedding_array(etag):
+    """The embedding with the given ETag as a read only (n_cells, 2) float32 array.
+
+    Filtered cells are NaN. The array is memory mapped from a local file, so
+    the embedding is only downloaded once and shared by all the tasks using it.
+    """
+    with _embedding_lock:
+        if etag in _embedding_cache:
+            _embedding_cache.move_to_end(etag)
+            return _embedding_cache[etag]
+
+    path = os.path.join(config.LOCAL_DIR, etag, "embedding.npy")
+
+    if not os.path.exists(path):
+        _download_embedding(etag, path)
+
+    embedding = np.load(path, mmap_mode="r")
+
+    with _embedding_lock:
+        _embedding_cache[etag] = embedding
+
+        while len(_embedding_cache) > config.EMBEDDING_CACHE_COUNT:
+            _embedding_cache.popitem(last=False)
+
+    return embedding
+
+
+def get_embedding(etag, format_for_r):
+    """The embedding with the given ETag, for a request to the R worker or as JSON.
 
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(True)
+    For the R worker it is the memory mapped array itself, which is serialized
+    straight from the file. Filtered cells are encoded as [null, null], which R
+    reads as NAs, so their rows are kept. Otherwise it is a list of [x, y]
+    pairs with None for the filtered cells.
+    """
+    embedding_array = get_embedding_array(etag)
 
-        f.seek(0)
+    if format_for_r:
+        # A plain view of the mapped file, which the serializer encodes natively
+        return np.asarray(embedding_array)
 
-        embedding_string = gzip.decompress(f.read())
-        embedding = json.loads(embedding_string)
+    embedding = embedding_array.tolist()
 
-        if(format_for_r):
-          # NULL values are deleted in R objects whereas NAs are an indicator of a missing value
-          embedding = [ e if e is not None else ["NA", "NA"] for e in embedding ]
+    for i in np.flatnonzero(np.isnan(embedding_array[:, 0])):
+        embedding[i] = None
 
-        return embedding
+    return embedding
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# number of list elements encoded together when a result is streamed
+ITEMS_PER_CHUNK = 10000
+
+
+def _default(obj):
+    """Encode the NumPy types neither encoder handles natively."""
+    if isinstance(obj, np.ndarray):
+        # NaN is not valid JSON, it is encoded as null like orjson does
+        if obj.dtype.kind == "f" and np.isnan(obj).any():
+            return np.where(np.isnan(obj), None, obj).tolist()
+
+        return obj.tolist()
+
+    if isinstance(obj, np.generic):
+        return obj.item()
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(data):
+        """Encode data as JSON, returned as utf-8 bytes."""
+        return orjson.dumps(data, default=_default, option=_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def _encode_key(key):
+        # The same conversion of keys json does, e.g. True becomes "true"
+        return dumps(key if isinstance(key, str) else json.dumps(key))
+
+    def iterencode(data):
+        """Encode data as JSON in pieces of utf-8 bytes.
+
+        Dicts and long lists are encoded a part at a time, so the encoding of
+        a large result is never held in memory as a whole.
+        """
+        if isinstance(data, dict):
+            yield b"{"
+            for i, (key, value) in enumerate(data.items()):
+                yield (b"," if i else b"") + _encode_key(key) + b":"
+                yield from iterencode(value)
+            yield b"}"
+        elif isinstance(data, (list, tuple)) and len(data) > ITEMS_PER_CHUNK:
+            yield b"["
+            for start in range(0, len(data), ITEMS_PER_CHUNK):
+                items = dumps(data[start:start + ITEMS_PER_CHUNK])[1:-1]
+                yield (b"," if start else b"") + items
+            yield b"]"
+        else:
+            yield dumps(data)
+
+else:
+
+    def dumps(data):
+        """Encode data as JSON, returned as utf-8 bytes."""
+        return json.dumps(data, default=_default).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+    def iterencode(data):
+        """Encode data as JSON in pieces of utf-8 bytes."""
+        for piece in json.JSONEncoder(default=_default).iterencode(data):
+            yield piece.encode("utf-8")
@@ -0,0 +1,36 @@
+import numpy as np
+
+from . import typed_arrays
+from .gene_expression_cache import MATRICES
+
+# Value of "resultFormat" in the body of the requests that want the results
+# of expression tasks encoded as typed arrays instead of JSON
+TYPED_ARRAYS_FORMAT = "typedArrays"
+
+
+def wants_typed_arrays(task_def):
+    return task_def.get("resultFormat") == TYPED_ARRAYS_FORMAT
+
+
+def encode(data):
+    """Encode a runExpression result with its matrices as typed arrays.
+
+    Every matrix is a CSC sparse matrix with a column per gene, its values
+    are packed as float32 and its row indices and column pointers as int32.
+    Everything else, like the gene names and their stats, stays in the JSON
+    header, see typed_arrays.encode for the format.
+    """
+    data = dict(data)
+
+    for matrix_name in MATRICES:
+        matrix = data[matrix_name]
+
+        # Missing values come as None, which become NaN
+        data[matrix_name] = {
+            **matrix,
+            "values": np.asarray(matrix["values"], dtype=np.float32),
+            "index": np.asarray(matrix["index"], dtype=np.int32),
+            "ptr": np.asarray(matrix["ptr"], dtype=np.int32),
+        }
+
+    return typed_arrays.encode(data, min_length=0)
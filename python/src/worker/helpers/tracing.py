@@ -0,0 +1,97 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_xray_sdk as xray
+from aws_xray_sdk.core import xray_recorder
+from aws_xray_sdk.core.exceptions.exceptions import SegmentNotFoundException
+from aws_xray_sdk.core.models.trace_header import TraceHeader
+
+from ..config import config
+
+# X-Ray is enabled or disabled once, when the worker starts. The recorder keeps
+# the segment of each thread, so every thread that makes calls has a segment
+# of its own: the one of the request it works on, or an unsampled one that is
+# never sent for the calls that are not part of any request.
+SEGMENT_NAME = f"worker-{config.CLUSTER_ENV}-{config.SANDBOX_ID}"
+
+
+def begin_segment(trace_header=None):
+    """Begins the segment of this thread, sampled as the trace header says.
+
+    Without a trace header the segment is not sampled, so its calls are
+    recorded nowhere but don't fail for lack of a segment either.
+    """
+    if not trace_header:
+        return xray_recorder.begin_segment(SEGMENT_NAME, sampling=False)
+
+    header = TraceHeader.from_header_str(trace_header)
+
+    return xray_recorder.begin_segment(
+        SEGMENT_NAME,
+        traceid=header.root,
+        sampling=header.sampled,
+        parent_id=header.parent,
+    )
+
+
+def end_segment(segment):
+    """Ends a segment that was detached from the thread that began it."""
+    if not segment:
+        return
+
+    xray_recorder.set_trace_entity(segment)
+    xray_recorder.end_segment()
+    xray_recorder.clear_trace_entities()
+
+
+def get_trace_entity():
+    """The segment or subsegment open on this thread, None if there is none."""
+    if not xray.global_sdk_config.sdk_enabled():
+        return None
+
+    try:
+        return xray_recorder.get_trace_entity()
+    except SegmentNotFoundException:
+        return None
+
+
+def detach_segment():
+    """Takes the X-Ray segment opened when the message was read off this thread.
+
+    X-Ray keeps the current segment per thread, so it is handed over to the
+    thread that runs the task.
+    """
+    segment = get_trace_entity()
+
+    if segment:
+        xray_recorder.clear_trace_entities()
+
+    return segment
+
+
+def propagate(function):
+    """Wraps the function to trace its calls as part of the segment of the
+    caller, for functions that run on other threads."""
+    entity = get_trace_entity()
+
+    if not entity:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        xray_recorder.set_trace_entity(entity)
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            xray_recorder.clear_trace_entities()
+
+    return wrapper
+
+
+class TracedThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool that traces every function submitted to it as part of the
+    segment of the thread that submitted it."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(propagate(fn), *args, **kwargs)
@@ -0,0 +1,144 @@
+import numpy as np
+
+from .serializer import dumps, loads
+
+CONTENT_TYPE = "application/vnd.cellenics.typed-arrays"
+
+# Shorter arrays are left in the JSON header, packing them saves nothing
+MIN_LENGTH = 1000
+
+# Key of the objects that take the place of packed arrays in the header
+BUFFER_KEY = "__buffer__"
+
+DTYPES = {
+    "int32": np.dtype("<i4"),
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8"),
+}
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def _as_typed_array(value, min_length):
+    """The value as a little endian typed array, if it can be one.
+
+    Integers are packed as int32 and floats as float64, unless they are in a
+    float32 NumPy array already.
+    """
+    if isinstance(value, np.ndarray):
+        array = value
+    elif isinstance(value, (list, tuple)) and len(value) >= MIN_LENGTH:
+        array = np.asarray(value)
+    else:
+        return None
+
+    if array.ndim != 1 or len(array) < min_length:
+        return None
+
+    # The smallest int32 is the NA integer in R, so it can't be packed
+    if array.dtype.kind in "iu":
+        if not len(array) or (array.min() > INT32_MIN and array.max() <= INT32_MAX):
+            return array.astype(DTYPES["int32"], copy=False)
+
+    elif array.dtype.kind == "f":
+        float_type = "float32" if array.dtype.itemsize == 4 else "float64"
+        return array.astype(DTYPES[float_type], copy=False)
+
+    return None
+
+
+def _pack(value, buffers, min_length):
+    # Only the values of dicts are packed, arrays of objects in the header
+    # could otherwise be simplified into data frames by the R json decoder.
+    if isinstance(value, dict):
+        return {key: _pack(item, buffers, min_length) for key, item in value.items()}
+
+    array = _as_typed_array(value, min_length)
+    if array is None:
+        return value
+
+    buffers.append(array)
+    return {BUFFER_KEY: len(buffers) - 1}
+
+
+def _unpack(value, buffers):
+    if isinstance(value, dict):
+        if len(value) == 1 and BUFFER_KEY in value:
+            return buffers[value[BUFFER_KEY]]
+
+        return {key: _unpack(item, buffers) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [_unpack(item, buffers) for item in value]
+
+    return value
+
+
+def encode(data, min_length=MIN_LENGTH):
+    """Encode data with its long numeric arrays packed as binary buffers.
+
+    Returns None if there is no array worth packing, in which case the data
+    should be sent as plain JSON. Lists are packed from MIN_LENGTH items and
+    NumPy arrays from min_length, so passing a lower min_length packs only
+    the arrays that were made NumPy arrays on purpose.
+
+    The encoding is a little endian uint32 with the length of a JSON header,
+    the header and the buffers. The header holds the data, where each packed
+    array is replaced by {"__buffer__": <index>}, and the type, offset from
+    the end of the header and length of each buffer.
+    """
+    buffers = []
+    body = _pack(data, buffers, min_length)
+
+    if not buffers:
+        return None
+
+    offsets = np.cumsum([0] + [buffer.nbytes for buffer in buffers[:-1]])
+
+    header = dumps(
+        {
+            "body": body,
+            "buffers": {
+                "types": [buffer.dtype.name for buffer in buffers],
+                "offsets": offsets.tolist(),
+                "lengths": [len(buffer) for buffer in buffers],
+            },
+        }
+    )
+
+    return b"".join(
+        [len(header).to_bytes(4, "little"), header]
+        + [buffer.tobytes() for buffer in buffers]
+    )
+
+
+def decode(content):
+    """Decode data encoded as described in encode.
+
+    Buffers are decoded into lists, so the result is the same as if the data
+    had been sent as JSON. Buffers with a number of rows are matrices sent in
+    row major order, decoded into lists of rows.
+    """
+    header_length = int.from_bytes(content[:4], "little")
+    header = loads(content[4:4 + header_length])
+
+    start = 4 + header_length
+    description = header["buffers"]
+
+    buffers = []
+    for i, type_name in enumerate(description["types"]):
+        buffer = np.frombuffer(
+            content,
+            dtype=DTYPES[type_name],
+            count=description["lengths"][i],
+            offset=start + description["offsets"][i],
+        )
+
+        rows = description.get("rows", [0] * len(description["types"]))[i]
+        if rows:
+            buffer = buffer.reshape(rows, -1)
+
+        buffers.append(buffer.tolist())
+
+    return _unpack(header["body"], buffers)
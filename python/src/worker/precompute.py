@@ -0,0 +1,147 @@
+import copy
+import importlib
+import threading
+import traceback
+from logging import error, info
+
+from .config import config
+from .consume_message import _response_exists
+from .helpers import metrics, tracing
+from .response import Response
+
+# Bodies of the requests the UI sends first when an experiment is opened.
+# Their results are computed while the worker is idle.
+REQUESTS = [
+    {
+        "name": "GetEmbedding",
+        "type": "umap",
+        "config": {"minimumDistance": 0.3, "distanceMetric": "cosine"},
+    },
+    {"name": "GetDoubletScore"},
+    {"name": "GetMitochondrialContent"},
+    {"name": "GetNGenes"},
+    {"name": "GetNUmis"},
+    {
+        "name": "MarkerHeatmap",
+        "nGenes": 5,
+        "cellSetKey": "louvain",
+        "groupByClasses": ["louvain"],
+        "selectedPoints": "All",
+        "hiddenCellSetKeys": [],
+    },
+    {
+        "name": "ListGenes",
+        "selectFields": ["gene_names", "dispersions"],
+        "orderBy": "dispersions",
+        "orderDirection": "DESC",
+        "offset": 0,
+        "limit": 50,
+    },
+]
+
+# Seconds between checks of whether the worker is idle again
+IDLE_POLL_INTERVAL = 1
+
+
+def load_etag_hook(path):
+    """Loads the function that derives the ETag of a request, from a string
+    in the form `module:function`.
+
+    The function is called with the experiment ID and the request body, and
+    returns the ETag the API will ask for or None if it doesn't know it.
+    """
+    if not path:
+        return None
+
+    module_name, _, function_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class Precompute:
+    """Computes the results users request first while the worker is idle.
+
+    Results are uploaded to S3 under the ETags the API will ask for, so they
+    are found there when the requests arrive. Requests the ETag hook doesn't
+    know the ETag of are skipped, as their results could not be found.
+
+    Precomputing pauses as soon as the worker has a request to work on. The
+    request being precomputed at that moment is finished first.
+    """
+
+    def __init__(self, task_factory, is_busy, etag_hook, requests=REQUESTS):
+        self.task_factory = task_factory
+        self.is_busy = is_busy
+        self.etag_hook = etag_hook
+        self.requests = requests
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="precompute", daemon=True
+        )
+        self.thread.start()
+
+        return self.thread
+
+    def stop(self):
+        self.stopped.set()
+
+    def _wait_until_idle(self):
+        """Returns whether the worker is idle, False if it has been stopped."""
+        while self.is_busy():
+            if self.stopped.wait(IDLE_POLL_INTERVAL):
+                return False
+
+        return not self.stopped.is_set()
+
+    def _run(self):
+        # No one asked for these results, so they are not traced
+        segment = tracing.begin_segment()
+
+        try:
+            self._precompute_all()
+        finally:
+            tracing.end_segment(segment)
+
+    def _precompute_all(self):
+        for body in self.requests:
+            if not self._wait_until_idle():
+                info("Stopped precomputing results.")
+                return
+
+            try:
+                self._precompute(body)
+            except Exception:
+                error(
+                    f"Could not precompute {body['name']}:\n{traceback.format_exc()}"
+                )
+
+        info("Finished precomputing results.")
+
+    def _precompute(self, body):
+        etag = self.etag_hook(config.EXPERIMENT_ID, body)
+
+        if not etag:
+            info(f"No ETag for {body['name']}, it is not precomputed.")
+            return
+
+        request = {
+            "ETag": etag,
+            "experimentId": config.EXPERIMENT_ID,
+            "body": copy.deepcopy(body),
+        }
+
+        if _response_exists(request):
+            info(f"Result of {body['name']} with ETag {etag} is already in S3.")
+            return
+
+        with metrics.task(body["name"], etag):
+            with metrics.stage("compute"):
+                result = self.task_factory.submit(request)
+
+            if not result.error:
+                Response(request, result).upload()
+
+        info(f"Precomputed {body['name']} with ETag {etag}.")
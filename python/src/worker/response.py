@@ -1,14 +1,15 @@
-import gzip
-import io
-import json
+import os
+import time
 from logging import info
 
-import aws_xray_sdk as xray
 import boto3
 from aws_xray_sdk.core import xray_recorder
-from socket_io_emitter import Emitter
 
 from .config import config
+from .helpers import metrics
+from .helpers.compression import CompressedStream, compress
+from .helpers.notifier import notifier
+from .helpers.s3 import upload_fileobj
 
 
 class Response:
@@ -22,21 +23,18 @@ class Response:
         self.s3_bucket = config.RESULTS_BUCKET
 
     def _construct_data_for_upload(self):
-        info("Starting compression before upload to s3")
-        gzipped_body = io.BytesIO()
-        with gzip.open(gzipped_body, "wt", encoding="utf-8") as zipfile:
-            if (isinstance(self.result.data, str)):
-                info('Compressing string work result')
-                zipfile.write(self.result.data)
-            else:
-                info('Encoding and compressing json work result')
-                json.dump(self.result.data, zipfile)
-
-
-        gzipped_body.seek(0)
+        # The result is serialized and compressed while it is uploaded, so it
+        # is never held in memory a second time as a whole.
+        stream = compress(self.result.data, self.result.content_type)
+
+        if isinstance(self.result.data, str):
+            info(f"Streaming string work result, encoded as {stream.encoding}")
+        elif isinstance(self.result.data, bytes):
+            info(f"Streaming binary work result, encoded as {stream.encoding}")
+        else:
+            info(f"Streaming encoded json work result, encoded as {stream.encoding}")
 
-        info("Compression finished")
-        return gzipped_body
+        return stream
 
     def _construct_response_msg(self):
         message = {
@@ -56,67 +54,104 @@ class Response:
         client = boto3.client("s3", **config.BOTO_RESOURCE_KWARGS)
         ETag = self.request["ETag"]
 
-        # Disabled X-Ray to fix a botocore bug where the context
-        # does not propagate to S3 requests. see:
-        # https://github.com/open-telemetry/opentelemetry-python-contrib/issues/298
-        was_enabled = xray.global_sdk_config.sdk_enabled()
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(False)
+        start = time.perf_counter()
 
         if (type == "path"):
             with open(response_data, 'rb') as file:
-                client.upload_fileobj(file, self.s3_bucket, ETag)
-        else:
-            client.upload_fileobj(response_data, self.s3_bucket, ETag)
+                upload_fileobj(client, file, self.s3_bucket, ETag)
 
-
-        client.put_object_tagging(
-            Key=ETag,
-            Bucket=self.s3_bucket,
-            Tagging={
-                "TagSet": [
-                    {"Key": "experimentId", "Value": self.request["experimentId"]},
-                    {"Key": "requestType", "Value": self.request["body"]["name"]},
-                ]
-            },
-        )
+            metrics.record(
+                "upload", time.perf_counter() - start, os.path.getsize(response_data)
+            )
+        else:
+            extra_args = {}
+
+            # Clients find out how to decode the result from its encoding. It
+            # is set even if it is identity, as results without one are gzipped.
+            if isinstance(response_data, CompressedStream):
+                extra_args["ContentEncoding"] = response_data.encoding
+
+            # and tell results in other formats, like typed arrays, from JSON
+            if self.result.content_type != "application/json":
+                extra_args["ContentType"] = self.result.content_type
+
+            # The start of the result was already compressed to pick its
+            # encoding, only what is compressed from here on is part of the
+            # upload.
+            compressed_before = getattr(response_data, "seconds", 0.0)
+
+            upload_fileobj(client, response_data, self.s3_bucket, ETag, extra_args)
+            seconds = time.perf_counter() - start
+
+            # The result is compressed while it is uploaded, so the time spent
+            # compressing it is taken out of the upload.
+            if isinstance(response_data, CompressedStream):
+                metrics.record(
+                    "compress", response_data.seconds, response_data.raw_bytes
+                )
+                metrics.record(
+                    "upload",
+                    seconds - (response_data.seconds - compressed_before),
+                    response_data.compressed_bytes,
+                )
+            else:
+                metrics.record("upload", seconds)
+
+        with metrics.stage("tagging"):
+            client.put_object_tagging(
+                Key=ETag,
+                Bucket=self.s3_bucket,
+                Tagging={
+                    "TagSet": [
+                        {"Key": "experimentId", "Value": self.request["experimentId"]},
+                        {"Key": "requestType", "Value": self.request["body"]["name"]},
+                    ]
+                },
+            )
 
         info(f"Response was uploaded in bucket {self.s3_bucket} at key {ETag}.")
 
-        if was_enabled:
-            xray.global_sdk_config.set_sdk_enabled(True)
-
         return ETag
 
+    @metrics.timed("emit")
     def _send_notification(self):
-        io = Emitter({"client": config.REDIS_CLIENT})
+        events = []
         if self.request.get("broadcast"):
-            io.Emit(
+            events.append((
                 f'ExperimentUpdates-{self.request["experimentId"]}',
                 self._construct_response_msg(),
-            )
+            ))
 
             info(
                 f"Broadcast results to users viewing experiment {self.request['experimentId']}."
             )
 
-        io.Emit(f'Heartbeat-{self.request["experimentId"]}', {"type": "WorkResponse", "etag": self.request["ETag"], "info": self.request})
-        io.Emit(f'WorkResponse-{self.request["ETag"]}', self._construct_response_msg())
+        events.append((f'Heartbeat-{self.request["experimentId"]}', {"type": "WorkResponse", "etag": self.request["ETag"], "info": self.request}))
+        events.append((f'WorkResponse-{self.request["ETag"]}', self._construct_response_msg()))
+
+        # All the events are sent to Redis at once
+        notifier.emit(events)
 
         info(f"Notified users waiting for request with ETag {self.request['ETag']}.")
 
+    def upload(self):
+        """Uploads the result to S3 if it can be cached, without notifying anyone."""
+        if self.error or not self.cacheable:
+            return None
+
+        info("Uploading response to S3")
+        if (self.result.data == config.RDS_PATH):
+            response_data = self.result.data
+            return self._upload(response_data, "path")
+
+        response_data = self._construct_data_for_upload()
+        return self._upload(response_data, "obj")
+
     @xray_recorder.capture("Response.publish")
     def publish(self):
         info(f"Request {self.request['ETag']} processed, response:")
 
-        if not self.error and self.cacheable:
-            info("Uploading response to S3")
-            if (self.result.data == config.RDS_PATH):
-                response_data = self.result.data
-                self._upload(response_data, "path")
-            else:
-                response_data = self._construct_data_for_upload()
-                self._upload(response_data, "obj")
+        self.upload()
 
         info("Sending socket.io message to clients subscribed to work response")
         return self._send_notification()
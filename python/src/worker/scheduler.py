@@ -0,0 +1,172 @@
+import datetime
+import functools
+import heapq
+import itertools
+import threading
+from logging import info
+
+from .consume_message import get_deadline
+from .helpers import metrics, tracing
+
+INTERACTIVE = "interactive"
+PLOT = "plot"
+EXPORT = "export"
+
+# Latency class of each task type. Interactive tasks answer something the
+# user just did in the UI, plots compute a whole figure or analysis and
+# exports build files to download, which can take minutes.
+LANES = {
+    "GetEmbedding": INTERACTIVE,
+    "ListGenes": INTERACTIVE,
+    "GeneExpression": INTERACTIVE,
+    "DifferentialExpression": INTERACTIVE,
+    "GetBackgroundExpressedGenes": INTERACTIVE,
+    "GetDoubletScore": INTERACTIVE,
+    "GetMitochondrialContent": INTERACTIVE,
+    "GetNGenes": INTERACTIVE,
+    "GetNUmis": INTERACTIVE,
+    "GetExpressionCellSets": INTERACTIVE,
+    "MarkerHeatmap": PLOT,
+    "DotPlot": PLOT,
+    "BatchDifferentialExpression": PLOT,
+    "ClusterCells": PLOT,
+    "ScTypeAnnotate": PLOT,
+    "GetTrajectoryAnalysisStartingNodes": PLOT,
+    "GetTrajectoryAnalysisPseudoTime": PLOT,
+    "GetNormalizedExpression": EXPORT,
+    "DownloadAnnotSeuratObject": EXPORT,
+}
+
+# Lane of the task types that are not classified
+DEFAULT_LANE = PLOT
+
+
+def get_lane(request):
+    return LANES.get(request.get("body", {}).get("name"), DEFAULT_LANE)
+
+
+def can_finish(request, deadline, now):
+    """Whether the request can finish before its deadline, expecting it to take
+    as long as the previous tasks of its type took on average."""
+    name = request.get("body", {}).get("name", metrics.UNKNOWN_TASK)
+    expected = metrics.registry.mean_seconds(name, "compute") or 0
+
+    return now + datetime.timedelta(seconds=expected) < deadline
+
+
+class Scheduler:
+    """Decides which of the requests read from the queue are computed next.
+
+    Every latency class has its own concurrency budget, so exports can't take
+    the slots of interactive requests. Within a class, the request with the
+    earliest deadline is computed first, and requests that can no longer
+    finish before their deadline are dropped instead of being computed.
+    """
+
+    def __init__(self, task_pool, budgets, max_pending):
+        self.task_pool = task_pool
+        self.budgets = budgets
+        self.max_pending = max_pending
+
+        # Requests waiting for their lane as a heap of
+        # (deadline, order, request, X-Ray segment), by lane.
+        self.pending = {lane: [] for lane in budgets}
+        self.running = dict.fromkeys(budgets, 0)
+        self.order = itertools.count()
+
+        self.condition = threading.Condition()
+
+    @property
+    def busy(self):
+        with self.condition:
+            return self._pending_count() > 0 or any(self.running.values())
+
+    def wait_for_room(self, timeout=None):
+        """Waits until there is room to keep one more request in the worker."""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self._pending_count() < self.max_pending, timeout
+            )
+
+    def add(self, request):
+        """Schedules the request, and computes it right away if its lane has room.
+
+        Requests with the same ETag wait for it from now on, like they do for
+        requests that are being computed.
+        """
+        self._push(request, tracing.detach_segment())
+
+    def _push(self, request, segment):
+        lane = get_lane(request)
+        entry = (get_deadline(request), next(self.order), request, segment)
+
+        self.task_pool.reserve(request)
+
+        with self.condition:
+            heapq.heappush(self.pending[lane], entry)
+
+        self.dispatch()
+
+    def dispatch(self):
+        """Submits the next requests of every lane that has room for them."""
+        now = datetime.datetime.utcnow()
+        started = []
+        dropped = []
+
+        with self.condition:
+            for lane, pending in self.pending.items():
+                while pending and self.running[lane] < self.budgets[lane]:
+                    deadline, _, request, segment = heapq.heappop(pending)
+
+                    if not can_finish(request, deadline, now):
+                        dropped.append((request, deadline, segment))
+                        continue
+
+                    self.running[lane] += 1
+                    started.append((lane, request, segment))
+
+            self.condition.notify_all()
+
+        for lane, request, segment in started:
+            # The pool has a slot for every request the lanes can run, so
+            # this doesn't wait.
+            self.task_pool.acquire_slot()
+
+            future = self.task_pool.submit(request, segment)
+            future.add_done_callback(functools.partial(self._done, lane))
+
+        for request, deadline, segment in dropped:
+            self._drop(request, deadline, segment)
+
+    def _drop(self, request, deadline, segment):
+        info(
+            f"Skipping processing task with ETag {request['ETag']} "
+            f"as it can't finish before its timeout of {deadline}..."
+        )
+
+        tracing.end_segment(segment)
+
+        # Requests that were waiting for it may have a later deadline. The
+        # first one is scheduled and the others wait for it, like they did
+        # for the dropped request.
+        duplicates = self.task_pool.cancel(request)
+
+        if not duplicates:
+            return
+
+        first, *others = duplicates
+        self.task_pool.reserve(first)
+
+        for duplicate in others:
+            self.task_pool.coalesce(duplicate)
+
+        self._push(first, None)
+
+    def _done(self, lane, future):
+        with self.condition:
+            self.running[lane] -= 1
+
+        self.dispatch()
+
+    def _pending_count(self):
+        return sum(len(pending) for pending in self.pending.values())
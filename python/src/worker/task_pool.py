@@ -0,0 +1,152 @@
+import datetime
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from logging import error, info
+
+from aws_xray_sdk.core import xray_recorder
+from exceptions import ErrorCodes
+
+from .helpers import metrics, tracing
+from .response import Response
+from .result import Result
+
+
+class TaskPool:
+    """Computes and publishes requests on a bounded pool of threads.
+
+    A slot must be acquired before consuming a message from the queue, so the
+    worker never takes more messages than it can work on at the same time.
+    """
+
+    def __init__(self, task_factory, max_workers):
+        self.task_factory = task_factory
+        self.max_workers = max_workers
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="task"
+        )
+        self.slots = threading.BoundedSemaphore(max_workers)
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.last_activity = datetime.datetime.utcnow()
+
+        # Requests with the same ETag as a request being computed, by ETag.
+        # They are notified with its result instead of being computed again.
+        self.waiting = {}
+
+    @property
+    def busy(self):
+        with self.lock:
+            return self.in_flight > 0
+
+    def acquire_slot(self, timeout=None):
+        return self.slots.acquire(timeout=timeout)
+
+    def release_slot(self):
+        self.slots.release()
+
+    def coalesce(self, request):
+        """Attaches the request to an in-flight one with the same ETag, if any.
+
+        Returns whether it was attached, in which case it doesn't need a slot.
+        """
+        with self.lock:
+            waiting = self.waiting.get(request["ETag"])
+
+            if waiting is None:
+                return False
+
+            waiting.append(request)
+
+        info(
+            f"Request with ETag {request['ETag']} is already being computed, "
+            "it will be notified when it finishes."
+        )
+        return True
+
+    def reserve(self, request):
+        """Makes requests with the same ETag wait for this one from now on,
+        before it is submitted."""
+        with self.lock:
+            self.waiting.setdefault(request["ETag"], [])
+
+    def cancel(self, request):
+        """Forgets a reserved request that won't be computed.
+
+        Returns the requests that were waiting for it.
+        """
+        return self._pop_waiting(request)
+
+    def submit(self, request, segment=None):
+        """Runs the request in the background. The caller must hold a slot,
+        which is released once the response has been published."""
+        with self.lock:
+            self.in_flight += 1
+            self.last_activity = datetime.datetime.utcnow()
+            self.waiting.setdefault(request["ETag"], [])
+
+        future = self.executor.submit(self._run, request, segment)
+        future.add_done_callback(self._done)
+
+        return future
+
+    def shutdown(self):
+        info("Waiting for in-flight tasks to finish...")
+        self.executor.shutdown(wait=True)
+
+    def _run(self, request, segment):
+        if segment:
+            xray_recorder.set_trace_entity(segment)
+
+        try:
+            name = request.get("body", {}).get("name", metrics.UNKNOWN_TASK)
+
+            with metrics.task(name, request["ETag"]):
+                with metrics.stage("compute"):
+                    result = self.task_factory.submit(request)
+
+                response = Response(request, result)
+                response.publish()
+        except Exception:
+            error(
+                f"Could not process request with ETag {request.get('ETag')}:\n"
+                f"{traceback.format_exc()}"
+            )
+
+            # The result may not have been uploaded, so the duplicates are
+            # told that the work failed instead of waiting for it forever.
+            result = Result(
+                {
+                    "error_code": ErrorCodes.PYTHON_WORKER_ERROR,
+                    "user_message": (
+                        "An unexpected error occurred while performing the work."
+                    ),
+                },
+                error=True,
+            )
+        finally:
+            tracing.end_segment(segment)
+
+        # The result is already uploaded, so the duplicates only need to be
+        # told that it is ready.
+        for duplicate in self._pop_waiting(request):
+            try:
+                Response(duplicate, result)._send_notification()
+            except Exception:
+                error(
+                    f"Could not notify request with ETag {duplicate.get('ETag')}:\n"
+                    f"{traceback.format_exc()}"
+                )
+
+    def _pop_waiting(self, request):
+        with self.lock:
+            return self.waiting.pop(request["ETag"], [])
+
+    def _done(self, future):
+        with self.lock:
+            self.in_flight -= 1
+            self.last_activity = datetime.datetime.utcnow()
+
+        self.release_slot()
@@ -1,14 +1,11 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..helpers.get_diff_expr_cellsets import get_diff_expr_cellsets
 from ..helpers.remove_regex import remove_regex
-from ..helpers.s3 import get_cell_sets
+from ..helpers.s3 import get_cell_set_index
 from ..result import Result
 from . import Task
 
@@ -23,43 +20,33 @@ class GetBackgroundExpressedGenes(Task):
         # Return a list of formatted results.
         return Result({"genes": result["genes"]})
 
+    @metrics.timed("request_build")
     def _format_request(self):
         # get cell sets from database
-        all_cell_sets = get_cell_sets(self.experiment_id)
+        cell_set_index = get_cell_set_index(self.experiment_id)
 
         first_cell_set_name = self.task_def["cellSet"]
         second_cell_set_name = self.task_def["compareWith"]
         basis_name = self.task_def["basis"]
 
         baseCells, backgroundCells = get_diff_expr_cellsets(
-            basis_name, first_cell_set_name, second_cell_set_name, all_cell_sets
+            basis_name, first_cell_set_name, second_cell_set_name, cell_set_index
         )
 
         request = {
-            "baseCells": [int(x) for x in baseCells],
-            "backgroundCells": [int(x) for x in backgroundCells],
+            "baseCells": baseCells.tolist(),
+            "backgroundCells": backgroundCells.tolist(),
         }
 
         return request
 
     @xray_recorder.capture("getBackgroundExpressedGenes.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
 
         request = self._format_request()
 
         # send request to r worker
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/getBackgroundExpressedGenes",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        result = send_r_request("getBackgroundExpressedGenes", request)
 
         data = result.get("data")
 
@@ -1,81 +1,123 @@
+from concurrent.futures import as_completed
+from logging import error
 
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
-import array
+
 from ..tasks import Task
 from ..result import Result
 from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..helpers.get_diff_expr_cellsets import get_diff_expr_cellsets
-from ..helpers.s3 import get_cell_sets
-import json
-from exceptions import PythonWorkerException
+from ..helpers.notifier import notifier
+from ..helpers.s3 import get_cell_set_index
+from ..helpers.tracing import TracedThreadPoolExecutor
+
+NO_DATA = {'full_count': 0, 'gene_results': 'No data available for this comparison'}
+
 
 class BatchDifferentialExpression(Task):
     def __init__(self, msg):
             super().__init__(msg)
             self.experiment_id = config.EXPERIMENT_ID
+            self.etag = msg.get("ETag")
 
-    def _format_result(self, results):
-        # Return a list of formatted results.
-        final_result=[]
+    def _format_data(self, data):
+        return {"total": data["full_count"], "data": data["gene_results"]}
 
+    def _format_result(self, results):
         # Return a list of formatted results in the same order as the list of requested diff expr arrived
-        for data in results:
-            final_result.append({"total": data["full_count"], "data": data["gene_results"]})
-        return Result(final_result)
-    
-    def _format_request(self, base_cs, first_cs, second_cell_set_name, cell_sets):
+        return Result([self._format_data(data) for data in results])
+
+    @metrics.timed("request_build")
+    def _format_request(self, base_cs, first_cs, second_cell_set_name, cell_set_index):
         base_cells, background_cells = get_diff_expr_cellsets(
-            str(base_cs), str(first_cs), second_cell_set_name, cell_sets
+            str(base_cs), str(first_cs), second_cell_set_name, cell_set_index
         )
         request = {
-            "baseCells": [int(x) for x in base_cells],
-            "backgroundCells": [int(x) for x in background_cells],
+            "baseCells": base_cells.tolist(),
+            "backgroundCells": background_cells.tolist(),
             "genesOnly": self.task_def.get("genesOnly", False),
             "comparisonType": self.task_def.get("comparisonType", "within"),
         }
         return request
 
-    @xray_recorder.capture("DifferentialExpression.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
+    def _publish_partial_result(self, index, count, data):
+        # The whole result is still uploaded when all comparisons finish, this
+        # only lets the clients show each comparison as soon as it is ready.
+        if not self.etag:
+            return
 
+        try:
+            notifier.emit([(
+                f"PartialWorkResponse-{self.etag}",
+                {
+                    "type": "PartialWorkResponse",
+                    "etag": self.etag,
+                    "index": index,
+                    "count": count,
+                    "result": self._format_data(data),
+                },
+            )])
+        except Exception as e:
+            error(f"Could not publish result of comparison {index}: {e}")
+
+    @xray_recorder.capture("DifferentialExpression.compute")
     def compute(self):
-        # get cell sets from database
-        cell_sets = get_cell_sets(self.experiment_id)
+        # get cell sets from database, the index is shared by all comparisons
+        cell_set_index = get_cell_set_index(self.experiment_id)
         first_cell_set_name = self.task_def["cellSet"]
         second_cell_set_name = self.task_def["compareWith"]
         basis = self.task_def["basis"]
-        
+
         # either basis or first_cell_set are arrays, depending on what operation the user chose
         if len(basis) == 1:
             cell_sets_list = [(basis[0], cs) for cs in first_cell_set_name]
         else:
             cell_sets_list = [(b, first_cell_set_name[0]) for b in basis]
 
-        responses_list = []
+        count = len(cell_sets_list)
+        responses_list = [NO_DATA] * count
 
-        for base_cs, first_cs in cell_sets_list:
-            try:
-                request = self._format_request(base_cs, first_cs, second_cell_set_name, cell_sets)
-                 # send request to r worker
-                response = requests.post(
-                    f"{config.R_WORKER_URL}/v0/DifferentialExpression",
-                    headers={"content-type": "application/json"},
-                    data=json.dumps(request),
+        # Comparisons are traced as part of this task, on the threads they run
+        with TracedThreadPoolExecutor(
+            max_workers=max(1, min(config.BATCH_DE_CONCURRENCY, count))
+        ) as executor:
+            futures = {}
+
+            for index, (base_cs, first_cs) in enumerate(cell_sets_list):
+                try:
+                    request = self._format_request(
+                        base_cs, first_cs, second_cell_set_name, cell_set_index
+                    )
+                except Exception as e:
+                    error(
+                        f"Couldn't build the request of comparison {index}, "
+                        f"skipping it: {e}"
+                    )
+                    self._publish_partial_result(index, count, NO_DATA)
+                    continue
+
+                # send request to r worker, its stages are recorded for this task
+                future = executor.submit(
+                    metrics.propagate(send_r_request),
+                    "DifferentialExpression",
+                    request,
                 )
-                response.raise_for_status()
-                result = response.json()
-                raise_if_error(result)
+                futures[future] = index
+
+            # Comparisons are published in the order they finish
+            for future in as_completed(futures):
+                index = futures[future]
 
-                data = result.get("data")
-            except Exception as e:
-                print(f"Couldnt run Differential Expression for the current comparison, skipping...", e)
-                data = {'full_count': 0, 'gene_results': 'No data available for this comparison'}
+                try:
+                    responses_list[index] = future.result().get("data")
+                except Exception as e:
+                    error(
+                        "Couldn't run Differential Expression for comparison "
+                        f"{index}, skipping it: {e}"
+                    )
 
-            responses_list.append(data)
+                self._publish_partial_result(index, count, responses_list[index])
 
         return self._format_result(responses_list)
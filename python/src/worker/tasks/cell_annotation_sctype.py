@@ -1,11 +1,8 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..helpers.s3 import get_cell_sets
 from ..helpers.cell_sets_dict import get_cell_sets_dict_for_r
 from ..result import Result
@@ -20,6 +17,7 @@ class ScTypeAnnotate(Task):
     def _format_result(self, result):
         return Result(result, cacheable=False)
 
+    @metrics.timed("request_build")
     def _format_request(self):
         # get cell sets from database
         cell_sets = get_cell_sets(self.experiment_id)
@@ -39,21 +37,10 @@ class ScTypeAnnotate(Task):
 
 
     @xray_recorder.capture("ScTypeAnnotate.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
         request = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/ScTypeAnnotate",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        result = send_r_request("ScTypeAnnotate", request)
 
         data = result.get("data")
 
@@ -1,11 +1,8 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..helpers.color_pool import COLOR_POOL
 from ..result import Result
 from ..tasks import Task
@@ -21,6 +18,7 @@ class ClusterCells(Task):
     def _format_result(self, result):
         return Result(result, cacheable=False)
 
+    @metrics.timed("request_build")
     def _format_request(self):
         resolution = self.task_def["config"].get("resolution", 0.5)
 
@@ -35,22 +33,11 @@ class ClusterCells(Task):
         return request
 
     @xray_recorder.capture("ClusterCells.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
 
         request = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/getClusters",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        result = send_r_request("getClusters", request)
 
         data = result.get("data")
 
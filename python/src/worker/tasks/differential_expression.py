@@ -1,14 +1,12 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
+from ..helpers import metrics
+from ..helpers.diff_expr_cache import DiffExprTable, cache, cache_key
+from ..helpers.r_worker import send_r_request
 from ..helpers.get_diff_expr_cellsets import get_diff_expr_cellsets
 from ..helpers.remove_regex import remove_regex
-from ..helpers.s3 import get_cell_sets
+from ..helpers.s3 import get_cell_set_index
 from ..result import Result
 from ..tasks import Task
 
@@ -27,20 +25,21 @@ class DifferentialExpression(Task):
 
         return Result({"total": result["full_count"], "data": result["gene_results"]})
 
+    @metrics.timed("request_build")
     def _format_request(self):
         # get cell sets from database
-        cell_sets = get_cell_sets(self.experiment_id)
+        cell_set_index = get_cell_set_index(self.experiment_id)
         first_cell_set_name = self.task_def["cellSet"]
         second_cell_set_name = self.task_def["compareWith"]
         basis_name = self.task_def["basis"]
 
         baseCells, backgroundCells = get_diff_expr_cellsets(
-            basis_name, first_cell_set_name, second_cell_set_name, cell_sets
+            basis_name, first_cell_set_name, second_cell_set_name, cell_set_index
         )
 
         request = {
-            "baseCells": [int(x) for x in baseCells],
-            "backgroundCells": [int(x) for x in backgroundCells],
+            "baseCells": baseCells.tolist(),
+            "backgroundCells": backgroundCells.tolist(),
             "genesOnly": self.task_def.get("genesOnly", False),
             "comparisonType": self.task_def.get("comparisonType", "within"),
         }
@@ -57,25 +56,34 @@ class DifferentialExpression(Task):
 
         return request
 
+    def _fetch_table(self, request):
+        """Compute the full result of the comparison in the R worker."""
+        full_request = {
+            key: value
+            for key, value in request.items()
+            if key not in ("pagination", "geneNamesFilter")
+        }
+
+        result = send_r_request("DifferentialExpression", full_request)
+
+        return DiffExprTable(result.get("data")["gene_results"])
+
     @xray_recorder.capture("DifferentialExpression.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
 
         request = self._format_request()
 
-        # send request to r worker
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/DifferentialExpression",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
+        # The full result is computed once for each comparison, every page,
+        # order and filter of it is then taken from the cached one.
+        key = cache_key(request)
+        table = cache.get(key)
 
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        if table is None:
+            table = self._fetch_table(request)
+            cache.put(key, table)
 
-        data = result.get("data")
+        data = table.query(
+            self.pagination, request["genesOnly"], request.get("geneNamesFilter")
+        )
 
         return self._format_result(data)
@@ -1,11 +1,8 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..helpers.s3 import get_cell_sets
 from ..result import Result
 from ..tasks import Task
@@ -20,6 +17,7 @@ class DotPlot(Task):
         # Return a list of formatted results.
         return Result(result)
 
+    @metrics.timed("request_build")
     def _format_request(self):
 
         # getting cell ids for the groups we want to display.
@@ -56,22 +54,11 @@ class DotPlot(Task):
         return request
 
     @xray_recorder.capture("DotPlot.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
 
         request = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/runDotPlot",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        result = send_r_request("runDotPlot", request)
 
         data = result.get("data")
 
@@ -1,11 +1,7 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
-from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..result import Result
 from ..tasks import Task
 
@@ -15,26 +11,16 @@ class GetDoubletScore(Task):
         # Return a list of formatted results.
         return Result(result)
 
-    @xray_recorder.capture("DoubletScore.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
+    @metrics.timed("request_build")
     def _format_request(self):
         return {}
 
+    @xray_recorder.capture("DoubletScore.compute")
     def compute(self):
 
         # Retrieve the Doublet Score of all the cells
         request = self._format_request()
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/getDoubletScore",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        result = send_r_request("getDoubletScore", request)
 
         data = result.get("data")
 
@@ -1,11 +1,8 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..result import Result
 from ..tasks import Task
 from ..helpers.s3 import get_embedding, get_cell_sets
@@ -22,6 +19,7 @@ class DownloadAnnotSeuratObject(Task):
     def _format_result(self, result):
         return Result(result)
 
+    @metrics.timed("request_build")
     def _format_request(self):
 
         cell_sets = get_cell_sets(self.experiment_id)
@@ -38,21 +36,10 @@ class DownloadAnnotSeuratObject(Task):
         return request
 
     @xray_recorder.capture("DownloadAnnotSeuratObject.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
         request = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/DownloadAnnotSeuratObject",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        send_r_request("DownloadAnnotSeuratObject", request)
 
         return self._format_result(config.RDS_PATH)
     
\ No newline at end of file
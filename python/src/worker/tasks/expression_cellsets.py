@@ -1,11 +1,8 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
 from ..result import Result
 from ..tasks import Task
 
@@ -20,6 +17,7 @@ class GetExpressionCellSets(Task):
         return Result(result, cacheable=False)
 
 
+    @metrics.timed("request_build")
     def _format_request(self):
         request = self.task_def
 
@@ -31,21 +29,10 @@ class GetExpressionCellSets(Task):
         return request
 
     @xray_recorder.capture("getExpressionCellSet.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
         request = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/getExpressionCellSet",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        result = send_r_request("getExpressionCellSet", request)
 
         data = result.get("data")
 
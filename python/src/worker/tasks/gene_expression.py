@@ -1,42 +1,77 @@
-import json
-
-import backoff
-import numpy as np
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
+from exceptions import ErrorCodes, RWorkerException
 
-from ..config import config
-from ..helpers.process_gene_expression import process_gene_expression
+from ..helpers import metrics, sparse_expression, typed_arrays
+from ..helpers.gene_expression_cache import cache, merge_genes, split_genes
+from ..helpers.r_worker import send_r_request
 from ..result import Result
 from ..tasks import Task
 
 
 class GeneExpression(Task):
     def _format_result(self, result):
+        if sparse_expression.wants_typed_arrays(self.task_def):
+            return Result(
+                sparse_expression.encode(result),
+                content_type=typed_arrays.CONTENT_TYPE,
+            )
+
         # Return a list of formatted results.
         return Result(result)
 
-    def _format_request(self):
-        request = self.task_def
+    @metrics.timed("request_build")
+    def _format_request(self, genes):
+        request = {**self.task_def, "genes": genes}
         return request
 
+    def _fetch_genes(self, genes):
+        """Fetch the genes from the R worker and cache the data of each one."""
+        request = self._format_request(genes)
+
+        result = send_r_request("runExpression", request)
+        fetched = split_genes(result.get("data"))
+
+        entries = {gene.upper(): [] for gene in genes}
+        for gene in fetched:
+            entries.setdefault(gene["name"].upper(), []).append(gene)
+
+        for key, genes_data in entries.items():
+            cache.put(key, genes_data)
+
+        return entries
+
     @xray_recorder.capture("GeneExpression.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
-        request = self._format_request()
+        # Genes are matched case insensitively, so the same gene can only be
+        # requested once.
+        genes = {}
+        for gene in self.task_def["genes"]:
+            genes.setdefault(gene.upper(), gene)
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/runExpression",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
+        entries = cache.get(genes.keys())
+        missing = [gene for key, gene in genes.items() if key not in entries]
+
+        if missing:
+            found_cached = any(entries.values())
+
+            try:
+                entries.update(self._fetch_genes(missing))
+            except RWorkerException as e:
+                # The R worker fails when none of the genes are found. Other
+                # genes of the request were, so these are just left out.
+                if e.error_code != ErrorCodes.GENE_NOT_FOUND or not found_cached:
+                    raise
 
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
-        result = result.get("data")
+                for gene in missing:
+                    entries[gene.upper()] = []
+                    cache.put(gene.upper(), [])
+
+        if not any(entries.values()):
+            # None of the genes were found, let the R worker fail for them.
+            entries.update(self._fetch_genes(list(genes.values())))
+
+        result = merge_genes(
+            [gene_data for key in genes for gene_data in entries[key]]
+        )
 
         return self._format_result(result)
@@ -1,11 +1,7 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
-from ..config import config
+from ..helpers import metrics
+from ..helpers.gene_list import get_gene_list
 from ..helpers.remove_regex import remove_regex
 from ..result import Result
 from ..tasks import Task
@@ -15,6 +11,7 @@ class ListGenes(Task):
         # Return a list of formatted results.
         return Result({"total": total,  **result})
 
+    @metrics.timed("request_build")
     def _format_request(self):
         request = self.task_def
         #
@@ -34,25 +31,19 @@ class ListGenes(Task):
         return request
 
     @xray_recorder.capture("ListGenes.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
         request = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/listGenes",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        # The gene dispersion table is fetched from the R worker once and
+        # indexed, so each request is answered without going to R.
+        gene_list = get_gene_list()
 
-        data = result.get("data")
-
-        total = data["full_count"]
-        result = data["gene_results"]
+        result, total = gene_list.query(
+            request["orderBy"],
+            request["orderDirection"],
+            request["offset"],
+            request["limit"],
+            request.get("geneNamesFilter"),
+        )
 
         return self._format_result(result, total)
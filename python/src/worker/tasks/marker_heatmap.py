@@ -1,15 +1,11 @@
-import json
-
-import backoff
 import numpy as np
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
-from ..helpers.process_gene_expression import process_gene_expression
+from ..helpers import metrics, sparse_expression, typed_arrays
+from ..helpers.r_worker import send_r_request
 from ..helpers.get_heatmap_cell_order import get_heatmap_cell_order
-from ..helpers.s3 import get_cell_sets
+from ..helpers.s3 import get_cell_set_index
 from ..result import Result
 from ..tasks import Task
 
@@ -19,15 +15,23 @@ class MarkerHeatmap(Task):
         self.experiment_id = config.EXPERIMENT_ID
 
     def _format_result(self, result):
+        if sparse_expression.wants_typed_arrays(self.task_def):
+            return Result(
+                sparse_expression.encode(result),
+                content_type=typed_arrays.CONTENT_TYPE,
+            )
+
         # Return a list of formatted results.
         return Result(result)
 
+    @metrics.timed("request_build")
     def _format_request(self):
         request = {"nGenes": self.task_def["nGenes"]}
 
         cellSetKey = self.task_def["cellSetKey"]
 
-        cell_sets = get_cell_sets(self.experiment_id)
+        cell_set_index = get_cell_set_index(self.experiment_id)
+        cell_sets = cell_set_index.cell_sets
 
         n_genes = self.task_def["nGenes"]
         cell_set_key = self.task_def["cellSetKey"]
@@ -45,7 +49,7 @@ class MarkerHeatmap(Task):
             selected_points,
             hidden_cell_set_keys,
             max_cells,
-            cell_sets
+            cell_set_index
         )
 
         selected_cell_sets = next(set for set in cell_sets if set["key"] == cellSetKey)
@@ -55,21 +59,10 @@ class MarkerHeatmap(Task):
         return request, cell_order
 
     @xray_recorder.capture("MarkerHeatmap.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
         request, cell_order = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/runMarkerHeatmap",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        json_response = response.json()
-        raise_if_error(json_response)
+        json_response = send_r_request("runMarkerHeatmap", request)
         result = json_response.get("data")
 
         result["cellOrder"] = cell_order
@@ -1,13 +1,10 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
-from ..helpers.s3 import get_cell_sets
-from ..helpers.cell_sets_dict import get_cell_sets_dict, subset_cell_sets_dict
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
+from ..helpers.cell_set_index import intersection
+from ..helpers.s3 import get_cell_set_index
 from ..result import Result
 from ..tasks import Task
 
@@ -19,10 +16,11 @@ class GetNormalizedExpression(Task):
     def _format_result(self, result):
         return Result(result)
 
+    @metrics.timed("request_build")
     def _format_request(self):
         subset_by = self.task_def["subsetBy"]
 
-        cell_sets = get_cell_sets(self.experiment_id)
+        cell_set_index = get_cell_set_index(self.experiment_id)
 
         # categories should be ["sample", "louvain", "metadata", "scratchpad"] (in no particular order)
         categories = list(subset_by.keys())
@@ -33,37 +31,24 @@ class GetNormalizedExpression(Task):
         if (all(len(subset_by[category]) == 0 for category in categories)):
             return { "subsetBy": None, "applySubset": False }
 
-        cell_sets_dict = get_cell_sets_dict(cell_sets)
-
         # Get the sets of cell ids to subset by for each category
         for category in categories:
             if (len(subset_by[category]) == 0):
                 continue
 
-            cell_ids = subset_cell_sets_dict(subset_by[category], cell_sets_dict)
+            cell_ids = cell_set_index.union(subset_by[category])
             cell_ids_to_intersect.append(cell_ids)
 
         # Intersect all sets of cell ids from different categories
-        cell_ids = cell_ids_to_intersect[0].intersection(*cell_ids_to_intersect[1:])
+        cell_ids = intersection(*cell_ids_to_intersect)
 
-        return { "subsetBy": list(cell_ids), "applySubset": True }
+        return { "subsetBy": cell_ids.tolist(), "applySubset": True }
 
     @xray_recorder.capture("GetNormalizedExpression.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
         request = self._format_request()
 
-        response = requests.post(
-            f"{config.R_WORKER_URL}/v0/GetNormalizedExpression",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        response.raise_for_status()
-        result = response.json()
-        raise_if_error(result)
+        result = send_r_request("GetNormalizedExpression", request)
 
         data = result.get("data")
 
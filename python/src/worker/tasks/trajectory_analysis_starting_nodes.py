@@ -1,13 +1,9 @@
-import json
-
-import backoff
-import requests
 from aws_xray_sdk.core import xray_recorder
-from exceptions import raise_if_error
 
 from ..config import config
-from ..helpers.s3 import get_embedding, get_cell_sets
-from ..helpers.cell_sets_dict import get_cell_sets_dict, subset_cell_sets_dict
+from ..helpers import metrics
+from ..helpers.r_worker import send_r_request
+from ..helpers.s3 import get_embedding, get_cell_set_index
 from ..result import Result
 from . import Task
 
@@ -20,12 +16,12 @@ class GetTrajectoryAnalysisStartingNodes(Task):
     def _format_result(self, result):
         return Result(result["data"])
 
+    @metrics.timed("request_build")
     def _format_request(self):
 
-        cell_sets = get_cell_sets(self.experiment_id)
-        cell_sets_dict = get_cell_sets_dict(cell_sets)
+        cell_set_index = get_cell_set_index(self.experiment_id)
 
-        cell_ids = subset_cell_sets_dict(self.task_def["cellSets"], cell_sets_dict)
+        cell_ids = cell_set_index.union(self.task_def["cellSets"])
 
         embedding_etag = self.task_def["embedding"]["ETag"]
         embedding = get_embedding(embedding_etag, format_for_r=True)
@@ -40,28 +36,16 @@ class GetTrajectoryAnalysisStartingNodes(Task):
                 "method": self.task_def["clustering"]["method"],
                 "resolution": self.task_def["clustering"]["resolution"],
             },
-            "cell_ids": list(cell_ids)
+            "cell_ids": cell_ids.tolist()
         }
 
         return request
 
     @xray_recorder.capture("GetTrajectoryAnalysisStartingNodes.compute")
-    @backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=30
-    )
     def compute(self):
         request = self._format_request()
 
-        r = requests.post(
-            f"{config.R_WORKER_URL}/v0/runTrajectoryAnalysisStartingNodesTask",
-            headers={"content-type": "application/json"},
-            data=json.dumps(request),
-        )
-
-        # raise an exception if an HTTPError occurred. otherwise r.json() will fail
-        r.raise_for_status()
         # The index order relies on cells_id in an ascending form. The order is made in the R part.
-        result = r.json()
-        raise_if_error(result)
+        result = send_r_request("runTrajectoryAnalysisStartingNodesTask", request)
 
         return self._format_result(result)